@@ -0,0 +1,287 @@
+"""Benchmark de extremo a extremo del reproductor en una sola máquina Linux.
+
+Levanta todo lo necesario en local, sin hardware ni servidores reales:
+  - dos emisores SRT (srt_sender.py) con la señal de prueba, en puertos distintos
+  - el stub del proxy y del servidor de streaming (stub_server.py)
+  - un framebuffer falso (fichero normal + árbol sysfs) y audio en el dispositivo 'null'
+y lanza src/main.py como lo haría systemd. Las medidas se leen del endpoint de métricas
+del propio reproductor (/metrics y /sessions) y de /proc:
+
+  ttff_boot_ms       arranque del proceso -> primer frame
+  decoder_ranking_s  arranque del proceso -> decodificadores medidos (en frío la medición se hace antes
+                     de la ventana de CPU estable para no contarla en ella)
+  switch             cambios de URL: TTFF de cada cambio y tiempo sin imagen nueva
+  recovery_ms        tiempo desde que el emisor vuelve tras una pérdida hasta que avanzan los frames
+  cpu_percent        CPU del reproductor y de sus hijos (FFmpeg, aplay) en reproducción estable
+  rss_mb             memoria residente del reproductor y de sus hijos
+
+El resultado es un JSON con claves ordenadas para poder comparar versiones con diff.
+
+Uso: python benchmark.py [--switches 5] [--loss 3] [--steady 20] [--output resultado.json]
+"""
+import argparse
+import json
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+from srt_sender import PausableSender
+from stub_server import StubServer
+
+BASE_DIR = Path(__file__).resolve().parent
+METRIC_RE = re.compile(r'^(\w+)(?:\{[^}]*\})? (\S+)$')
+
+def free_port(kind=socket.SOCK_STREAM):
+    with socket.socket(socket.AF_INET, kind) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def fake_framebuffer(root, width, height, bpp=32):
+    """Fichero de framebuffer y árbol sysfs con la geometría indicada"""
+    sysfs = root / 'sysfs'
+    sysfs.mkdir()
+    stride = width * bpp // 8
+    (sysfs / 'virtual_size').write_text(f'{width},{height}\n')
+    (sysfs / 'bits_per_pixel').write_text(f'{bpp}\n')
+    (sysfs / 'stride').write_text(f'{stride}\n')
+    device = root / 'fb0'
+    with open(device, 'wb') as f:
+        f.truncate(stride * height * 2)
+    return device, sysfs
+
+class Player:
+    """src/main.py en un proceso aparte, consultado a través de su endpoint de métricas"""
+
+    def __init__(self, env, log_file):
+        self.metrics_url = f"http://127.0.0.1:{env['SRT_PLAYER_METRICS_PORT']}"
+        self.started_at = time.time()
+        self.process = subprocess.Popen([sys.executable, str(BASE_DIR / 'src' / 'main.py')],
+                                        env=env, stdout=log_file, stderr=subprocess.STDOUT)
+
+    def _get(self, path):
+        with urllib.request.urlopen(self.metrics_url + path, timeout=2) as response:
+            return response.read().decode()
+
+    def metrics(self):
+        values = {}
+        try:
+            for line in self._get('/metrics').splitlines():
+                match = METRIC_RE.match(line)
+                if match and match.group(1) not in values:
+                    values[match.group(1)] = float(match.group(2))
+        except OSError:
+            pass
+        return values
+
+    def sessions(self):
+        try:
+            return json.loads(self._get('/sessions'))
+        except (OSError, ValueError):
+            return []
+
+    def wait_session(self, reason, after=0, timeout=30):
+        """Primera sesión de TTFF terminada con el motivo indicado y posterior a `after`"""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            for session in self.sessions():
+                if (session['session'] > after and session['reason'] == reason
+                        and session['outcome'] is not None):
+                    return session
+            time.sleep(0.05)
+        return None
+
+    def last_session_id(self):
+        sessions = self.sessions()
+        return sessions[-1]['session'] if sessions else 0
+
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+def process_tree(pid):
+    """PID indicado y todos sus descendientes"""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+                children.setdefault(ppid, []).append(int(entry))
+            except (OSError, ValueError, IndexError):
+                continue
+    tree, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        tree.append(current)
+        pending.extend(children.get(current, []))
+    return tree
+
+def tree_usage(pid):
+    """(segundos de CPU, bytes residentes) del proceso y sus descendientes"""
+    ticks = os.sysconf('SC_CLK_TCK')
+    page = os.sysconf('SC_PAGE_SIZE')
+    cpu = rss = 0
+    for current in process_tree(pid):
+        try:
+            with open(f'/proc/{current}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            # utime + stime + los de sus hijos ya terminados (los FFmpeg reemplazados cuentan)
+            cpu += sum(int(value) for value in fields[11:15]) / ticks
+            with open(f'/proc/{current}/statm') as f:
+                rss += int(f.read().split()[1]) * page
+        except (OSError, ValueError, IndexError):
+            continue
+    return cpu, rss
+
+def wait_decoder_ranking(player, cache_dir, timeout):
+    """Espera a que el reproductor guarde el ranking de decodificadores; segundos desde su arranque o None"""
+    path = cache_dir / 'decoders.json'
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if json.loads(path.read_text()).get('rankings'):
+                return round(time.time() - player.started_at, 1)
+        except (OSError, ValueError):
+            pass
+        time.sleep(0.5)
+    return None
+
+def measure_steady(player, seconds):
+    """CPU media y memoria máxima mientras se reproduce sin cambios"""
+    start_cpu, _ = tree_usage(player.process.pid)
+    start = time.time()
+    peak_rss = 0
+    while time.time() - start < seconds:
+        peak_rss = max(peak_rss, tree_usage(player.process.pid)[1])
+        time.sleep(0.5)
+    end_cpu, _ = tree_usage(player.process.pid)
+    return {
+        'cpu_percent': round((end_cpu - start_cpu) / (time.time() - start) * 100, 1),
+        'rss_mb': round(peak_rss / 1024 / 1024, 1),
+    }
+
+def measure_switches(player, stub, urls, count):
+    results = []
+    for n in range(count):
+        after = player.last_session_id()
+        stub.assign('*', urls[(n + 1) % len(urls)])
+        session = player.wait_session('assignment_change', after)
+        time.sleep(0.5)
+        gap = player.metrics().get('srtplayer_switch_gap_seconds')
+        results.append({
+            'ttff_ms': session['ttff_ms'] if session else None,
+            'gap_ms': round(gap * 1000, 1) if gap is not None else None,
+        })
+        time.sleep(2)
+    ttffs = [r['ttff_ms'] for r in results if r['ttff_ms'] is not None]
+    gaps = [r['gap_ms'] for r in results if r['gap_ms'] is not None]
+    return {
+        'runs': results,
+        'ttff_ms_median': statistics.median(ttffs) if ttffs else None,
+        'gap_ms_median': statistics.median(gaps) if gaps else None,
+        'failed': len(results) - len(ttffs),
+    }
+
+def measure_recovery(player, sender, loss_seconds, timeout=60):
+    """Corta el emisor activo `loss_seconds` y mide cuánto tarda la imagen en volver a avanzar"""
+    sender.pause_for(loss_seconds)
+    time.sleep(loss_seconds)
+    while sender.paused.is_set():
+        time.sleep(0.01)
+    resumed_at = time.time()
+    previous = None
+    while time.time() - resumed_at < timeout:
+        metrics = player.metrics()
+        frames = metrics.get('srtplayer_frames')
+        if metrics.get('srtplayer_playing') and previous is not None and frames not in (None, previous):
+            return round((time.time() - resumed_at) * 1000)
+        previous = frames
+        time.sleep(0.05)
+    return None
+
+def git_version():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=BASE_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de extremo a extremo del reproductor')
+    parser.add_argument('--size', default='1280x720', help='Resolución de la señal de prueba')
+    parser.add_argument('--fb-size', default='1920x1080', help='Resolución del framebuffer falso')
+    parser.add_argument('--switches', type=int, default=5, help='Cambios de URL a medir')
+    parser.add_argument('--loss', type=float, default=3, help='Duración de la pérdida del emisor (s)')
+    parser.add_argument('--steady', type=float, default=20, help='Segundos de medida de CPU y memoria')
+    parser.add_argument('--warm-cache', action='store_true',
+                        help='Usar la caché del repositorio (por defecto se arranca en frío)')
+    parser.add_argument('--ranking-timeout', type=float, default=300,
+                        help='Espera máxima a la medición de decodificadores antes de medir CPU (s)')
+    parser.add_argument('--output', default=None, help='Fichero JSON de resultados (por defecto stdout)')
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix='srt-bench-'))
+    width, height = (int(v) for v in args.fb_size.split('x'))
+    fb_device, fb_sysfs = fake_framebuffer(workdir, width, height)
+
+    senders = [PausableSender(free_port(socket.SOCK_DGRAM), args.size).start() for _ in range(2)]
+    urls = [sender.url for sender in senders]
+    stub = StubServer(srt_url=urls[0]).start()
+
+    env = {
+        **os.environ,
+        'PYTHONUNBUFFERED': '1',
+        'SRT_PLAYER_PROXY_URL': stub.url,
+        'SRT_PLAYER_FB_DEVICE': str(fb_device),
+        'SRT_PLAYER_FB_SYSFS': str(fb_sysfs),
+        'SRT_PLAYER_AUDIO_DEVICE': 'null',
+        'SRT_PLAYER_METRICS_PORT': str(free_port()),
+        'SRT_PLAYER_OVERLAY_FILE': str(workdir / 'overlay.txt'),
+        'SRT_PLAYER_LOG_FORMAT': 'json',
+    }
+    if not args.warm_cache:
+        env['SRT_PLAYER_CACHE_DIR'] = str(workdir / 'cache')
+
+    # Los emisores necesitan un momento para abrir el listener SRT
+    time.sleep(2)
+    log_path = workdir / 'player.log'
+    results = {'version': git_version(), 'config': vars(args)}
+    with open(log_path, 'w') as log_file:
+        player = Player(env, log_file)
+        try:
+            boot = player.wait_session('boot', timeout=60)
+            results['ttff_boot_ms'] = boot['ttff_ms'] if boot else None
+            results['boot_phases_ms'] = boot['phases_ms'] if boot else None
+            cache_dir = Path(env.get('SRT_PLAYER_CACHE_DIR', BASE_DIR / '.cache'))
+            results['decoder_ranking_s'] = wait_decoder_ranking(player, cache_dir, args.ranking_timeout)
+            results['steady'] = measure_steady(player, args.steady)
+            results['switch'] = measure_switches(player, stub, urls, args.switches)
+            # Tras un número par de cambios se vuelve a la primera URL
+            active = senders[args.switches % len(senders)]
+            results['recovery_ms'] = measure_recovery(player, active, args.loss)
+            results['control_plane_requests'] = stub.state.requests
+        finally:
+            player.stop()
+            stub.stop()
+            for sender in senders:
+                sender.stop()
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        Path(args.output).write_text(output + '\n')
+        print(f"📊 Resultados en {args.output} (log del reproductor: {log_path})")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,5 @@
 import os
 from pathlib import Path
-import subprocess
 import uuid
 
 # Detectar entorno de desarrollo
@@ -9,6 +8,12 @@ IS_DEV = os.uname().sysname == 'Darwin'  # True si estamos en macOS
 # Rutas base
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
 ASSETS_DIR = BASE_DIR / 'assets'
+# Datos derivados (slate pre-renderizado, etc.); los benchmarks usan un directorio propio
+CACHE_DIR = Path(os.environ.get('SRT_PLAYER_CACHE_DIR', BASE_DIR / '.cache'))
+
+# Framebuffer (se pueden redirigir a un árbol sysfs y un fichero falsos para pruebas)
+FB_DEVICE = os.environ.get('SRT_PLAYER_FB_DEVICE', '/dev/fb0')
+FB_SYSFS_DIR = os.environ.get('SRT_PLAYER_FB_SYSFS', '/sys/class/graphics/fb0')
 
 # Archivo para almacenar el ID persistente
 DEVICE_ID_FILE = BASE_DIR / 'device_id.txt'
@@ -22,9 +27,16 @@ def get_device_id():
                 if device_id:
                     return device_id
 
-        # Obtener el número de serie de la Raspberry Pi
-        cmd = "cat /proc/cpuinfo | grep Serial | cut -d ' ' -f 2"
-        serial = subprocess.check_output(cmd, shell=True).decode().strip()
+        # Obtener el número de serie de la Raspberry Pi (sin lanzar procesos)
+        serial = None
+        try:
+            with open('/proc/cpuinfo') as f:
+                for line in f:
+                    if line.startswith('Serial'):
+                        serial = line.split(':', 1)[1].strip()
+        except OSError:
+            # Sin /proc/cpuinfo (macOS en desarrollo): se usa un ID aleatorio
+            pass
         if serial:
             # Toma los últimos 6 caracteres del serial
             device_id = f'PLAYER_{serial[-6:].upper()}'
@@ -45,15 +57,162 @@ def get_device_id():
 DEVICE_ID = get_device_id()
 print(f"Iniciando con DEVICE_ID: {DEVICE_ID}")
 
+# Logs
+LOG_LEVEL = os.environ.get('SRT_PLAYER_LOG_LEVEL', 'info')    # 'debug', 'info', 'warning' o 'error'
+LOG_FORMAT = os.environ.get('SRT_PLAYER_LOG_FORMAT', 'text')  # 'text' o 'json' (una línea por registro)
+LOG_RATE_LIMIT = 20      # Mensajes por categoría y ventana; el resto se cuenta y se descarta
+LOG_RATE_WINDOW = 60     # Ventana del límite por categoría (segundos)
+LOG_DEDUP_WINDOW = 300   # Un mensaje idéntico al anterior de su categoría sólo se cuenta
+LOG_DEBUG_BUFFER = 200   # Registros de depuración en memoria que se vuelcan junto a un error
+LOG_QUEUE_SIZE = 1000    # Registros pendientes de escribir antes de empezar a descartar
+
 # URL del servidor proxy local - AJUSTA ESTO A LA IP DE TU SERVIDOR
 if IS_DEV:
     PROXY_URL = 'http://localhost:3000'  # URL para desarrollo
 else:
     PROXY_URL = 'http://192.168.1.51:3000'  # URL para producción
+PROXY_URL = os.environ.get('SRT_PLAYER_PROXY_URL', PROXY_URL)  # Stub local en pruebas y benchmarks
 
 # Intervalos de consulta (en segundos)
 PROXY_CHECK_INTERVAL = 5   # Consultar servidor proxy cada 5 segundos
 CONFIG_CHECK_INTERVAL = 5   # Consultar configuración SRT cada 5 segundos
+HEARTBEAT_INTERVAL = 3      # Latido al servidor de streaming (umbral del servidor: 10 s)
+PROXY_REFRESH_INTERVAL = 60 # Registro completo en el proxy aunque no cambie nada
+PUBLIC_IP_TTL = 3600        # Validez de la IP pública en caché
+PUBLIC_IP_RETRY = 60        # Reintento de la IP pública si la consulta falla
+
+# Suscripción a cambios de asignación (SSE o long-poll sobre el servidor de streaming)
+SUBSCRIPTION_ENABLED = True
+SUBSCRIPTION_TIMEOUT = 30            # Duración máxima de cada long-poll (segundos)
+SUBSCRIPTION_RETRY_INTERVAL = 300    # Reintento si el servidor no soporta suscripciones
+
+# Cambio de URL SRT
+# 'make-before-break': arranca el nuevo pipeline mientras el anterior sigue pintando
+# y corta sólo cuando el nuevo decodifica su primer frame.
+# 'break-before-make': comportamiento clásico (parar, esperar y volver a arrancar).
+SWITCH_MODE = 'make-before-break'
+SWITCH_FIRST_FRAME_TIMEOUT = 10  # Segundos máximos esperando el primer frame del nuevo pipeline
+SWITCH_RETRY_INTERVAL = 30       # Reintento de una reconfiguración fallida (el pipeline actual sigue)
+
+# Perfil de reproducción por defecto ('ultra-low-latency', 'balanced' o 'resilient').
+# El servidor puede indicar otro por dispositivo con el campo 'profile' de su respuesta.
+PLAYBACK_PROFILE = 'balanced'
+
+# Latencia SRT adaptativa: sube con pérdidas/cortes y baja cuando el enlace está limpio.
+# Nunca baja de la latencia del perfil; los cambios se aplican con un cambio sin corte.
+ADAPTIVE_LATENCY = True
+ADAPTIVE_WINDOW = 20              # Ventana de evaluación (segundos)
+ADAPTIVE_RAISE_ERRORS = 10        # Errores o datos dañados por minuto que suben la latencia
+ADAPTIVE_CLEAN_PERIOD = 300       # Segundos sin errores para bajar un escalón
+ADAPTIVE_MIN_INTERVAL = 60        # Separación mínima entre ajustes
+ADAPTIVE_LATENCY_FACTOR = 1.5     # Tamaño de cada escalón
+ADAPTIVE_LATENCY_MAX = 4000000    # Latencia máxima (µs)
+ADAPTIVE_RCVBUF_MAX = 67108864    # Buffer de recepción máximo (bytes)
+STALL_THRESHOLD = 1.0             # Segundos sin frames nuevos que cuentan como corte
+
+# Reparto de la única conexión SRT: el FFmpeg principal envía una copia (sin recodificar) a un
+# puerto UDP local y de ahí se alimentan la grabación y la vista previa. Las salidas se activan
+# aquí o desde el servidor (campo 'sinks': {"recording": true, "preview": false}). Habilitado, la
+# copia está siempre en el FFmpeg principal: activar una salida no reconecta la fuente.
+# SRT_PLAYER_FANOUT=0 la quita en dispositivos que nunca graban ni sirven vista previa
+FANOUT_ENABLED = os.environ.get('SRT_PLAYER_FANOUT', '1') == '1'
+FANOUT_PORT = 5600                    # Relé local; las salidas escuchan en los puertos siguientes
+RECORDING_ENABLED = False
+RECORDING_DIR = BASE_DIR / 'recordings'
+RECORDING_SEGMENT_SECONDS = 60
+RECORDING_MAX_BYTES = 2 * 1024 ** 3   # Se borran los segmentos más antiguos por encima de este tamaño
+PREVIEW_ENABLED = False
+PREVIEW_DIR = CACHE_DIR / 'preview'
+PREVIEW_PORT = 8081                   # HLS servido en la red local
+PREVIEW_HEIGHT = 360
+PREVIEW_BITRATE = '600k'
+
+# Captura de pantalla enviada con el latido (0 = desactivada)
+SNAPSHOT_INTERVAL = 60    # Segundos entre capturas
+SNAPSHOT_WIDTH = 320      # Ancho aproximado de la captura (se reduce por saltos enteros)
+SNAPSHOT_QUALITY = 70     # Calidad JPEG
+
+# Salida de audio ALSA ('null' permite probar sin tarjeta de sonido)
+AUDIO_DEVICE = os.environ.get('SRT_PLAYER_AUDIO_DEVICE', 'sysdefault:CARD=vc4hdmi0')
+# 'alsa': FFmpeg escribe en ALSA con su buffer por defecto
+# 'aplay': FFmpeg entrega PCM por una tubería a aplay, con buffer y periodo configurables
+AUDIO_OUTPUT = os.environ.get('SRT_PLAYER_AUDIO_OUTPUT', 'alsa')
+AUDIO_SAMPLE_RATE = 48000
+AUDIO_BUFFER_TIME = int(os.environ.get('SRT_PLAYER_AUDIO_BUFFER_US', 200000))  # Sólo con aplay
+AUDIO_PERIOD_TIME = int(os.environ.get('SRT_PLAYER_AUDIO_PERIOD_US', 50000))   # Sólo con aplay
+AUDIO_RESAMPLE_ASYNC = 1000      # Muestras/s que aresample puede estirar o comprimir (0 = sin compensar)
+AUDIO_SAMPLE_INTERVAL = 1        # Cada cuánto se mide el retardo de audio (segundos)
+AV_OFFSET_ENABLED = True         # Medir el desfase audio/vídeo con los pts de salida de FFmpeg
+
+# Watchdog de imagen congelada (el proceso sigue vivo pero no avanza)
+WATCHDOG_ENABLED = True
+WATCHDOG_INTERVAL = 0.2          # Cada cuánto se revisa el avance (segundos)
+WATCHDOG_STALL_DEADLINE = 0.8    # Segundos sin avance antes de recuperar
+
+# Etapa de salida opcional: FFmpeg entrega frames raw y un único escritor los copia al framebuffer.
+# Permite cambiar de fuente sin corte ni solape en pantalla, a cambio de copiar cada frame en Python
+OUTPUT_STAGE = os.environ.get('SRT_PLAYER_OUTPUT_STAGE') == '1'
+OUTPUT_DOUBLE_BUFFER = True      # Escribir en la página oculta y paginar (sin tearing)
+OUTPUT_TIMING_WINDOW = 250       # Frames con los que se calculan tiempos de escritura y jitter
+
+# Conmutación a respaldos: URLs de respaldo del servidor y, como último recurso, un clip local
+FAILOVER_ENABLED = True
+FAILOVER_DELAY = 2               # Espera mayor que esta antes del reintento -> se pasa a un respaldo
+FAILOVER_LOOP = True             # Usar el clip local cuando no queda ningún respaldo disponible
+FAILOVER_BACKUP_COOLDOWN = 60    # Un respaldo que falla no se vuelve a intentar en este tiempo
+LOOP_CLIP = ASSETS_DIR / 'loop.mp4'  # Sin el clip se muestra en bucle la imagen por defecto
+
+# Rótulo en pantalla (id del dispositivo, fps, bitrate y estado) que se muestra u oculta sin
+# reiniciar FFmpeg: drawtext relee un fichero de texto (en tmpfs para no gastar la SD).
+# Habilitado, el filtro está siempre en la cadena aunque el rótulo esté oculto
+OVERLAY_ENABLED = os.environ.get('SRT_PLAYER_OVERLAY') == '1'
+OVERLAY_VISIBLE = False          # Estado inicial si el servidor no indica nada
+OVERLAY_INTERVAL = 1             # Cada cuánto se actualiza el texto (segundos)
+OVERLAY_RELOAD_FRAMES = 25       # drawtext relee el fichero cada N frames (FFmpeg < 5: en cada frame)
+OVERLAY_FILE = Path(os.environ.get('SRT_PLAYER_OVERLAY_FILE',
+                                   '/dev/shm/srt-player-overlay.txt' if os.path.isdir('/dev/shm')
+                                   else CACHE_DIR / 'overlay.txt'))
+OVERLAY_FONT = '/usr/share/fonts/truetype/dejavu/DejaVuSansMono.ttf'
+OVERLAY_FONT_SIZE = 28
+
+# Última asignación válida guardada en disco: al arrancar se reproduce sin esperar al proxy
+ASSIGNMENT_CACHE_ENABLED = True
+ASSIGNMENT_CACHE_FILE = CACHE_DIR / 'assignment.json'
+ASSIGNMENT_CACHE_MAX_AGE = 7 * 24 * 3600   # Más antigua que esto no se usa (0 = sin límite)
+
+# Sesiones de reproducción (tiempo hasta el primer frame) que se guardan en memoria
+TTFF_HISTORY = 100
+
+# Sondeo de hardware al arrancar (se guarda por boot id: reiniciar el servicio no repite el sondeo)
+PROBE_CACHE_ENABLED = True
+
+# Selección de decodificador (medición única por versión de FFmpeg, guardada en CACHE_DIR)
+DECODER_SELECTION = True
+DECODER_BENCH_SECONDS = 2     # Duración del clip de prueba generado
+DECODER_DEMOTE_ERRORS = 20    # Errores del propio decodificador que cuentan como sesión fallida
+DECODER_DEMOTE_SESSIONS = 3   # Sesiones fallidas (dentro de la ventana) que degradan un decodificador acelerado
+DECODER_DEMOTE_WINDOW = 6 * 3600   # Ventana en la que se acumulan las sesiones fallidas
+DECODER_DEMOTE_TTL = 24 * 3600     # Duración de una degradación; después se vuelve a probar
+DECODER_BENCH_IDLE_AFTER = 10      # Segundos sin arranques ni cambios antes de medir decodificadores
+
+# Endpoint de métricas (formato Prometheus en /metrics, sesiones de TTFF en /sessions)
+METRICS_ENABLED = True
+# Sólo local por defecto; SRT_PLAYER_METRICS_HOST=0.0.0.0 para que se recojan desde otra máquina
+METRICS_HOST = os.environ.get('SRT_PLAYER_METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.environ.get('SRT_PLAYER_METRICS_PORT', 9101))
+
+# Supervisor
+SLATE_REFRESH_INTERVAL = 30  # Repintado del slate mientras no hay asignación
+
+# Política de reinicio de FFmpeg (backoff exponencial con jitter por dispositivo y circuit breaker)
+RESTART_FAST_RETRIES = 2              # Reintentos rápidos para fallos transitorios
+RESTART_FAST_DELAY = 1                # Espera de un reintento rápido (segundos)
+RESTART_BACKOFF_BASE = 2              # Primera espera del backoff exponencial
+RESTART_BACKOFF_MAX = 60              # Espera máxima del backoff
+RESTART_CIRCUIT_THRESHOLD = 8         # Fallos seguidos que abren el circuito
+RESTART_CIRCUIT_PROBE_INTERVAL = 30   # Sondeo de la fuente con el circuito abierto
+RESTART_PROBE_TIMEOUT = 8             # Tiempo máximo de un sondeo con ffprobe
+RESTART_STABLE_AFTER = 30             # Reproduciendo este tiempo, un corte cuenta como transitorio
 
 # El SERVER_URL se establecerá dinámicamente
 SERVER_URL = None 
\ No newline at end of file
@@ -0,0 +1,167 @@
+import fcntl
+import os
+import stat
+import struct
+from config.settings import FB_DEVICE, FB_SYSFS_DIR
+
+# ioctl de Linux para leer/escribir la información variable del framebuffer y paginar
+FBIOGET_VSCREENINFO = 0x4600
+FBIOPUT_VSCREENINFO = 0x4601
+FBIOPAN_DISPLAY = 0x4606
+
+# struct fb_var_screeninfo: xres, yres, xres_virtual, yres_virtual, xoffset, yoffset,
+# bits_per_pixel, grayscale y (offset, length, msb_right) de rojo, verde, azul y alfa
+_VAR_SCREENINFO = struct.Struct('=8I12I')
+_VAR_SCREENINFO_SIZE = 160
+
+# Valores con los que se ha trabajado siempre si no hay información disponible
+_DEFAULT_GEOMETRY = (1920, 1080, 16)
+
+_cached_info = None
+
+class FramebufferInfo:
+    """Descriptor del framebuffer: resolución, stride y formato de pixel nativo"""
+
+    def __init__(self, device, width, height, bpp, stride, red_offset=None, virtual_height=None):
+        self.device = device
+        self.width = width
+        self.height = height
+        self.bpp = bpp
+        self.stride = stride
+        self.red_offset = red_offset
+        self.virtual_height = virtual_height or height
+
+    @property
+    def pix_fmt(self):
+        """Formato de pixel de FFmpeg que coincide con el layout del framebuffer"""
+        if self.bpp == 16:
+            return 'rgb565le'
+        if self.bpp == 24:
+            return 'rgb24' if self.red_offset == 0 else 'bgr24'
+        if self.bpp == 32:
+            return 'rgba' if self.red_offset == 0 else 'bgra'
+        raise ValueError(f'Profundidad de color no soportada: {self.bpp} bpp')
+
+    @property
+    def row_bytes(self):
+        """Bytes útiles de una línea (sin el relleno hasta el stride)"""
+        return self.width * self.bpp // 8
+
+    @property
+    def frame_size(self):
+        """Bytes que ocupa un frame completo en memoria del framebuffer"""
+        return self.stride * self.height
+
+    def video_filter(self, overlay=None, pad_to_stride=False, timestamps=None):
+        """Filtro que escala y convierte al formato nativo en una sola pasada"""
+        filters = [f'scale={self.width}:{self.height}:flags=fast_bilinear']
+        if overlay:
+            # El texto se dibuja ya a la resolución de salida
+            filters.append(overlay)
+        stride_pixels = self.stride * 8 // self.bpp
+        if pad_to_stride and stride_pixels != self.width:
+            filters.append(f'pad={stride_pixels}:{self.height}')
+        filters.append(f'format={self.pix_fmt}')
+        if timestamps:
+            # Al final de la cadena: el pts es el del frame que se escribe
+            filters.append(timestamps)
+        return ','.join(filters)
+
+    def rawvideo_output_args(self, target='pipe:1', overlay=None, timestamps=None):
+        """Frames raw con el layout exacto del framebuffer (incluido el relleno hasta el stride)"""
+        return [
+            '-vf', self.video_filter(overlay, pad_to_stride=True, timestamps=timestamps),
+            '-pix_fmt', self.pix_fmt,
+            '-f', 'rawvideo',
+            target
+        ]
+
+    def ffmpeg_output_args(self, overlay=None, timestamps=None):
+        """Argumentos de salida de FFmpeg para pintar directamente en el framebuffer"""
+        return [
+            '-vf', self.video_filter(overlay, timestamps=timestamps),
+            '-pix_fmt', self.pix_fmt,
+            '-f', 'fbdev',
+            self.device
+        ]
+
+    def __repr__(self):
+        return (f'FramebufferInfo({self.device}, {self.width}x{self.height}, '
+                f'{self.bpp}bpp, stride={self.stride}, {self.pix_fmt})')
+
+def _read_sysfs(sysfs_dir, name):
+    with open(os.path.join(sysfs_dir, name)) as f:
+        return f.read().strip()
+
+def read_var_screeninfo(device):
+    """Lee fb_var_screeninfo mediante ioctl (sólo en dispositivos reales, None si no aplica)"""
+    try:
+        if not stat.S_ISCHR(os.stat(device).st_mode):
+            return None
+        with open(device, 'rb') as fb:
+            buf = bytearray(_VAR_SCREENINFO_SIZE)
+            fcntl.ioctl(fb.fileno(), FBIOGET_VSCREENINFO, buf)
+        return _VAR_SCREENINFO.unpack_from(buf)
+    except OSError:
+        return None
+
+def set_virtual_height(device, virtual_height):
+    """Pide al driver una altura virtual mínima (p.ej. el doble para paginar). Devuelve la obtenida"""
+    try:
+        if not stat.S_ISCHR(os.stat(device).st_mode):
+            return None
+        with open(device, 'r+b') as fb:
+            buf = bytearray(_VAR_SCREENINFO_SIZE)
+            fcntl.ioctl(fb.fileno(), FBIOGET_VSCREENINFO, buf)
+            values = list(_VAR_SCREENINFO.unpack_from(buf))
+            if values[3] < virtual_height:
+                values[3] = virtual_height
+                _VAR_SCREENINFO.pack_into(buf, 0, *values)
+                fcntl.ioctl(fb.fileno(), FBIOPUT_VSCREENINFO, buf)
+                fcntl.ioctl(fb.fileno(), FBIOGET_VSCREENINFO, buf)
+            return _VAR_SCREENINFO.unpack_from(buf)[3]
+    except OSError:
+        return None
+
+def pan_display(fd, yoffset, buf=None):
+    """Muestra la página que empieza en la línea `yoffset`. False si el driver no pagina"""
+    try:
+        if buf is None:
+            buf = bytearray(_VAR_SCREENINFO_SIZE)
+            fcntl.ioctl(fd, FBIOGET_VSCREENINFO, buf)
+        struct.pack_into('=I', buf, 20, yoffset)  # Campo yoffset
+        fcntl.ioctl(fd, FBIOPAN_DISPLAY, buf)
+        return True
+    except OSError:
+        return False
+
+def read_framebuffer_info(sysfs_dir=FB_SYSFS_DIR, device=FB_DEVICE):
+    """Lee la geometría real del framebuffer desde sysfs"""
+    try:
+        width, height = (int(v) for v in _read_sysfs(sysfs_dir, 'virtual_size').split(','))
+        bpp = int(_read_sysfs(sysfs_dir, 'bits_per_pixel'))
+    except (OSError, ValueError):
+        width, height, bpp = _DEFAULT_GEOMETRY
+    virtual_height = height
+
+    try:
+        stride = int(_read_sysfs(sysfs_dir, 'stride'))
+    except (OSError, ValueError):
+        stride = width * bpp // 8
+
+    # virtual_size puede ser mayor que la zona visible (p.ej. doble buffer)
+    red_offset = None
+    var_info = read_var_screeninfo(device)
+    if var_info:
+        width, height, _, virtual_height = var_info[:4]
+        bpp = var_info[6]
+        red_offset = var_info[8]
+
+    return FramebufferInfo(device, width, height, bpp, stride, red_offset, virtual_height)
+
+def get_framebuffer_info(refresh=False):
+    """Devuelve el descriptor del framebuffer configurado (se lee una sola vez)"""
+    global _cached_info
+    if _cached_info is None or refresh:
+        _cached_info = read_framebuffer_info()
+    return _cached_info
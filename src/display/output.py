@@ -0,0 +1,196 @@
+import collections
+import fcntl
+import mmap
+import os
+import stat
+import threading
+import time
+from config.settings import OUTPUT_DOUBLE_BUFFER, OUTPUT_TIMING_WINDOW
+from display.framebuffer import (get_framebuffer_info, set_virtual_height, pan_display,
+                                 FBIOGET_VSCREENINFO)
+from network.client import log
+
+# fcntl de Linux para agrandar una tubería (menos lecturas por frame)
+F_SETPIPE_SZ = 1031
+PIPE_SIZE = 1024 * 1024
+
+class FrameTiming:
+    """Tiempos de escritura e intervalos entre frames de las últimas `window` escrituras"""
+
+    def __init__(self, window=OUTPUT_TIMING_WINDOW):
+        self.writes = collections.deque(maxlen=window)
+        self.intervals = collections.deque(maxlen=window)
+        self._last_start = None
+
+    def record(self, start, end):
+        if self._last_start is not None:
+            self.intervals.append(start - self._last_start)
+        self._last_start = start
+        self.writes.append(end - start)
+
+    def as_dict(self):
+        writes, intervals = list(self.writes), list(self.intervals)
+        mean = sum(intervals) / len(intervals) if intervals else 0
+        jitter = (sum((i - mean) ** 2 for i in intervals) / len(intervals)) ** 0.5 if intervals else 0
+        return {
+            'write_ms_avg': round(sum(writes) / len(writes) * 1000, 3) if writes else 0,
+            'write_ms_max': round(max(writes) * 1000, 3) if writes else 0,
+            'interval_ms_avg': round(mean * 1000, 3),
+            'jitter_ms': round(jitter * 1000, 3),
+        }
+
+class OutputStage:
+    """Etapa de salida de larga duración: copia al framebuffer los frames raw de la fuente activa.
+
+    Cada FFmpeg de fuente escribe frames ya escalados y con el layout del framebuffer en su stdout.
+    Todas las fuentes se leen siempre (si no, FFmpeg se bloquearía antes de su primer frame), pero
+    sólo los frames de la fuente activa llegan a la pantalla. Cambiar de fuente es cambiar un PID:
+    el escritor no se reinicia y, mientras no llegan frames nuevos, queda en pantalla el último.
+
+    Con doble buffer cada frame se copia en la página oculta de un framebuffer de doble altura y
+    se pagina con FBIOPAN_DISPLAY, así nunca se ve un frame a medio escribir. Con un fichero normal
+    como framebuffer (pruebas, benchmarks) se usan igualmente dos páginas, sin ioctl.
+    """
+
+    def __init__(self, fb=None):
+        self.fb = fb or get_framebuffer_info()
+        self.frame_size = self.fb.stride * self.fb.height
+        self.active_pid = None
+        self.frames_written = 0
+        self.last_write_at = None
+        self.pages = 1
+        self.visible_page = 0
+        self.timing = FrameTiming()
+        self.switch_gap = None     # Último cambio de fuente: último frame de la anterior -> primero de la nueva
+        self.switched = threading.Event()
+        self.switched.set()
+        self._switch_from = None
+        self._write_started_at = None
+        self._file = None
+        self._mm = None
+        self._pan_buf = None
+        self._lock = threading.Lock()
+
+    def _map(self):
+        if self._mm is None:
+            is_device = stat.S_ISCHR(os.stat(self.fb.device).st_mode)
+            if OUTPUT_DOUBLE_BUFFER:
+                self.pages = self._setup_pages(is_device)
+            self._file = open(self.fb.device, 'r+b')
+            self._mm = mmap.mmap(self._file.fileno(), self.frame_size * self.pages)
+            if is_device and self.pages > 1:
+                # Copia de fb_var_screeninfo que se reutiliza en cada paginado
+                self._pan_buf = bytearray(160)
+                fcntl.ioctl(self._file.fileno(), FBIOGET_VSCREENINFO, self._pan_buf)
+            log("OUTPUT", "info", f"Framebuffer con {self.pages} página(s) en {self.fb.device}")
+        return self._mm
+
+    def _setup_pages(self, is_device):
+        """Número de páginas utilizables: 2 si el framebuffer admite doble altura"""
+        height = self.fb.height * 2
+        if is_device:
+            virtual_height = set_virtual_height(self.fb.device, height)
+            if not virtual_height or virtual_height < height:
+                log("OUTPUT", "warning", "El driver no admite doble buffer, se escribe en la página visible")
+                return 1
+            self.fb.virtual_height = virtual_height
+            return 2
+        # Framebuffer falso: el fichero se amplía para alojar las dos páginas
+        if os.path.getsize(self.fb.device) < self.frame_size * 2:
+            os.truncate(self.fb.device, self.frame_size * 2)
+        return 2
+
+    def add_source(self, process):
+        """Empieza a leer los frames de un FFmpeg de fuente"""
+        try:
+            fcntl.fcntl(process.stdout.fileno(), F_SETPIPE_SZ, PIPE_SIZE)
+        except OSError:
+            pass
+        threading.Thread(target=self._reader, args=(process.pid, process.stdout),
+                         name=f'output-{process.pid}', daemon=True).start()
+
+    def activate(self, pid):
+        """A partir de ahora se pintan los frames de este proceso"""
+        if pid != self.active_pid:
+            log("OUTPUT", "debug", f"Fuente activa: PID {pid}")
+            with self._lock:
+                self._switch_from = self.last_write_at
+                self.switch_gap = None
+                self.switched.clear()
+                self.active_pid = pid
+
+    def _reader(self, pid, stream):
+        buffer = bytearray(self.frame_size)
+        view = memoryview(buffer)
+        try:
+            while True:
+                filled = 0
+                while filled < self.frame_size:
+                    count = stream.readinto(view[filled:])
+                    if not count:
+                        return
+                    filled += count
+                if pid == self.active_pid:
+                    self._write(view)
+        except (OSError, ValueError):
+            pass
+        finally:
+            try:
+                stream.close()
+            except OSError:
+                pass
+
+    def _write(self, frame):
+        with self._lock:
+            start = time.perf_counter()
+            self._write_started_at = time.time()
+            try:
+                self._blit(frame)
+            except (OSError, ValueError) as e:
+                log("OUTPUT", "error", f"Error escribiendo en el framebuffer: {e}")
+            self.last_write_at = time.time()
+            self._write_started_at = None
+            if not self.switched.is_set():
+                if self._switch_from is not None:
+                    self.switch_gap = self.last_write_at - self._switch_from
+                self.switched.set()
+            self.frames_written += 1
+            self.timing.record(start, time.perf_counter())
+
+    def _blit(self, frame):
+        """Copia el frame en la página oculta y la muestra"""
+        mm = self._map()
+        page = (self.visible_page + 1) % self.pages
+        offset = page * self.frame_size
+        mm[offset:offset + self.frame_size] = frame
+        if page != self.visible_page:
+            self._flip(page)
+
+    def show(self, frame):
+        """Pinta un frame que no viene de ninguna fuente (el slate) respetando el paginado"""
+        with self._lock:
+            # Ninguna fuente vieja debe pintar encima
+            self.active_pid = None
+            self._blit(frame)
+
+    def _flip(self, page):
+        if self._pan_buf is not None and not pan_display(self._file.fileno(), page * self.fb.height,
+                                                         self._pan_buf):
+            # Sin paginado no se puede mostrar la segunda página: se vuelve a una sola
+            log("OUTPUT", "warning", "FBIOPAN_DISPLAY falló, se desactiva el doble buffer")
+            self.pages = 1
+            return
+        self.visible_page = page
+
+    def write_blocked(self, deadline):
+        """True si una escritura al framebuffer lleva más de `deadline` segundos"""
+        started = self._write_started_at
+        return started is not None and time.time() - started > deadline
+
+    def as_dict(self):
+        return {
+            'frames': self.frames_written,
+            'pages': self.pages,
+            'visible_page': self.visible_page,
+            **self.timing.as_dict(),
+        }
@@ -0,0 +1,99 @@
+import os
+import subprocess
+from config.settings import (DEVICE_ID, OVERLAY_FILE, OVERLAY_VISIBLE, OVERLAY_FONT, OVERLAY_FONT_SIZE,
+                             OVERLAY_RELOAD_FRAMES)
+from network.client import log
+
+# Longitud máxima del texto: el coste de drawtext crece con el número de glifos
+MAX_TEXT_LENGTH = 160
+
+def font_available():
+    """drawtext sin fontfile depende de fontconfig y, si falla, tumba el FFmpeg de reproducción"""
+    if os.path.exists(OVERLAY_FONT):
+        return True
+    log("OVERLAY", "warning", f"Fuente {OVERLAY_FONT} no encontrada, rótulo desactivado")
+    return False
+
+def reload_option(frames=OVERLAY_RELOAD_FRAMES):
+    """Opción reload de drawtext: un intervalo en frames desde FFmpeg 5; antes sólo 0/1 (cada frame)"""
+    try:
+        result = subprocess.run(['ffmpeg', '-hide_banner', '-h', 'filter=drawtext'],
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, timeout=5)
+        line = next((l for l in result.stdout.splitlines() if l.strip().startswith('reload ')), '')
+    except (OSError, subprocess.SubprocessError):
+        line = ''
+    return f'reload={frames}' if '<int>' in line else 'reload=1'
+
+class Overlay:
+    """Rótulo de identificación dibujado por drawtext dentro del pipeline en marcha.
+
+    El filtro se añade siempre que el rótulo esté habilitado y lee su texto de un fichero
+    cada OVERLAY_RELOAD_FRAMES frames. Mostrar, ocultar o cambiar el texto es reescribir ese
+    fichero: FFmpeg no se reinicia. Oculto, el fichero está vacío y drawtext no dibuja nada.
+    """
+
+    def __init__(self, path=OVERLAY_FILE, visible=OVERLAY_VISIBLE):
+        self.path = path
+        self.visible = visible
+        self.text = ''
+        self._written = None
+        self._reload = reload_option()
+
+    def filter(self):
+        """Filtro drawtext para la cadena de vídeo (crea el fichero si aún no existe)"""
+        if self._written is None:
+            self._write(self.text if self.visible else '')
+        options = [
+            f"fontfile='{OVERLAY_FONT}'",
+            f"textfile='{self.path}'",
+            self._reload,
+            'expansion=none',
+            'fontcolor=white',
+            f'fontsize={OVERLAY_FONT_SIZE}',
+            'box=1',
+            'boxcolor=black@0.6',
+            'boxborderw=10',
+            'x=24',
+            'y=24',
+        ]
+        return 'drawtext=' + ':'.join(options)
+
+    def set_visible(self, visible):
+        if visible != self.visible:
+            log("OVERLAY", "info", "Rótulo visible" if visible else "Rótulo oculto")
+            self.visible = visible
+        self._write(self.text if visible else '')
+
+    def toggle(self):
+        self.set_visible(not self.visible)
+
+    def update(self, text):
+        """Cambia el texto (sólo se escribe en disco si cambia lo que se ve)"""
+        self.text = text[:MAX_TEXT_LENGTH]
+        if self.visible:
+            self._write(self.text)
+
+    def _write(self, content):
+        if content == self._written:
+            return
+        # Escritura atómica: drawtext nunca lee un texto a medias
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = self.path.with_suffix('.tmp')
+            with open(tmp_file, 'w') as f:
+                f.write(content)
+            os.replace(tmp_file, self.path)
+            self._written = content
+        except OSError as e:
+            log("OVERLAY", "warning", f"No se pudo actualizar el rótulo: {e}")
+
+def status_text(state, stats, srt_url=None):
+    """Texto del rótulo: id del dispositivo, estado, fps/bitrate y fuente"""
+    lines = [DEVICE_ID]
+    status = state or 'IDLE'
+    if stats:
+        status += f' | {stats.fps:.1f} fps | {stats.bitrate_kbps:.0f} kbps'
+    lines.append(status)
+    if srt_url:
+        lines.append(srt_url.split('?', 1)[0])
+    return '\n'.join(lines)
@@ -1,26 +1,137 @@
+import hashlib
+import mmap
+import os
 import subprocess
-from config.settings import ASSETS_DIR
+from config.settings import ASSETS_DIR, CACHE_DIR
+from display.framebuffer import get_framebuffer_info, pan_display
+from network.client import log
+
+# Slate ya convertido al formato del framebuffer (se carga una sola vez)
+_slate_frame = None
+_slate_key = None
+
+# Hash de la imagen por defecto, recalculado sólo si cambian su mtime o su tamaño
+_image_stat = None
+_image_digest = None
+
+# Clave cuyo renderizado falló y si el método clásico también falló (no se reintenta en cada repintado)
+_failed_key = None
+_fallback_failed = False
 
 def init_display():
     """Inicializa la pantalla"""
     # Por ahora solo un placeholder
     pass
 
-def show_default_image():
-    """Muestra la imagen por defecto"""
+def _render_slate(image, cache_file, fb):
+    """Convierte la imagen por defecto a un frame raw con el layout del framebuffer"""
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    ffmpeg_cmd = [
+        'ffmpeg',
+        '-loglevel', 'error',
+        '-i', str(image),
+        '-vf', fb.video_filter(),
+        '-frames:v', '1',
+        '-f', 'rawvideo',
+        '-'
+    ]
+    result = subprocess.run(ffmpeg_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.decode(errors='replace').strip()[-200:])
+
+    row = fb.row_bytes
+    frame = result.stdout
+    if len(frame) != row * fb.height:
+        raise ValueError(f'Tamaño de slate inesperado: {len(frame)} bytes')
+
+    # Rellenar cada línea hasta el stride real del framebuffer
+    if fb.stride != row:
+        padding = b'\0' * (fb.stride - row)
+        frame = b''.join(frame[y * row:(y + 1) * row] + padding for y in range(fb.height))
+
+    # Escritura atómica para no dejar un slate a medias en caché
+    tmp_file = cache_file.with_suffix('.tmp')
+    with open(tmp_file, 'wb') as f:
+        f.write(frame)
+    os.replace(tmp_file, cache_file)
+    return frame
+
+def _image_key(image):
+    """Hash del contenido de la imagen (sólo se relee si cambian su mtime o su tamaño)"""
+    global _image_stat, _image_digest
+    st = os.stat(image)
+    if (st.st_mtime_ns, st.st_size) != _image_stat:
+        with open(image, 'rb') as f:
+            _image_digest = hashlib.sha1(f.read()).hexdigest()[:16]
+        _image_stat = (st.st_mtime_ns, st.st_size)
+    return _image_digest
+
+def _slate_cache_key(fb):
+    return f'{_image_key(ASSETS_DIR / "default.png")}_{fb.width}x{fb.height}_{fb.pix_fmt}_{fb.stride}'
+
+def _load_slate(key):
+    """Obtiene el slate pre-renderizado, generándolo sólo si cambia la imagen o la geometría"""
+    global _slate_frame, _slate_key
+
+    if _slate_frame is not None and _slate_key == key:
+        return _slate_frame
+
+    cache_file = CACHE_DIR / f'slate_{key}.raw'
+    if cache_file.exists():
+        with open(cache_file, 'rb') as f:
+            frame = f.read()
+    else:
+        frame = _render_slate(ASSETS_DIR / 'default.png', cache_file, get_framebuffer_info())
+
+    _slate_frame, _slate_key = frame, key
+    return frame
+
+def _show_default_image_ffmpeg():
+    """Muestra la imagen por defecto lanzando FFmpeg (método clásico)"""
+    default_image = ASSETS_DIR / 'default.png'
+    ffmpeg_cmd = [
+        'ffmpeg',
+        '-loglevel', 'quiet',    # Silenciar logs
+        '-i', str(default_image),
+        '-y',
+        *get_framebuffer_info().ffmpeg_output_args()
+    ]
+    subprocess.run(ffmpeg_cmd, check=True)
+
+def show_default_image(output=None):
+    """Muestra la imagen por defecto (a través de la etapa de salida si la hay)"""
+    global _failed_key, _fallback_failed
+    try:
+        key = _slate_cache_key(get_framebuffer_info())
+        frame = None
+        if key != _failed_key:
+            try:
+                frame = _load_slate(key)
+            except Exception as e:
+                # No se reintenta (ni se lanza FFmpeg) en cada repintado mientras no cambie la clave
+                log("PANTALLA", "error", f"Error generando el slate pre-renderizado: {e}")
+                _failed_key, _fallback_failed = key, False
+
+        if frame is not None:
+            if output:
+                # La etapa de salida sabe qué página se ve: el slate va a la oculta y se pagina
+                output.show(frame)
+                return
+
+            # Copia directa al framebuffer, sin lanzar procesos
+            with open(get_framebuffer_info().device, 'r+b') as fb:
+                with mmap.mmap(fb.fileno(), len(frame)) as mm:
+                    mm[:] = frame
+                # Con doble buffer la página visible puede ser la segunda: el slate va en la primera
+                pan_display(fb.fileno(), 0)
+            return
+    except Exception as e:
+        log("PANTALLA", "error", f"Error mostrando slate pre-renderizado: {e}")
+
+    if _fallback_failed:
+        return
     try:
-        default_image = ASSETS_DIR / 'default.png'
-        ffmpeg_cmd = [
-            'ffmpeg',
-            '-loglevel', 'quiet',    # Silenciar logs
-            '-i', str(default_image),
-            '-vf', 'scale=1920:1080,format=rgb24',  # Forzar formato RGB
-            '-pix_fmt', 'rgb565',
-            '-f', 'fbdev',
-            '-y',
-            '/dev/fb0'
-        ]
-        subprocess.run(ffmpeg_cmd)
-        
+        _show_default_image_ffmpeg()
     except Exception as e:
-        print(f'Error mostrando imagen: {e}') 
\ No newline at end of file
+        log("PANTALLA", "error", f"Error mostrando imagen: {e}")
+        _fallback_failed = True
@@ -0,0 +1,94 @@
+import base64
+import mmap
+import os
+import time
+from config.settings import SNAPSHOT_INTERVAL, SNAPSHOT_WIDTH, SNAPSHOT_QUALITY
+from display.framebuffer import get_framebuffer_info, read_var_screeninfo
+from network.client import log
+
+# numpy y OpenCV los instala init-system.sh; sin ellos no hay capturas
+try:
+    import numpy as np
+    import cv2
+except ImportError:
+    np = None
+    cv2 = None
+
+_mapping = None      # (dispositivo, tamaño, mmap) abierto una sola vez
+_last_snapshot = 0
+
+def _map_framebuffer(fb):
+    """mmap de sólo lectura de toda la memoria del framebuffer (se reutiliza entre capturas)"""
+    global _mapping
+    size = fb.stride * fb.virtual_height
+    if _mapping and _mapping[:2] == (fb.device, size):
+        return _mapping[2]
+    if _mapping:
+        _mapping[2].close()
+        _mapping = None
+    fd = os.open(fb.device, os.O_RDONLY)
+    try:
+        mm = mmap.mmap(fd, size, mmap.MAP_SHARED, mmap.PROT_READ)
+    finally:
+        os.close(fd)
+    _mapping = (fb.device, size, mm)
+    return mm
+
+def _visible_offset(fb):
+    """Desplazamiento de la página visible (con doble buffer no siempre es la primera)"""
+    var_info = read_var_screeninfo(fb.device)
+    return var_info[5] * fb.stride if var_info else 0
+
+def capture(width=SNAPSHOT_WIDTH):
+    """Frame visible reducido a `width` px de ancho, como array BGR (o None)"""
+    if np is None:
+        return None
+    fb = get_framebuffer_info()
+    mm = _map_framebuffer(fb)
+    bytes_per_pixel = fb.bpp // 8
+    step = max(1, fb.width // width)
+    offset = _visible_offset(fb)
+
+    # Vista sin copia sobre el mmap; el submuestreo por saltos sólo toca los pixels necesarios
+    if fb.bpp == 16:
+        pixels = np.frombuffer(mm, dtype='<u2', count=fb.stride // 2 * fb.height, offset=offset)
+        pixels = pixels.reshape(fb.height, fb.stride // 2)[::step, :fb.width:step]
+        image = np.empty(pixels.shape + (3,), dtype=np.uint8)
+        image[..., 2] = (pixels >> 8) & 0xF8   # rojo
+        image[..., 1] = (pixels >> 3) & 0xFC   # verde
+        image[..., 0] = (pixels << 3) & 0xF8   # azul
+        return image
+
+    pixels = np.frombuffer(mm, dtype=np.uint8, count=fb.stride * fb.height, offset=offset)
+    pixels = pixels.reshape(fb.height, fb.stride)[::step, :fb.width * bytes_per_pixel]
+    pixels = pixels.reshape(pixels.shape[0], fb.width, bytes_per_pixel)[:, ::step, :3]
+    # OpenCV trabaja en BGR
+    return np.ascontiguousarray(pixels[..., ::-1] if fb.pix_fmt.startswith('rgb') else pixels)
+
+def take_snapshot(width=SNAPSHOT_WIDTH, quality=SNAPSHOT_QUALITY):
+    """JPEG pequeño de lo que muestra la pantalla, o None si no se puede capturar"""
+    if cv2 is None:
+        return None
+    try:
+        image = capture(width)
+        ok, encoded = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        return encoded.tobytes() if ok else None
+    except Exception as e:
+        log("SNAPSHOT", "warning", f"No se pudo capturar la pantalla: {e}")
+        return None
+
+def snapshot_payload():
+    """Campos que se añaden al latido cuando toca enviar captura (vacío el resto de las veces)"""
+    global _last_snapshot
+    now = time.time()
+    if not SNAPSHOT_INTERVAL or now - _last_snapshot < SNAPSHOT_INTERVAL:
+        return {}
+    _last_snapshot = now
+
+    jpeg = take_snapshot()
+    if jpeg is None:
+        return {}
+    return {
+        'snapshot': base64.b64encode(jpeg).decode(),
+        'snapshotAt': int(now * 1000),
+    }
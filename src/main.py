@@ -1,10 +1,12 @@
 import time
 import signal
-import subprocess
 from display.screen import show_default_image
-from network.client import register_device, register_with_proxy, get_server_url, log
+from display.snapshot import snapshot_payload
+from network.client import (register_device, register_with_proxy, get_server_url, add_heartbeat_provider,
+                            restore_assignment, log)
 from stream.manager import StreamManager
-from config.settings import DEVICE_ID
+from config.settings import DEVICE_ID, METRICS_ENABLED
+from telemetry.metrics import start_metrics_server
 
 def main():
     stream_manager = StreamManager()
@@ -12,7 +14,8 @@ def main():
     def cleanup(signum, frame):
         log("SISTEMA", "info", "Deteniendo reproductor...")
         stream_manager.stop_ffmpeg()
-        show_default_image()
+        stream_manager.fanout.stop_all()
+        show_default_image(stream_manager.output)
         exit(0)
 
     log("SISTEMA", "info", f"=== Iniciando dispositivo {DEVICE_ID} ===")
@@ -20,34 +23,19 @@ def main():
     # Configurar manejo de señales
     signal.signal(signal.SIGTERM, cleanup)
     signal.signal(signal.SIGINT, cleanup)
+    # SIGUSR2 (rótulo) lo atiende el supervisor en su bucle; hasta entonces no termina el proceso
+    if stream_manager.overlay:
+        signal.signal(signal.SIGUSR2, signal.SIG_IGN)
     
-    # Configurar salida de audio HDMI mediante ALSA
-    try:
-        log("SISTEMA", "info", "Configurando audio HDMI mediante ALSA...")
-        
-        # Configurar audio para HDMI
-        subprocess.run(['amixer', 'cset', 'numid=3', '2'], check=False, 
-                      stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        log("SISTEMA", "info", "Salida configurada para HDMI")
-        
-        # Establecer volumen al máximo
-        subprocess.run(['amixer', 'set', 'Master', '100%'], check=False,
-                      stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        log("SISTEMA", "info", "Volumen configurado al 100%")
-        
-        # Verificar dispositivos ALSA
-        alsa_check = subprocess.run(['aplay', '-l'], 
-                                 stdout=subprocess.PIPE, 
-                                 stderr=subprocess.PIPE,
-                                 text=True)
-        
-        if "HDMI" in alsa_check.stdout:
-            log("SISTEMA", "success", "Dispositivo HDMI ALSA detectado")
-        else:
-            log("SISTEMA", "warning", "No se detectó dispositivo HDMI en ALSA")
-            
-    except Exception as e:
-        log("SISTEMA", "warning", f"Error configurando audio: {e}")
+    # Última asignación conocida: se reproduce mientras el latido la revalida
+    restore_assignment()
+    
+    # Captura de pantalla junto al latido
+    add_heartbeat_provider(snapshot_payload)
+    
+    # Endpoint local de métricas
+    if METRICS_ENABLED:
+        start_metrics_server(stream_manager)
     
     # Configuración inicial
     show_default_image()
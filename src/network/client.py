@@ -1,22 +1,59 @@
 import subprocess
+import json
+import threading
 import requests
+from requests.adapters import HTTPAdapter
 import time
 import socket
 import os
-from datetime import datetime
-from config.settings import PROXY_URL, DEVICE_ID, PROXY_CHECK_INTERVAL, IS_DEV
+from config.settings import (PROXY_URL, DEVICE_ID, PROXY_CHECK_INTERVAL, IS_DEV, HEARTBEAT_INTERVAL,
+                             PROXY_REFRESH_INTERVAL, PUBLIC_IP_TTL, PUBLIC_IP_RETRY,
+                             ASSIGNMENT_CACHE_ENABLED, ASSIGNMENT_CACHE_FILE,
+                             ASSIGNMENT_CACHE_MAX_AGE)
+from telemetry.logger import log
 
 # Variables globales
 current_server_url = None
 current_srt_url = None
+current_profile = None  # Perfil de reproducción indicado por el servidor (None = el de configuración)
+current_sinks = None    # Salidas extra pedidas por el servidor (None = las de configuración)
+current_backups = []    # URLs SRT de respaldo indicadas por el servidor, en orden de preferencia
+current_overlay = None  # Rótulo en pantalla pedido por el servidor (None = el estado local)
 last_proxy_check = 0
 device_status = 'OFFLINE'
 
-def log(category, status, message):
-    """Función para logs consistentes"""
-    timestamp = datetime.now().strftime("%H:%M:%S")
-    status_symbol = "✓" if status == "success" else "✗" if status == "error" else "ℹ"
-    print(f"[{timestamp}] [{category}] {status_symbol} {message}")
+# Sesión HTTP persistente (reutiliza conexiones TCP con proxy y servidor de streaming)
+_session = None
+_session_lock = threading.Lock()
+
+# IP pública en caché
+_public_ip = None
+_public_ip_expires = 0
+
+# Instantes de la última respuesta del proxy y del servidor de streaming (para medir TTFF)
+control_plane_marks = {}
+
+# Peticiones al plano de control por destino ('proxy', 'streaming_server'): contadores y latencias
+request_stats = {}
+_request_stats_lock = threading.Lock()
+
+# Última asignación guardada en disco (para no reescribir el fichero si no cambia)
+_saved_assignment = None
+
+# Estados que indican que el dispositivo ya no debe reproducir
+UNASSIGNED_STATES = ('unassigned', 'OFFLINE', 'INACTIVE')
+
+# True mientras hay una suscripción activa a cambios de asignación (ver network.subscription)
+subscription_active = False
+
+# Funciones que añaden campos al latido (p.ej. la captura de pantalla); ver add_heartbeat_provider
+heartbeat_providers = []
+
+# Estado del último registro completo (para enviar sólo latidos mientras no cambie)
+last_proxy_registration = 0
+_last_registration_state = None
+_light_heartbeat_supported = True
+_heartbeat_extras_supported = True  # False si el servidor rechazó los campos de heartbeat_providers
 
 def get_local_ip():
     """Obtiene la IP local o devuelve un placeholder en desarrollo"""
@@ -30,16 +67,63 @@ def get_local_ip():
         log("SISTEMA", "error", f"Error obteniendo IP local: {e}")
         return "UNKNOWN"
 
+def get_session():
+    """Devuelve la sesión HTTP compartida con keep-alive"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=4, max_retries=0)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers.update({'Connection': 'keep-alive', 'Content-Type': 'application/json'})
+            _session = session
+        return _session
+
+def post_json(url, data, timeout=5):
+    """POST con JSON compacto sobre la sesión persistente"""
+    body = json.dumps(data, separators=(',', ':'))
+    target = 'proxy' if url.startswith(PROXY_URL) else 'streaming_server'
+    start = time.time()
+    try:
+        response = get_session().post(url, data=body, timeout=timeout)
+    except Exception:
+        _record_request(target, time.time() - start, False)
+        raise
+    _record_request(target, time.time() - start, response.status_code < 400 or response.status_code == 409)
+    return response
+
+def _record_request(target, seconds, ok):
+    with _request_stats_lock:
+        stats = request_stats.setdefault(target, {'requests': 0, 'errors': 0, 'latency_sum': 0.0, 'latency_last': 0.0})
+        stats['requests'] += 1
+        stats['errors'] += 0 if ok else 1
+        stats['latency_sum'] += seconds
+        stats['latency_last'] = seconds
+
+def control_plane_stats():
+    """Copia de los contadores de peticiones al plano de control"""
+    with _request_stats_lock:
+        return {target: dict(stats) for target, stats in request_stats.items()}
+
 def get_public_ip():
-    """Obtiene la IP pública o devuelve un placeholder en desarrollo"""
+    """Obtiene la IP pública (en caché durante PUBLIC_IP_TTL) o un placeholder en desarrollo"""
+    global _public_ip, _public_ip_expires
     if IS_DEV:
         return "DEV_ENV"
+    
+    if time.time() < _public_ip_expires:
+        return _public_ip or "UNKNOWN"
+    
     try:
-        response = requests.get('https://api.ipify.org?format=json', timeout=5)
-        return response.json()['ip']
+        response = get_session().get('https://api.ipify.org?format=json', timeout=5)
+        _public_ip = response.json()['ip']
+        _public_ip_expires = time.time() + PUBLIC_IP_TTL
     except Exception as e:
         log("SISTEMA", "error", f"Error obteniendo IP pública: {e}")
-        return "UNKNOWN"
+        # Mantener la última IP conocida y no volver a preguntar enseguida
+        _public_ip_expires = time.time() + PUBLIC_IP_RETRY
+    return _public_ip or "UNKNOWN"
 
 def get_server_url(force_check=False):
     """Obtiene la URL del servidor desde el proxy"""
@@ -55,9 +139,9 @@ def get_server_url(force_check=False):
         }
         
         proxy_url = f'{PROXY_URL}/api/server-config'
-        log("SERVIDOR", "info", f"Consultando servidor en: {proxy_url}")
+        log("SERVIDOR", "debug", f"Consultando servidor en: {proxy_url}")
         
-        response = requests.post(proxy_url, json=data, timeout=5)
+        response = post_json(proxy_url, data)
         response.raise_for_status()
         config_data = response.json()
         
@@ -89,9 +173,9 @@ def register_with_proxy():
         }
         
         register_url = f'{PROXY_URL}/api/devices/register'
-        log("PROXY", "info", f"Registrando en proxy: {register_url}")
+        log("PROXY", "debug", f"Registrando en proxy: {register_url}")
         
-        response = requests.post(register_url, json=data, timeout=5)
+        response = post_json(register_url, data)
         response.raise_for_status()
         result = response.json()
         
@@ -111,98 +195,210 @@ def register_with_proxy():
         log("PROXY", "error", f"Error en registro: {e}")
         return False
 
+def find_srt_url(result):
+    """Busca la URL SRT en una respuesta del servidor de streaming"""
+    # Opciones de nombres de campos que pueden contener la URL SRT
+    url_fields = ['streamingUrl', 'srtUrl', 'url']
+    
+    # Buscar en campos principales
+    for field in url_fields:
+        if field in result and result[field]:
+            log("STREAMING", "debug", f"URL SRT encontrada en '{field}': {result[field]}")
+            return result[field]
+    
+    # Si no encontramos la URL en los campos principales, buscar en subcampos
+    device_data = result.get('device') or {}
+    for field in url_fields:
+        if field in device_data and device_data[field]:
+            log("STREAMING", "debug", f"URL SRT encontrada en 'device.{field}': {device_data[field]}")
+            return device_data[field]
+    
+    return None
+
+def find_profile(result):
+    """Perfil de reproducción indicado por el servidor para este dispositivo, si lo hay"""
+    return result.get('profile') or (result.get('device') or {}).get('profile')
+
+def find_sinks(result):
+    """Salidas extra (grabación, vista previa) pedidas por el servidor, si las indica"""
+    sinks = result.get('sinks') or (result.get('device') or {}).get('sinks')
+    return sinks if isinstance(sinks, dict) else None
+
+def find_backups(result):
+    """URLs SRT de respaldo indicadas por el servidor (None si no indica ninguna lista)"""
+    device = result.get('device') or {}
+    for backups in (result.get('backupUrls'), result.get('backups'),
+                    device.get('backupUrls'), device.get('backups')):
+        if isinstance(backups, list):
+            return [url for url in backups if isinstance(url, str) and url.startswith('srt://')]
+    return None
+
+def find_overlay(result):
+    """Rótulo de identificación pedido por el servidor (True/False), o None si no lo indica"""
+    overlay = result.get('overlay', (result.get('device') or {}).get('overlay'))
+    return overlay if isinstance(overlay, bool) else None
+
+def apply_assignment(update):
+    """Aplica una actualización de asignación recibida por suscripción. Devuelve True si cambió algo"""
+    global current_srt_url, device_status, current_profile, current_sinks, current_backups, current_overlay
+    
+    previous = (current_srt_url, device_status, current_profile, current_sinks, current_backups)
+    current_profile = find_profile(update) or current_profile
+    current_sinks = find_sinks(update) or current_sinks
+    backups = find_backups(update)
+    if backups is not None:
+        current_backups = backups
+    overlay = find_overlay(update)
+    if overlay is not None:
+        current_overlay = overlay
+    srt_url = find_srt_url(update)
+    status = update.get('status') or (update.get('device') or {}).get('status')
+    
+    if srt_url:
+        current_srt_url = srt_url
+        device_status = 'ACTIVE'
+    elif status in UNASSIGNED_STATES:
+        current_srt_url = None
+        device_status = status
+    
+    changed = (current_srt_url, device_status, current_profile, current_sinks, current_backups) != previous
+    if current_srt_url:
+        save_assignment()
+    elif status in UNASSIGNED_STATES:
+        forget_assignment()
+    if changed:
+        log("SUSCRIPCION", "success", f"Asignación actualizada: {current_srt_url} (Estado: {device_status})")
+    return changed
+
 def register_with_streaming_server(server_url):
     """Registra el dispositivo con el servidor de streaming y actualiza su estado"""
-    global current_srt_url, device_status
+    global current_srt_url, device_status, current_profile, current_sinks, current_backups, current_overlay, _last_registration_state, _light_heartbeat_supported, _heartbeat_extras_supported
     
     try:
         if not server_url.endswith('/'):
             server_url += '/'
             
         register_url = f'{server_url}api/devices'
-        log("STREAMING", "info", f"Actualizando estado en: {register_url}")
         
-        data = {
-            'dispositivoId': DEVICE_ID,
-            'nombre': f'Raspberry {DEVICE_ID}',
-            'inputSrt': 'pending',
-            'ipPublica': '0.0.0.0'  # Valor por defecto temporal
-        }
+        # Registro completo sólo cuando cambia el estado; el resto son latidos ligeros
+        state = (server_url, device_status, current_srt_url)
+        full_registration = not _light_heartbeat_supported or state != _last_registration_state
+        
+        if full_registration:
+            log("STREAMING", "debug", f"Actualizando estado en: {register_url}")
+            data = {
+                'dispositivoId': DEVICE_ID,
+                'nombre': f'Raspberry {DEVICE_ID}',
+                'inputSrt': 'pending',
+                'ipPublica': '0.0.0.0'  # Valor por defecto temporal
+            }
+        else:
+            data = {'dispositivoId': DEVICE_ID}
         
-        response = requests.post(register_url, json=data, timeout=5)
+        extras = {}
+        for provider in heartbeat_providers if _heartbeat_extras_supported else ():
+            try:
+                extras.update(provider())
+            except Exception as e:
+                log("STREAMING", "warning", f"Error preparando datos del latido: {e}")
+        data.update(extras)
         
-        # Registrar la respuesta completa para depuración
-        log("STREAMING", "debug", f"Respuesta HTTP: {response.status_code}")
-        log("STREAMING", "debug", f"Cuerpo: {response.text[:100]}...")
+        response = post_json(register_url, data)
+        control_plane_marks['streaming_server'] = time.time()
+        
+        # Respuesta para depuración (sólo llega al log si después hay un error)
+        log("STREAMING", "debug", f"Respuesta HTTP {response.status_code}: {response.text[:200]}")
+        
+        # Un 4xx con campos extra (p. ej. la captura) se achaca primero a ellos: se reintenta sin
+        # ellos y no se vuelven a enviar, sin renunciar todavía al latido ligero
+        if extras and 400 <= response.status_code < 500 and response.status_code != 409:
+            log("STREAMING", "warning",
+                f"Campos extra del latido rechazados ({response.status_code}), se dejan de enviar")
+            _heartbeat_extras_supported = False
+            return register_with_streaming_server(server_url)
+        
+        # Si el servidor no acepta el latido ligero, volver siempre al registro completo
+        if not full_registration and 400 <= response.status_code < 500 and response.status_code != 409:
+            log("STREAMING", "warning", f"Latido ligero rechazado ({response.status_code}), usando registro completo")
+            _light_heartbeat_supported = False
+            return register_with_streaming_server(server_url)
         
         if response.status_code not in [200, 409]:
+            # Fallo del servidor, no una respuesta sobre la asignación: se sigue reproduciendo
             log("STREAMING", "error", f"Error {response.status_code}: {response.text}")
-            device_status = 'OFFLINE'
+            _last_registration_state = None
             return False
             
         result = response.json()
-        log("STREAMING", "info", f"Respuesta del servidor: {result}")
-        
-        # Inspeccionar la estructura completa de la respuesta
-        for key, value in result.items():
-            log("STREAMING", "debug", f"Campo '{key}': {value}")
         
         if result.get('success'):
-            device_status = result.get('status', 'ONLINE')
+            status = result.get('status')
             
-            # Buscar la URL SRT en diferentes campos (para manejar cambios en la API)
-            srt_url = None
-            
-            # Opciones de nombres de campos que pueden contener la URL SRT
-            url_fields = ['streamingUrl', 'srtUrl', 'url']
-            
-            # Buscar en campos principales
-            for field in url_fields:
-                if field in result and result[field]:
-                    srt_url = result[field]
-                    log("STREAMING", "success", f"URL SRT encontrada en '{field}': {srt_url}")
-                    break
-            
-            # Si no encontramos la URL en los campos principales, buscar en subcampos
-            if not srt_url and 'device' in result:
-                device_data = result['device']
-                for field in url_fields:
-                    if field in device_data and device_data[field]:
-                        srt_url = device_data[field]
-                        log("STREAMING", "success", f"URL SRT encontrada en 'device.{field}': {srt_url}")
-                        break
+            # Buscar la URL SRT en diferentes campos (para manejar cambios en la API).
+            # Lo que la respuesta no incluye (p. ej. tras un latido ligero) se mantiene
+            srt_url = find_srt_url(result)
+            current_profile = find_profile(result) or current_profile
+            current_sinks = find_sinks(result) or current_sinks
+            backups = find_backups(result)
+            if backups is not None:
+                current_backups = backups
+            overlay = find_overlay(result)
+            if overlay is not None:
+                current_overlay = overlay
             
             # Actualizar URL SRT si la encontramos
             if srt_url:
+                if srt_url != current_srt_url:
+                    log("STREAMING", "success", f"URL SRT asignada: {srt_url}")
                 current_srt_url = srt_url
-                log("STREAMING", "success", f"URL SRT asignada: {current_srt_url}")
                 device_status = 'ACTIVE'
-            else:
-                log("STREAMING", "warning", "No se encontró URL SRT en la respuesta")
-                if current_srt_url:
+                save_assignment()
+            elif status in UNASSIGNED_STATES:
+                log("STREAMING", "info", f"El servidor retira la asignación (Estado: {status})")
+                device_status = status
+                current_srt_url = None
+                forget_assignment()
+            elif current_srt_url:
+                # Sin URL en la respuesta: se mantienen la URL y el estado anteriores
+                if full_registration:
                     log("STREAMING", "info", f"Manteniendo URL SRT anterior: {current_srt_url}")
+            else:
+                device_status = status or 'ONLINE'
+                if full_registration:
+                    log("STREAMING", "warning", "No se encontró URL SRT en la respuesta")
             
-            log("STREAMING", "success", f"Estado: {device_status}")
+            if full_registration:
+                log("STREAMING", "success", f"Estado: {device_status}")
+            _last_registration_state = (server_url, device_status, current_srt_url)
             return True
             
         else:
+            # El servidor rechaza el dispositivo: la asignación guardada deja de valer
             device_status = 'OFFLINE'
             current_srt_url = None
+            _last_registration_state = None
+            forget_assignment()
             log("STREAMING", "error", f"Error: {result.get('error', 'Sin mensaje')}")
             return False
         
     except Exception as e:
+        # Sin respuesta no hay desacuerdo: se mantiene la última asignación conocida
         log("STREAMING", "error", f"Error en registro: {e}")
-        device_status = 'OFFLINE'
-        current_srt_url = None
+        _last_registration_state = None
         return False
 
 def register_device(status='ONLINE'):
     """Registra el dispositivo en el servidor de streaming"""
-    global current_server_url, device_status
+    global current_server_url, device_status, last_proxy_registration
+    
+    # Con un servidor ya asignado y un registro reciente en el proxy basta con el latido
+    if current_server_url and time.time() - last_proxy_registration < PROXY_REFRESH_INTERVAL:
+        if register_with_streaming_server(current_server_url):
+            return True
+        log("REGISTRO", "info", "Latido fallido, repitiendo registro completo en proxy")
     
     # Intentar registro en proxy primero
-    log("REGISTRO", "info", "Intentando registro en proxy...")
+    log("REGISTRO", "debug", "Intentando registro en proxy...")
     
     try:
         data = {
@@ -210,41 +406,117 @@ def register_device(status='ONLINE'):
             'ipPublica': '0.0.0.0'  # Valor por defecto temporal
         }
         
-        response = requests.post(
-            f"{PROXY_URL}/api/devices/register",
-            json=data,
-            timeout=5
-        )
+        response = post_json(f"{PROXY_URL}/api/devices/register", data)
+        control_plane_marks['proxy'] = time.time()
         
         if response.status_code != 200:
             log("PROXY", "error", f"Error {response.status_code}: {response.text}")
-            device_status = 'OFFLINE'
-            current_server_url = None
-            return False
+            return _proxy_unavailable()
             
         result = response.json()
-        log("PROXY", "info", f"Respuesta del proxy: {result}")
+        log("PROXY", "debug", f"Respuesta del proxy: {result}")
+        last_proxy_registration = time.time()
         
         # Actualizar estado según el proxy
         device_status = result.get('status', 'unassigned')
         
         # Solo si está asignado continuamos
         if device_status == 'assigned':
-            current_server_url = result.get('streamingUrl')
+            server_url = result.get('streamingUrl')
+            if server_url != current_server_url:
+                log("PROXY", "success", f"URL streaming recibida: {server_url}")
+            current_server_url = server_url
             if current_server_url:
-                log("PROXY", "success", f"URL streaming recibida: {current_server_url}")
                 # Solo ahora intentamos registro con streaming
                 return register_with_streaming_server(current_server_url)
         else:
             log("PROXY", "info", "Dispositivo no asignado, esperando asignación")
             current_server_url = None
+            forget_assignment()
             return False
             
     except Exception as e:
         log("PROXY", "error", f"Error en registro: {e}")
-        device_status = 'OFFLINE'
-        current_server_url = None
-        return False
+        return _proxy_unavailable()
+
+def _proxy_unavailable():
+    """Proxy caído: el servidor de streaming ya conocido (o el guardado) revalida la asignación"""
+    global last_proxy_registration
+    last_proxy_registration = 0
+    if current_server_url:
+        return register_with_streaming_server(current_server_url)
+    return False
+
+def save_assignment():
+    """Guarda la última asignación válida en disco (escritura atómica) para el próximo arranque"""
+    global _saved_assignment
+    if not ASSIGNMENT_CACHE_ENABLED or not current_srt_url:
+        return
+    record = {
+        'srtUrl': current_srt_url,
+        'serverUrl': current_server_url,
+        'status': device_status,
+        'profile': current_profile,
+        'backups': current_backups,
+    }
+    if record == _saved_assignment:
+        return
+    try:
+        ASSIGNMENT_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = ASSIGNMENT_CACHE_FILE.with_suffix('.tmp')
+        with open(tmp_file, 'w') as f:
+            json.dump({**record, 'savedAt': time.time()}, f)
+            f.flush()
+            # La Raspberry puede perder la alimentación justo después
+            os.fsync(f.fileno())
+        os.replace(tmp_file, ASSIGNMENT_CACHE_FILE)
+        _saved_assignment = record
+        log("ASIGNACION", "debug", f"Asignación guardada: {current_srt_url}")
+    except OSError as e:
+        log("ASIGNACION", "warning", f"No se pudo guardar la asignación: {e}")
+
+def forget_assignment():
+    """Borra la asignación guardada (el servidor ha dicho que ya no vale)"""
+    global _saved_assignment
+    _saved_assignment = None
+    try:
+        ASSIGNMENT_CACHE_FILE.unlink()
+        log("ASIGNACION", "info", "Asignación guardada descartada")
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        log("ASIGNACION", "warning", f"No se pudo borrar la asignación guardada: {e}")
+
+def restore_assignment():
+    """Carga la última asignación válida al arrancar (estado CACHED). Devuelve la URL SRT o None"""
+    global current_srt_url, current_server_url, device_status, current_profile, current_backups, _saved_assignment
+    if not ASSIGNMENT_CACHE_ENABLED:
+        return None
+    try:
+        with open(ASSIGNMENT_CACHE_FILE) as f:
+            record = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        log("ASIGNACION", "warning", f"Asignación guardada ilegible: {e}")
+        return None
+
+    srt_url = record.get('srtUrl')
+    if not isinstance(srt_url, str) or not srt_url.startswith('srt://'):
+        return None
+    age = time.time() - record.get('savedAt', 0)
+    if ASSIGNMENT_CACHE_MAX_AGE and age > ASSIGNMENT_CACHE_MAX_AGE:
+        log("ASIGNACION", "info", f"Asignación guardada demasiado antigua ({age / 86400:.0f} días), se ignora")
+        return None
+
+    current_srt_url = srt_url
+    current_server_url = record.get('serverUrl') or current_server_url
+    current_profile = record.get('profile')
+    current_backups = record.get('backups') or []
+    device_status = 'CACHED'
+    _saved_assignment = {key: record.get(key) for key in ('srtUrl', 'serverUrl', 'status', 'profile', 'backups')}
+    log("ASIGNACION", "success", f"Reproduciendo la última asignación conocida mientras se revalida: {srt_url}")
+    return srt_url
 
 def get_srt_url():
     """Función principal para obtener la URL SRT"""
@@ -252,31 +524,69 @@ def get_srt_url():
     
     # Actualizamos estado si es necesario
     if should_check_proxy():
-        log("SRT", "info", "Verificando estado con el servidor...")
+        log("SRT", "debug", "Verificando estado con el servidor...")
         registered = register_device()
-        log("SRT", "info", f"Resultado de registro: {'Exitoso' if registered else 'Fallido'}")
+        log("SRT", "debug", f"Resultado de registro: {'Exitoso' if registered else 'Fallido'}")
     
     # Verificamos si tenemos URL y estado válido
     if current_srt_url and device_status in ['ACTIVE', 'assigned']:
-        log("SRT", "info", f"URL SRT disponible: {current_srt_url} (Estado: {device_status})")
+        log("SRT", "debug", f"URL SRT disponible: {current_srt_url} (Estado: {device_status})")
         return current_srt_url
     
     # Registramos por qué no hay URL disponible
     if not current_srt_url:
-        log("SRT", "info", "No hay URL SRT guardada")
+        log("SRT", "debug", "No hay URL SRT guardada")
     elif device_status not in ['ACTIVE', 'assigned']:
-        log("SRT", "info", f"Estado no válido: {device_status}")
+        log("SRT", "debug", f"Estado no válido: {device_status}")
     
-    log("SRT", "info", f"No hay URL SRT disponible - Estado: {device_status}")
+    log("SRT", "debug", f"No hay URL SRT disponible - Estado: {device_status}")
+    return None
+
+def current_assignment():
+    """URL SRT vigente según el último estado conocido, sin acceder a la red"""
+    if current_srt_url and device_status in ['ACTIVE', 'assigned', 'CACHED']:
+        return current_srt_url
     return None
 
+def assigned_profile():
+    """Perfil de reproducción indicado por el servidor (None = el de configuración)"""
+    return current_profile
+
+def assigned_sinks():
+    """Salidas extra indicadas por el servidor (None = las de configuración)"""
+    return current_sinks
+
+def assigned_backups():
+    """URLs SRT de respaldo para la asignación actual (lista vacía si no hay)"""
+    return current_backups
+
+def assigned_overlay():
+    """True/False si el servidor pide mostrar u ocultar el rótulo, None si no dice nada"""
+    return current_overlay
+
+def add_heartbeat_provider(provider):
+    """Registra una función que devuelve campos extra para el latido ({} si no hay nada que enviar)"""
+    heartbeat_providers.append(provider)
+
+def last_control_plane_marks():
+    """Copia de los instantes de la última ronda con proxy y servidor de streaming"""
+    return dict(control_plane_marks)
+
+def heartbeat_interval():
+    """Intervalo de latido: siempre por debajo del umbral de 10 s del servidor.
+
+    La suscripción sólo sustituye al sondeo de la asignación; una conexión abierta no cuenta
+    como latido para el servidor.
+    """
+    return HEARTBEAT_INTERVAL
+
 def should_check_proxy():
     """Determina si es hora de actualizar el estado"""
     global last_proxy_check
     current_time = time.time()
     
-    # Actualizamos el estado cada 3 segundos para asegurar que nunca pasamos el umbral de 10 segundos del servidor
-    if last_proxy_check == 0 or (current_time - last_proxy_check) > 3:
+    # Actualizamos el estado cada 3 segundos para asegurar que nunca pasamos el umbral de 10 segundos del servidor.
+    if last_proxy_check == 0 or (current_time - last_proxy_check) > heartbeat_interval():
         last_proxy_check = current_time
         return True
     return False
@@ -287,5 +597,13 @@ __all__ = [
     'register_with_proxy',
     'get_server_url',
     'get_srt_url',
+    'current_assignment',
+    'assigned_profile',
+    'assigned_sinks',
+    'add_heartbeat_provider',
+    'last_control_plane_marks',
+    'control_plane_stats',
+    'heartbeat_interval',
+    'apply_assignment',
     'log'
 ] 
\ No newline at end of file
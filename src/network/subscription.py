@@ -0,0 +1,159 @@
+import json
+import threading
+import requests
+import network.client as client
+from config.settings import DEVICE_ID, SUBSCRIPTION_TIMEOUT, SUBSCRIPTION_RETRY_INTERVAL
+from network.client import apply_assignment, log
+
+# Respuestas que indican que el servidor no implementa suscripciones
+UNSUPPORTED_STATUS = (404, 405, 501)
+
+# Lectura del flujo SSE: hasta este tamaño por lectura, sin esperar a llenar el bloque
+SSE_CHUNK_SIZE = 4096
+
+# Espera antes de reconectar cuando el servidor cierra el flujo SSE (se duplica hasta el máximo)
+RECONNECT_DELAY = 1
+RECONNECT_MAX_DELAY = 30
+
+class AssignmentSubscriber:
+    """Mantiene una conexión larga (SSE o long-poll) para recibir cambios de asignación al instante"""
+
+    def __init__(self, on_change):
+        self.on_change = on_change
+        self.supported = None        # None: desconocido, True/False tras el primer intento
+        self.version = None          # Última versión recibida (para long-poll)
+        self._stop = threading.Event()
+        self._thread = None
+        self._reconnect_delay = RECONNECT_DELAY
+        # Sesión propia: la conexión larga no debe ocupar el pool de los latidos
+        self._session = requests.Session()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._session.close()
+
+    def _run(self):
+        while not self._stop.is_set():
+            server_url = client.current_server_url
+            if not server_url:
+                client.subscription_active = False
+                self._stop.wait(1)
+                continue
+
+            try:
+                if self._subscribe(server_url.rstrip('/') + '/'):
+                    # Flujo SSE cerrado por el servidor: no hay suscripción hasta que vuelvan eventos
+                    client.subscription_active = False
+                    self._backoff()
+            except Exception as e:
+                client.subscription_active = False
+                log("SUSCRIPCION", "warning", f"Suscripción interrumpida: {e}")
+                self._backoff()
+
+            if self.supported is False:
+                client.subscription_active = False
+                log("SUSCRIPCION", "info",
+                    f"El servidor no soporta suscripciones, usando sondeo (reintento en {SUBSCRIPTION_RETRY_INTERVAL}s)")
+                self._stop.wait(SUBSCRIPTION_RETRY_INTERVAL)
+                self.supported = None
+
+    def _backoff(self):
+        self._stop.wait(self._reconnect_delay)
+        self._reconnect_delay = min(self._reconnect_delay * 2, RECONNECT_MAX_DELAY)
+
+    def _subscribe(self, server_url):
+        """Abre una conexión de suscripción y procesa lo que llegue hasta que se cierre.
+
+        Devuelve True si era un flujo SSE y el servidor lo ha cerrado.
+        """
+        params = {'timeout': SUBSCRIPTION_TIMEOUT}
+        if self.version is not None:
+            params['since'] = self.version
+
+        response = self._session.get(
+            f'{server_url}api/devices/{DEVICE_ID}/events',
+            params=params,
+            headers={'Accept': 'text/event-stream, application/json'},
+            stream=True,
+            timeout=(5, SUBSCRIPTION_TIMEOUT + 10)
+        )
+
+        with response:
+            if response.status_code in UNSUPPORTED_STATUS:
+                self.supported = False
+                return
+
+            # 204: el long-poll venció sin cambios
+            if response.status_code == 204:
+                self._mark_supported()
+                self._mark_active()
+                return
+
+            response.raise_for_status()
+            self._mark_supported()
+
+            if response.headers.get('Content-Type', '').startswith('text/event-stream'):
+                self._read_events(response)
+                return not self._stop.is_set()
+            self._mark_active()
+            self._dispatch(response.json())
+
+    def _mark_supported(self):
+        if not self.supported:
+            log("SUSCRIPCION", "success", "Suscripción a cambios de asignación activa")
+        self.supported = True
+
+    def _mark_active(self):
+        client.subscription_active = True
+        self._reconnect_delay = RECONNECT_DELAY
+
+    def _lines(self, response):
+        """Líneas del flujo según llegan (read1 devuelve lo disponible sin esperar a llenar el bloque)"""
+        read = getattr(response.raw, 'read1', None)
+        if read is None:
+            # urllib3 < 2 no tiene read1
+            yield from response.iter_lines(chunk_size=SSE_CHUNK_SIZE, decode_unicode=True)
+            return
+        pending = b''
+        while True:
+            chunk = read(SSE_CHUNK_SIZE)
+            if not chunk:
+                break
+            *lines, pending = (pending + chunk).split(b'\n')
+            for line in lines:
+                yield line.rstrip(b'\r').decode(errors='replace')
+        if pending:
+            yield pending.decode(errors='replace')
+
+    def _read_events(self, response):
+        """Procesa un flujo server-sent events evento a evento"""
+        data_lines = []
+        for line in self._lines(response):
+            if self._stop.is_set():
+                return
+            if line is None:
+                continue
+            if line.startswith(':'):
+                # Comentario de keep-alive: el servidor sigue ahí
+                self._mark_active()
+            elif line.startswith('data:'):
+                data_lines.append(line[5:].strip())
+            elif line.startswith('id:'):
+                self.version = line[3:].strip()
+            elif not line and data_lines:
+                self._mark_active()
+                self._dispatch(json.loads('\n'.join(data_lines)))
+                data_lines = []
+
+    def _dispatch(self, update):
+        if not isinstance(update, dict):
+            return
+        if update.get('version') is not None:
+            self.version = update['version']
+        if apply_assignment(update):
+            self.on_change()
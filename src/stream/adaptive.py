@@ -0,0 +1,103 @@
+import time
+from config.settings import (ADAPTIVE_WINDOW, ADAPTIVE_RAISE_ERRORS, ADAPTIVE_CLEAN_PERIOD, ADAPTIVE_MIN_INTERVAL,
+                             ADAPTIVE_LATENCY_FACTOR, ADAPTIVE_LATENCY_MAX, ADAPTIVE_RCVBUF_MAX)
+from network.client import log
+from stream.profiles import get_profile
+
+class LatencyController:
+    """Ajusta la latencia SRT de cada fuente según los errores, la corrupción y los cortes observados"""
+
+    def __init__(self):
+        self.targets = {}        # (url, perfil) -> latencia objetivo en µs
+        self.adjustments = 0
+        self.last_adjustment = None
+        self._last_change = 0
+        self._clean_since = None
+        self._window = None      # [stats, inicio, errores+corrupción, cortes] de la ventana en curso
+
+    def _base(self, profile_name):
+        return get_profile(profile_name)[1]['srt']
+
+    def latency(self, url, profile_name):
+        """Latencia objetivo para una fuente (la del perfil mientras no haya ajustes)"""
+        return self.targets.get((url, profile_name), self._base(profile_name).get('latency'))
+
+    def srt_options(self, url, profile_name):
+        """Opciones SRT que sustituyen a las del perfil (vacío si no hay ajuste)"""
+        base = self._base(profile_name)
+        latency = self.targets.get((url, profile_name))
+        if latency is None or latency == base.get('latency'):
+            return {}
+        # El buffer de recepción crece en proporción a la latencia
+        rcvbuf = base.get('rcvbuf')
+        options = {'latency': latency}
+        if rcvbuf and base.get('latency'):
+            options['rcvbuf'] = min(ADAPTIVE_RCVBUF_MAX, max(rcvbuf, rcvbuf * latency // base['latency']))
+        return options
+
+    def observe(self, url, profile_name, stats):
+        """Evalúa la ventana en curso; True si la latencia objetivo cambió"""
+        now = time.time()
+        if stats is None or not stats.first_frame_at:
+            return False
+
+        errors = stats.error_count + stats.corrupt_count
+        window = self._window
+        if window is None or window[0] is not stats:
+            # Pipeline nuevo: sus contadores empiezan de cero
+            self._window = [stats, now, 0, 0]
+            self._clean_since = self._clean_since or now
+            return False
+        if now - window[1] < ADAPTIVE_WINDOW:
+            return False
+
+        error_rate = (errors - window[2]) * 60 / (now - window[1])
+        stalls = stats.stall_count - window[3]
+        self._window = [stats, now, errors, stats.stall_count]
+
+        if stalls or error_rate >= ADAPTIVE_RAISE_ERRORS:
+            self._clean_since = None
+            return self._adjust(url, profile_name, ADAPTIVE_LATENCY_FACTOR,
+                                f'{error_rate:.1f} errores/min, {stalls} cortes')
+        if error_rate > 0:
+            self._clean_since = None
+            return False
+
+        self._clean_since = self._clean_since or now
+        if now - self._clean_since >= ADAPTIVE_CLEAN_PERIOD:
+            self._clean_since = now
+            return self._adjust(url, profile_name, 1 / ADAPTIVE_LATENCY_FACTOR,
+                                f'enlace limpio durante {ADAPTIVE_CLEAN_PERIOD}s')
+        return False
+
+    def record_exit(self, url, profile_name, stats, reason):
+        """Un pipeline que murió tras cortes o corrupción se relanza ya con más latencia"""
+        if reason != 'exited' or not (stats.stall_count or stats.corrupt_count):
+            return False
+        self._window = None
+        self._clean_since = None
+        return self._adjust(url, profile_name, ADAPTIVE_LATENCY_FACTOR,
+                            f'salida tras {stats.stall_count} cortes y {stats.corrupt_count} errores de datos',
+                            force=True)
+
+    def _adjust(self, url, profile_name, factor, reason, force=False):
+        now = time.time()
+        if not force and now - self._last_change < ADAPTIVE_MIN_INTERVAL:
+            return False
+
+        base = self._base(profile_name).get('latency')
+        if not base:
+            return False
+        current = self.latency(url, profile_name)
+        # Nunca por debajo del perfil ni por encima del máximo
+        target = int(min(ADAPTIVE_LATENCY_MAX, max(base, current * factor)) // 1000 * 1000)
+        if target == current:
+            return False
+
+        self.targets[(url, profile_name)] = target
+        self._last_change = now
+        self.adjustments += 1
+        self.last_adjustment = {'at': now, 'from': current, 'to': target, 'reason': reason}
+        log("LATENCIA", "warning" if target > current else "info",
+            f"Latencia SRT {current // 1000} ms -> {target // 1000} ms ({reason})")
+        return True
@@ -0,0 +1,169 @@
+import os
+import subprocess
+import threading
+from config.settings import (AUDIO_DEVICE, AUDIO_OUTPUT, AUDIO_SAMPLE_RATE, AUDIO_BUFFER_TIME,
+                             AUDIO_PERIOD_TIME, AUDIO_RESAMPLE_ASYNC)
+from network.client import log
+
+# Mensajes de FFmpeg (muxer alsa) y de aplay cuando el buffer de ALSA se vacía
+UNDERRUN_MARKERS = ('alsa buffer xrun', 'underrun!!!')
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return f.read()
+    except OSError:
+        return None
+
+def pcm_dir(device=AUDIO_DEVICE):
+    """Directorio /proc/asound del PCM de reproducción del dispositivo, o None si no nombra una
+    tarjeta ('null', 'default', 'pulse'...)"""
+    name, _, params = device.partition(':')
+    fields = dict(p.split('=', 1) for p in params.split(',') if '=' in p)
+    positional = [p for p in params.split(',') if p and '=' not in p]
+    if 'CARD' in fields:
+        card, pcm = fields['CARD'], fields.get('DEV', '0')
+    elif name in ('hw', 'plughw') and positional:
+        # hw:0 / hw:0,1 / plughw:vc4hdmi0,0
+        card, pcm = positional[0], positional[1] if len(positional) > 1 else '0'
+    else:
+        return None
+    path = f'/proc/asound/card{card}' if card.isdigit() else f'/proc/asound/{card}'
+    return f'{path}/pcm{pcm}p/sub0'
+
+def _parse(content):
+    values = {}
+    for line in content.splitlines():
+        key, _, value = line.partition(':')
+        values[key.strip()] = value.strip()
+    return values
+
+def pcm_status(device=AUDIO_DEVICE):
+    """Campos de /proc/asound/.../status (state, owner_pid, hw_ptr, delay...) o None si está cerrado"""
+    path = pcm_dir(device)
+    content = _read(f'{path}/status') if path else None
+    if not content or content.strip() == 'closed':
+        return None
+    return _parse(content)
+
+def pcm_rate(device=AUDIO_DEVICE):
+    """Frecuencia de muestreo negociada con el dispositivo (de hw_params)"""
+    path = pcm_dir(device)
+    content = _read(f'{path}/hw_params') if path else None
+    if not content or content.strip() == 'closed':
+        return None
+    try:
+        return int(_parse(content).get('rate', '').split()[0])
+    except (IndexError, ValueError):
+        return None
+
+def playback_delay_ms(owners, device=AUDIO_DEVICE):
+    """Audio escrito y aún no reproducido (ms) si el PCM lo tiene abierto uno de `owners`"""
+    status = pcm_status(device)
+    if not status:
+        return None
+    try:
+        if int(status.get('owner_pid', 0)) not in owners:
+            return None
+        delay = int(status['delay'])
+    except (KeyError, ValueError):
+        return None
+    rate = pcm_rate(device) or AUDIO_SAMPLE_RATE
+    return delay * 1000 / rate
+
+def uses_player():
+    """True si el audio sale por aplay (buffer y periodo configurables) en vez del muxer alsa"""
+    return AUDIO_OUTPUT == 'aplay'
+
+def output_args(target=None, timestamps=None):
+    """Salida de audio de FFmpeg: directa a ALSA o PCM crudo hacia aplay por `target`"""
+    filters = []
+    if AUDIO_RESAMPLE_ASYNC:
+        # Estira o comprime el audio para seguir a sus timestamps (huecos y saltos); no sigue
+        # al reloj de la tarjeta, así que no corrige la deriva frente a ALSA
+        filters.append(f'aresample=async={AUDIO_RESAMPLE_ASYNC}:first_pts=0')
+    if timestamps:
+        filters.append(timestamps)
+    args = ['-af', ','.join(filters)] if filters else []
+    args += ['-ac', '2', '-ar', str(AUDIO_SAMPLE_RATE)]
+    if target:
+        return args + ['-f', 's16le', target]
+    return args + ['-f', 'alsa', AUDIO_DEVICE]
+
+def player_cmd():
+    return [
+        'aplay', '-q',
+        '-D', AUDIO_DEVICE,
+        '-t', 'raw', '-f', 'S16_LE', '-c', '2', '-r', str(AUDIO_SAMPLE_RATE),
+        '-B', str(AUDIO_BUFFER_TIME),   # Tamaño del buffer de ALSA (µs)
+        '-F', str(AUDIO_PERIOD_TIME),   # Tamaño del periodo (µs)
+        '-'
+    ]
+
+def start_player(stdin_fd):
+    """Lanza aplay leyendo PCM del descriptor indicado; termina solo cuando FFmpeg lo cierra"""
+    return subprocess.Popen(player_cmd(), stdin=stdin_fd, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE)
+
+class AudioGate:
+    """PCM de un pipeline que arranca sin dispositivo de audio: se descarta hasta que attach()
+    lanza aplay. El pipeline entrante de un cambio no puede abrir ALSA mientras el anterior lo
+    tiene abierto (un PCM hw sin dmix devuelve EBUSY)"""
+    FRAME_BYTES = 4  # S16_LE estéreo
+
+    def __init__(self, read_fd):
+        self.player = None
+        self._source = os.fdopen(read_fd, 'rb', buffering=0)
+        self._lock = threading.Lock()
+        threading.Thread(target=self._run, name=f'audio-gate-{read_fd}', daemon=True).start()
+
+    def attach(self):
+        """Lanza aplay y le entrega el PCM desde este punto"""
+        player = subprocess.Popen(player_cmd(), stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                  stderr=subprocess.PIPE)
+        with self._lock:
+            self.player = player
+        return player
+
+    def _run(self):
+        # Drenar siempre la tubería: si se llena FFmpeg se bloquea y con él el vídeo
+        pending = b''
+        while True:
+            chunk = self._source.read(65536)
+            if not chunk:
+                break
+            with self._lock:
+                player = self.player
+            data = pending + chunk
+            if player is None:
+                # Descartar sólo frames completos para que aplay empiece alineado
+                keep = len(data) % self.FRAME_BYTES
+                pending = data[len(data) - keep:]
+                continue
+            pending = b''
+            try:
+                player.stdin.write(data)
+            except (OSError, ValueError):
+                # aplay terminó: el resto del audio se descarta
+                with self._lock:
+                    self.player = None
+        self._source.close()
+        with self._lock:
+            player = self.player
+        if player:
+            try:
+                player.stdin.close()
+            except OSError:
+                pass
+
+def watch_player(player, stats):
+    """Cuenta los underruns que informa aplay y recoge el proceso cuando termina"""
+    def run():
+        for raw in player.stderr:
+            line = raw.decode(errors='replace').strip()
+            if 'underrun' in line.lower():
+                stats.audio_underruns += 1
+            elif line:
+                log("AUDIO", "warning", f"aplay: {line}")
+        player.wait()
+    threading.Thread(target=run, name=f'aplay-{player.pid}', daemon=True).start()
@@ -0,0 +1,101 @@
+import hashlib
+import random
+import time
+from config.settings import (DEVICE_ID, RESTART_FAST_RETRIES, RESTART_FAST_DELAY, RESTART_BACKOFF_BASE,
+                             RESTART_BACKOFF_MAX, RESTART_CIRCUIT_THRESHOLD, RESTART_CIRCUIT_PROBE_INTERVAL,
+                             RESTART_STABLE_AFTER)
+
+class CircuitState:
+    CLOSED = 'CLOSED'        # Reintentos normales
+    OPEN = 'OPEN'            # Demasiados fallos: slate y sondeos baratos
+    HALF_OPEN = 'HALF_OPEN'  # El sondeo respondió: un intento real decide
+
+class RestartPolicy:
+    """Decide cuánto esperar antes de relanzar FFmpeg tras un fallo"""
+
+    def __init__(self, seed=DEVICE_ID):
+        # Jitter determinista por dispositivo: la flota no reconecta a la vez
+        digest = hashlib.sha1(str(seed).encode()).digest()
+        self._random = random.Random(int.from_bytes(digest[:8], 'big'))
+        self.state = CircuitState.CLOSED
+        self.consecutive_failures = 0
+        self.last_start = 0
+        self.last_delay = 0
+        self.counters = {
+            'starts': 0,
+            'failures': 0,
+            'fast_retries': 0,
+            'backoffs': 0,
+            'circuit_opens': 0,
+            'probes': 0,
+            'probe_failures': 0,
+        }
+        self.failure_reasons = {}
+
+    def _jitter(self, delay):
+        # Jitter "igual": entre la mitad y el total del retardo
+        return delay / 2 + self._random.uniform(0, delay / 2)
+
+    def record_start(self):
+        self.last_start = time.time()
+        self.counters['starts'] += 1
+
+    def reset(self):
+        """Nueva asignación: se empieza de cero"""
+        self.state = CircuitState.CLOSED
+        self.consecutive_failures = 0
+
+    def record_success(self):
+        """El pipeline produjo imagen: se cierra el circuito y se olvidan los fallos"""
+        self.state = CircuitState.CLOSED
+        self.consecutive_failures = 0
+
+    def record_failure(self, reason, ran_for=0):
+        """Registra un fallo y devuelve los segundos de espera antes del siguiente intento"""
+        self.counters['failures'] += 1
+        self.failure_reasons[reason] = self.failure_reasons.get(reason, 0) + 1
+
+        # Un corte tras un rato reproduciendo se trata como transitorio
+        if ran_for >= RESTART_STABLE_AFTER:
+            self.consecutive_failures = 0
+        self.consecutive_failures += 1
+
+        if self.state == CircuitState.HALF_OPEN or self.consecutive_failures >= RESTART_CIRCUIT_THRESHOLD:
+            if self.state != CircuitState.OPEN:
+                self.counters['circuit_opens'] += 1
+            self.state = CircuitState.OPEN
+            delay = self._jitter(RESTART_CIRCUIT_PROBE_INTERVAL)
+        elif self.consecutive_failures <= RESTART_FAST_RETRIES:
+            self.counters['fast_retries'] += 1
+            delay = self._jitter(RESTART_FAST_DELAY)
+        else:
+            self.counters['backoffs'] += 1
+            exponent = self.consecutive_failures - RESTART_FAST_RETRIES - 1
+            delay = self._jitter(min(RESTART_BACKOFF_MAX, RESTART_BACKOFF_BASE * 2 ** exponent))
+
+        self.last_delay = delay
+        return delay
+
+    def record_probe(self, ok):
+        """Resultado de un sondeo con el circuito abierto. Devuelve la espera hasta el siguiente"""
+        self.counters['probes'] += 1
+        if ok:
+            self.state = CircuitState.HALF_OPEN
+            self.last_delay = 0
+            return 0
+        self.counters['probe_failures'] += 1
+        self.last_delay = self._jitter(RESTART_CIRCUIT_PROBE_INTERVAL)
+        return self.last_delay
+
+    @property
+    def is_open(self):
+        return self.state == CircuitState.OPEN
+
+    def as_dict(self):
+        return {
+            'state': self.state,
+            'consecutive_failures': self.consecutive_failures,
+            'last_delay': round(self.last_delay, 2),
+            'failure_reasons': dict(self.failure_reasons),
+            **self.counters,
+        }
@@ -0,0 +1,241 @@
+import json
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+from config.settings import (CACHE_DIR, DECODER_BENCH_SECONDS, DECODER_DEMOTE_SESSIONS, DECODER_DEMOTE_WINDOW,
+                             DECODER_DEMOTE_TTL, DECODER_BENCH_IDLE_AFTER)
+from network.client import log
+
+# Decodificadores con nombre propio a considerar por códec (además del software por defecto)
+NAMED_DECODERS = {
+    'h264': ['h264_v4l2m2m', 'h264_mmal', 'h264_rkmpp', 'h264_cuvid', 'h264_qsv'],
+    'hevc': ['hevc_v4l2m2m', 'hevc_rkmpp', 'hevc_cuvid', 'hevc_qsv'],
+    'mpeg2video': ['mpeg2_v4l2m2m', 'mpeg2_mmal', 'mpeg2_cuvid'],
+}
+
+# Codificador con el que se genera el clip de prueba de cada códec
+BENCH_ENCODERS = {
+    'h264': ['-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p'],
+    'hevc': ['-c:v', 'libx265', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p'],
+    'mpeg2video': ['-c:v', 'mpeg2video', '-q:v', '4'],
+}
+
+# hwaccels que necesitan formatos de salida especiales y no sirven para fbdev tal cual
+SKIPPED_HWACCELS = ('drm', 'opencl', 'vulkan')
+
+def _low_priority():
+    """Prefijo para que las mediciones cedan CPU y disco a la reproducción"""
+    prefix = []
+    if shutil.which('nice'):
+        prefix += ['nice', '-n', '19']
+    if shutil.which('ionice'):
+        prefix += ['ionice', '-c', '3']
+    return prefix
+
+class DecoderRegistry:
+    """Descubre, mide y ordena los decodificadores disponibles en el FFmpeg local"""
+
+    def __init__(self, cache_file=CACHE_DIR / 'decoders.json', ffmpeg='ffmpeg'):
+        self.cache_file = cache_file
+        self.ffmpeg = ffmpeg
+        self._lock = threading.Lock()       # Sólo la caché: nunca se retiene durante una medición
+        self._rank_lock = threading.Lock()  # Una medición a la vez
+        self._cache = self._load_cache()
+        self._version = None
+        self._capabilities = None
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_file) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'version': None, 'rankings': {}, 'demoted': {}, 'failures': {}}
+
+    def _save_cache(self):
+        try:
+            CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            tmp_file = self.cache_file.with_suffix('.tmp')
+            with open(tmp_file, 'w') as f:
+                json.dump(self._cache, f, indent=2)
+            os.replace(tmp_file, self.cache_file)
+        except OSError as e:
+            log("DECODER", "warning", f"No se pudo guardar la caché de decodificadores: {e}")
+
+    def _run(self, *args, timeout=30, low_priority=False):
+        prefix = _low_priority() if low_priority else []
+        return subprocess.run([*prefix, self.ffmpeg, '-hide_banner', *args], stdout=subprocess.PIPE,
+                              stderr=subprocess.PIPE, text=True, timeout=timeout)
+
+    def ffmpeg_version(self):
+        if self._version is None:
+            try:
+                self._version = self._run('-version').stdout.split('\n', 1)[0].strip()
+            except Exception:
+                self._version = 'unknown'
+        return self._version
+
+    def capabilities(self):
+        """Devuelve (decodificadores de vídeo, hwaccels) que anuncia el FFmpeg local"""
+        if self._capabilities is None:
+            decoders, hwaccels = set(), []
+            try:
+                for line in self._run('-decoders').stdout.splitlines():
+                    match = re.match(r'\s*V[.A-Z]{5}\s+(\S+)', line)
+                    if match:
+                        decoders.add(match.group(1))
+                lines = self._run('-hwaccels').stdout.splitlines()
+                hwaccels = [l.strip() for l in lines[1:] if l.strip() and l.strip() not in SKIPPED_HWACCELS]
+            except Exception as e:
+                log("DECODER", "warning", f"No se pudieron listar los decodificadores: {e}")
+            self._capabilities = (decoders, hwaccels)
+        return self._capabilities
+
+    def candidates(self, codec):
+        """Candidatos para un códec: acelerados primero, después las variantes por software"""
+        decoders, hwaccels = self.capabilities()
+        result = []
+        for name in NAMED_DECODERS.get(codec, []):
+            if name in decoders:
+                result.append({'name': name, 'codec': codec, 'args': ['-c:v', name], 'software': False})
+        for hwaccel in hwaccels:
+            result.append({'name': f'{codec}+{hwaccel}', 'codec': codec, 'args': ['-hwaccel', hwaccel],
+                           'software': False})
+        # Variantes por software: misma calidad, distinto reparto entre hilos
+        result.append({'name': codec, 'codec': codec, 'args': [], 'software': True})
+        result.append({'name': f'{codec}:slice', 'codec': codec, 'args': ['-thread_type', 'slice'],
+                       'software': True})
+        return result
+
+    def _bench_clip(self, codec, height):
+        """Clip corto generado una vez por códec y resolución"""
+        clip = CACHE_DIR / f'bench_{codec}_{height}p.mkv'
+        if clip.exists():
+            return clip
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        width = (height * 16 // 9) // 2 * 2
+        result = self._run('-y', '-f', 'lavfi', '-i', f'testsrc2=size={width}x{height}:rate=30',
+                           '-t', str(DECODER_BENCH_SECONDS), *BENCH_ENCODERS.get(codec, ['-c:v', codec]),
+                           str(clip), timeout=120, low_priority=True)
+        if result.returncode != 0:
+            raise RuntimeError(f'No se pudo generar el clip de prueba: {result.stderr.strip()[-200:]}')
+        return clip
+
+    def _benchmark(self, candidate, clip, expected_frames):
+        """Decodifica el clip con el candidato; devuelve fps o None si falla"""
+        start = time.time()
+        try:
+            result = self._run(*candidate['args'], '-i', str(clip), '-f', 'null', '-', timeout=60,
+                               low_priority=True)
+        except subprocess.TimeoutExpired:
+            return None
+        elapsed = time.time() - start
+        frames = re.findall(r'frame=\s*(\d+)', result.stderr)
+        decoded = int(frames[-1]) if frames else 0
+        if result.returncode != 0 or decoded < expected_frames * 0.9:
+            return None
+        return round(decoded / elapsed, 1)
+
+    def rank(self, codec, height):
+        """Ordena los candidatos por velocidad (se mide una sola vez y se guarda en caché)"""
+        key = f'{codec}_{height}p'
+        version = self.ffmpeg_version()
+        with self._rank_lock:
+            with self._lock:
+                if self._cache.get('version') != version:
+                    self._cache = {'version': version, 'rankings': {}, 'demoted': {}, 'failures': {}}
+                if key in self._cache['rankings']:
+                    return self._cache['rankings'][key]
+
+            # Sin el lock de la caché: report_failure no espera a que termine la medición
+            log("DECODER", "info", f"Midiendo decodificadores para {codec} {height}p...")
+            ranking = []
+            try:
+                clip = self._bench_clip(codec, height)
+                for candidate in self.candidates(codec):
+                    fps = self._benchmark(candidate, clip, DECODER_BENCH_SECONDS * 30)
+                    log("DECODER", "info", f"{candidate['name']}: {fps or 'no funciona'}{' fps' if fps else ''}")
+                    if fps:
+                        ranking.append({**candidate, 'fps': fps})
+            except Exception as e:
+                log("DECODER", "warning", f"Medición fallida, se usa el decodificador por software: {e}")
+                return [c for c in self.candidates(codec) if c['software']][:1]
+
+            ranking.sort(key=lambda c: c['fps'], reverse=True)
+            with self._lock:
+                self._cache['rankings'][key] = ranking
+                self._save_cache()
+            return ranking
+
+    def ranking_ready(self, codec, height):
+        return (self._cache.get('version') == self.ffmpeg_version()
+                and f'{codec}_{height}p' in self._cache.get('rankings', {}))
+
+    def select(self, codec, height):
+        """Mejor candidato que no haya sido degradado (sin medir si aún no hay ranking)"""
+        if not self.ranking_ready(codec, height):
+            return None
+        now = time.time()
+        demoted = self._demoted(codec)
+        for candidate in self._cache['rankings'][f'{codec}_{height}p']:
+            if demoted.get(candidate['name'], 0) <= now:
+                return candidate
+        return None
+
+    def _demoted(self, codec):
+        """Degradaciones del códec: nombre -> instante en que caducan"""
+        demoted = self._cache.setdefault('demoted', {})
+        if not isinstance(demoted.get(codec), dict):
+            # Formato antiguo (lista sin caducidad): se descarta
+            demoted[codec] = {}
+        return demoted[codec]
+
+    def report_failure(self, codec, name, reason):
+        """Anota una sesión fallida del decodificador. Se degrada al acumular DECODER_DEMOTE_SESSIONS
+        en DECODER_DEMOTE_WINDOW y la degradación caduca tras DECODER_DEMOTE_TTL.
+        Devuelve True si acaba de degradarse"""
+        now = time.time()
+        with self._lock:
+            demoted = self._demoted(codec)
+            if demoted.get(name, 0) > now:
+                return False
+            failures = self._cache.setdefault('failures', {}).setdefault(codec, {})
+            recent = [t for t in failures.get(name, []) if now - t < DECODER_DEMOTE_WINDOW] + [now]
+            if len(recent) < DECODER_DEMOTE_SESSIONS:
+                failures[name] = recent
+                self._save_cache()
+                log("DECODER", "info", f"Sesión fallida con {name} ({len(recent)}/{DECODER_DEMOTE_SESSIONS}): {reason}")
+                return False
+            failures.pop(name, None)
+            demoted[name] = now + DECODER_DEMOTE_TTL
+            self._save_cache()
+        log("DECODER", "warning", f"Decodificador {name} degradado {DECODER_DEMOTE_TTL // 3600}h: {reason}")
+        return True
+
+    def report_success(self, codec, name):
+        """Una sesión sin fallos del decodificador borra los fallos anotados"""
+        with self._lock:
+            failures = self._cache.get('failures', {}).get(codec, {})
+            if failures.pop(name, None) is not None:
+                self._save_cache()
+
+    def rank_in_background(self, codec, height, idle=None):
+        """Lanza la medición en un hilo para no retrasar la primera reproducción.
+
+        Con `idle`, la medición espera a que devuelva True durante DECODER_BENCH_IDLE_AFTER segundos
+        seguidos (sin arranques ni cambios en curso).
+        """
+        def run():
+            # Incluso la consulta de versión de FFmpeg se hace fuera del hilo que llama
+            if idle and not self.ranking_ready(codec, height):
+                quiet_since = None
+                while quiet_since is None or time.time() - quiet_since < DECODER_BENCH_IDLE_AFTER:
+                    time.sleep(1)
+                    if not idle():
+                        quiet_since = None
+                    elif quiet_since is None:
+                        quiet_since = time.time()
+            self.rank(codec, height)
+        threading.Thread(target=run, daemon=True).start()
@@ -0,0 +1,45 @@
+import time
+from config.settings import ASSETS_DIR, LOOP_CLIP, FAILOVER_LOOP, FAILOVER_BACKUP_COOLDOWN
+from network.client import log
+
+# Fuente ficticia para el clip local en bucle (último recurso, no depende de la red)
+LOOP_SOURCE = 'loop://local'
+
+def loop_input_args():
+    """Entrada del bucle local: el clip configurado o, si no existe, la imagen por defecto"""
+    if LOOP_CLIP.exists():
+        return ['-re', '-stream_loop', '-1', '-i', str(LOOP_CLIP)]
+    return ['-re', '-loop', '1', '-framerate', '5', '-i', str(ASSETS_DIR / 'default.png')]
+
+class FailoverSources:
+    """Orden de fuentes: principal, respaldos indicados por el servidor y bucle local"""
+
+    def __init__(self):
+        self.cooldown = {}  # url -> instante hasta el que no se vuelve a intentar
+
+    def ordered(self, primary, backups):
+        sources = [primary] if primary else []
+        sources += [url for url in (backups or []) if url and url not in sources]
+        if FAILOVER_LOOP and primary:
+            sources.append(LOOP_SOURCE)
+        return sources
+
+    def is_fallback(self, url, primary, backups):
+        return url != primary and url in self.ordered(primary, backups)
+
+    def next_fallback(self, primary, backups, now=None):
+        """Primera fuente de respaldo disponible (sin la principal), o None"""
+        now = now or time.time()
+        for url in self.ordered(primary, backups)[1:]:
+            if self.cooldown.get(url, 0) <= now:
+                return url
+        return None
+
+    def mark_failed(self, url):
+        if url == LOOP_SOURCE:
+            return
+        self.cooldown[url] = time.time() + FAILOVER_BACKUP_COOLDOWN
+        log("FAILOVER", "warning", f"Respaldo {url} fallido, en espera {FAILOVER_BACKUP_COOLDOWN}s")
+
+    def reset(self):
+        self.cooldown.clear()
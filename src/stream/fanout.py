@@ -0,0 +1,225 @@
+import functools
+import os
+import socket
+import subprocess
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from config.settings import (FANOUT_PORT, RECORDING_DIR, RECORDING_SEGMENT_SECONDS, RECORDING_MAX_BYTES,
+                             PREVIEW_DIR, PREVIEW_PORT, PREVIEW_HEIGHT, PREVIEW_BITRATE)
+from network.client import log
+
+# Cada cuánto se revisa el tamaño de las grabaciones (segundos)
+PRUNE_INTERVAL = 10
+
+def relay_output_args(port=FANOUT_PORT):
+    """Salida extra del FFmpeg principal: la entrada tal cual (sin recodificar) en MPEG-TS por UDP local"""
+    return [
+        '-map', '0:v?', '-map', '0:a?',
+        '-c', 'copy',
+        '-f', 'mpegts',
+        f'udp://127.0.0.1:{port}?pkt_size=1316',
+    ]
+
+def _sink_input(port):
+    return ['-fflags', '+genpts', '-i', f'udp://127.0.0.1:{port}?fifo_size=1000000&overrun_nonfatal=1']
+
+def recording_cmd(port):
+    """Grabación por segmentos MPEG-TS, sin recodificar"""
+    return [
+        'ffmpeg', '-loglevel', 'error', *_sink_input(port),
+        '-map', '0', '-c', 'copy',
+        '-f', 'segment',
+        '-segment_time', str(RECORDING_SEGMENT_SECONDS),
+        '-segment_format', 'mpegts',
+        '-reset_timestamps', '1',
+        '-strftime', '1',
+        str(RECORDING_DIR / '%Y%m%d-%H%M%S.ts'),
+    ]
+
+def preview_cmd(port):
+    """Vista previa HLS de baja resolución (sólo esta rama se recodifica)"""
+    return [
+        'ffmpeg', '-loglevel', 'error', *_sink_input(port),
+        '-vf', f'scale=-2:{PREVIEW_HEIGHT}',
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-tune', 'zerolatency',
+        '-b:v', PREVIEW_BITRATE, '-g', '50',
+        '-c:a', 'aac', '-b:a', '64k',
+        '-f', 'hls',
+        '-hls_time', '2',
+        '-hls_list_size', '5',
+        '-hls_flags', 'delete_segments',
+        str(PREVIEW_DIR / 'index.m3u8'),
+    ]
+
+class Sink:
+    """Un consumidor de la copia local de la entrada (un FFmpeg propio que escucha en su puerto)"""
+
+    def __init__(self, name, port, build_cmd, directory):
+        self.name = name
+        self.port = port
+        self.build_cmd = build_cmd
+        self.directory = directory
+        self.enabled = False
+        self.process = None
+        self.restarts = 0
+
+    def is_running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.process = subprocess.Popen(self.build_cmd(self.port), stdin=subprocess.DEVNULL,
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        log("FANOUT", "info", f"Salida '{self.name}' iniciada en el puerto {self.port}")
+
+    def stop(self):
+        process, self.process = self.process, None
+        if process and process.poll() is None:
+            # 'q' no sirve sin stdin: SIGTERM deja a FFmpeg cerrar el segmento en curso
+            process.terminate()
+            try:
+                process.wait(timeout=3)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            log("FANOUT", "info", f"Salida '{self.name}' detenida")
+
+class FanOut:
+    """Reparte la copia local de la única conexión SRT entre grabación y vista previa"""
+
+    def __init__(self, port=FANOUT_PORT):
+        self.port = port
+        self.sinks = {
+            'recording': Sink('recording', port + 1, recording_cmd, RECORDING_DIR),
+            'preview': Sink('preview', port + 2, preview_cmd, PREVIEW_DIR),
+        }
+        self.forwarded_packets = 0
+        self.input_at = None         # Último datagrama del relé: la entrada propia del pipeline avanza
+        self.input_bytes = 0         # Bytes de entrada recibidos por el relé (todos los pipelines)
+        self._socket = None
+        self._thread = None
+        self._preview_server = None
+        self._last_prune = 0
+        self._lock = threading.Lock()
+
+    def set_enabled(self, name, enabled):
+        sink = self.sinks[name]
+        if sink.enabled != enabled:
+            log("FANOUT", "info", f"Salida '{name}' {'activada' if enabled else 'desactivada'}")
+            sink.enabled = enabled
+
+    def reconcile(self, playing):
+        """Arranca/para las salidas según lo pedido; sólo corren mientras hay reproducción"""
+        with self._lock:
+            for sink in self.sinks.values():
+                wanted = sink.enabled and playing
+                if wanted and not sink.is_running():
+                    if sink.process is not None:
+                        sink.restarts += 1
+                    sink.start()
+                elif not wanted and sink.process is not None:
+                    sink.stop()
+
+            # Mientras hay reproducción el relé se lee aunque no haya salidas: mide la entrada
+            if playing or any(sink.is_running() for sink in self.sinks.values()):
+                self._start_forwarder()
+            else:
+                self._stop_forwarder()
+
+            self._update_preview_server()
+            if self.sinks['recording'].enabled and time.time() - self._last_prune > PRUNE_INTERVAL:
+                self._last_prune = time.time()
+                self.prune_recordings()
+
+    def stop_all(self):
+        for name in self.sinks:
+            self.set_enabled(name, False)
+        self.reconcile(False)
+
+    def _start_forwarder(self):
+        if self._thread is not None:
+            return
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        sock.bind(('127.0.0.1', self.port))
+        sock.settimeout(1)
+        self._socket = sock
+        self._thread = threading.Thread(target=self._forward, args=(sock,), name='fanout', daemon=True)
+        self._thread.start()
+
+    def _stop_forwarder(self):
+        sock, self._socket = self._socket, None
+        thread, self._thread = self._thread, None
+        if sock:
+            sock.close()
+        if thread:
+            thread.join(timeout=2)
+
+    def _forward(self, sock):
+        """Copia cada datagrama del relé a los puertos de las salidas activas"""
+        out = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        buffer = bytearray(65536)
+        view = memoryview(buffer)
+        while self._socket is sock:
+            try:
+                size = sock.recv_into(buffer)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            self.input_at = time.time()
+            self.input_bytes += size
+            for sink in list(self.sinks.values()):
+                if sink.is_running():
+                    try:
+                        out.sendto(view[:size], ('127.0.0.1', sink.port))
+                    except OSError:
+                        pass
+            self.forwarded_packets += 1
+        out.close()
+
+    def _update_preview_server(self):
+        running = self.sinks['preview'].is_running()
+        if running and self._preview_server is None:
+            handler = functools.partial(_QuietHandler, directory=str(PREVIEW_DIR))
+            try:
+                self._preview_server = ThreadingHTTPServer(('0.0.0.0', PREVIEW_PORT), handler)
+            except OSError as e:
+                log("FANOUT", "error", f"No se pudo servir la vista previa en el puerto {PREVIEW_PORT}: {e}")
+                return
+            self._preview_server.daemon_threads = True
+            threading.Thread(target=self._preview_server.serve_forever, name='preview', daemon=True).start()
+            log("FANOUT", "info", f"Vista previa en http://<ip>:{PREVIEW_PORT}/index.m3u8")
+        elif not running and self._preview_server is not None:
+            self._preview_server.shutdown()
+            self._preview_server.server_close()
+            self._preview_server = None
+
+    def prune_recordings(self, max_bytes=RECORDING_MAX_BYTES):
+        """Borra los segmentos más antiguos hasta quedar por debajo del límite"""
+        try:
+            segments = sorted((e for e in os.scandir(RECORDING_DIR) if e.name.endswith('.ts')),
+                              key=lambda e: e.name)
+        except OSError:
+            return
+        total = sum(e.stat().st_size for e in segments)
+        # El último segmento es el que se está escribiendo
+        for entry in segments[:-1]:
+            if total <= max_bytes:
+                break
+            total -= entry.stat().st_size
+            try:
+                os.unlink(entry.path)
+                log("FANOUT", "debug", f"Segmento borrado por límite de tamaño: {entry.name}")
+            except OSError:
+                pass
+
+    def as_dict(self):
+        return {
+            name: {'enabled': sink.enabled, 'running': sink.is_running(), 'restarts': sink.restarts}
+            for name, sink in self.sinks.items()
+        }
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
@@ -1,103 +1,80 @@
 import time
 import subprocess
-import threading
 import os
-from config.settings import CONFIG_CHECK_INTERVAL
-from display.screen import show_default_image
-from network.client import register_device, get_srt_url, log
+import asyncio
+from config.settings import (SWITCH_MODE, SWITCH_FIRST_FRAME_TIMEOUT, RESTART_PROBE_TIMEOUT,
+                             DECODER_SELECTION, DECODER_DEMOTE_ERRORS, ADAPTIVE_LATENCY, FANOUT_ENABLED,
+                             AUDIO_DEVICE, OUTPUT_STAGE, OVERLAY_ENABLED, AV_OFFSET_ENABLED)
+from display.framebuffer import get_framebuffer_info
+from display.output import OutputStage
+from display.overlay import Overlay, font_available
+from network.client import log
+from stream.adaptive import LatencyController
+from stream.backoff import RestartPolicy
+from stream.decoders import DecoderRegistry
+from stream import audio
+from stream.failover import LOOP_SOURCE, loop_input_args
+from stream.fanout import FanOut, relay_output_args
+from stream.monitor import FFmpegMonitor, pts_filter
+from stream.profiles import get_profile, input_args
+from stream.watchdog import Fault
+from telemetry.ttff import start_session
+from system.probe import probe_hardware
+from stream.supervisor import Supervisor
 
 class StreamManager:
     def __init__(self):
         self.ffmpeg_process = None
-        self.last_config_check = time.time()
+        self.state = 'IDLE'  # Estado del reproductor (lo mantiene el supervisor)
         self.last_srt_url = None
-        self.last_ffmpeg_start = 0  # Timestamp del último inicio de FFmpeg
-        self.failed_attempts = 0    # Contador de intentos fallidos consecutivos
-        self.has_audio = self._check_audio_device()
-        self.has_framebuffer = self._check_framebuffer()
-        self.use_hw_decoder = False  # Inicialmente usar decodificador por software
+        self.last_exit_time = None  # Momento en que terminó el último FFmpeg (para el supervisor)
+        self.last_exit_reason = None  # Motivo del último fallo ('no_first_frame', 'exited')
+        self.last_exit_ran_for = 0    # Segundos que estuvo en marcha el último FFmpeg
+        self.on_process_exit = None  # Aviso al supervisor cuando FFmpeg termina
+        self.restart_policy = RestartPolicy()  # Backoff y circuit breaker de los reinicios
+        self.playback_profile = None  # Perfil pedido (None = PLAYBACK_PROFILE de configuración)
+        self.active_profile = None    # Perfil con el que corre el pipeline actual
+        self.latency = LatencyController()  # Latencia SRT adaptativa por fuente
+        self.active_latency = None    # Latencia SRT (µs) con la que corre el pipeline actual
+        self.pending_session = None   # Sesión de TTFF para el próximo pipeline que se lance
+        # Audio, mezclador y framebuffer se comprueban en paralelo una vez por arranque del sistema
+        probe = probe_hardware()
+        self.has_audio = True  # Aunque ALSA no liste HDMI se intenta con audio
+        self.has_framebuffer = probe['framebuffer']
+        self.decoders = DecoderRegistry()  # Decodificadores disponibles, ordenados por velocidad
+        self.stream_codec = 'h264'         # Códec y altura de la entrada (se aprenden de FFmpeg)
+        self.stream_height = get_framebuffer_info().height
+        self.active_decoder = None         # Decodificador del pipeline actual (None = por defecto)
+        self._next_decoder = None
+        self.last_switch_gap = None       # Tiempo sin imagen nueva en el último cambio de URL (s)
+        self.last_switch_duration = None  # Tiempo hasta el primer frame del último cambio (s)
+        self.monitors = {}                # Monitores activos por PID de FFmpeg
+        self._kill_reasons = {}           # Motivo de los procesos parados por el watchdog (por PID)
+        self.fanout = FanOut()            # Grabación y vista previa a partir de la misma entrada
+        self.output = None                # Escritor de larga duración al framebuffer (OUTPUT_STAGE)
+        self.overlay = Overlay() if OVERLAY_ENABLED and font_available() else None
         
-        # Probar la capacidad de video al inicio
-        if self.has_framebuffer:
-            self._test_video_output()
+        # Medir los decodificadores sin retrasar la primera reproducción
+        if DECODER_SELECTION:
+            self.decoders.rank_in_background(self.stream_codec, self.stream_height, self._pipeline_settled)
 
-    def _check_audio_device(self):
-        """Verifica si hay dispositivos de audio disponibles mediante ALSA"""
-        try:
-            log("AUDIO", "info", "Verificando ALSA para audio HDMI...")
-            
-            # Verificar dispositivos ALSA con aplay -L (más completo)
-            try:
-                alsa_devices = subprocess.run(['aplay', '-L'], 
-                                           stdout=subprocess.PIPE, 
-                                           stderr=subprocess.PIPE,
-                                           text=True)
-                
-                if "hdmi:" in alsa_devices.stdout.lower():
-                    hdmi_devices = [line for line in alsa_devices.stdout.split('\n') if "hdmi:" in line.lower()]
-                    log("AUDIO", "success", f"Dispositivos HDMI encontrados: {', '.join(hdmi_devices)}")
-                    
-                    # Configurar HDMI como salida principal
-                    subprocess.run(['amixer', 'cset', 'numid=3', '2'], 
-                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                    log("AUDIO", "info", "HDMI configurado como salida principal")
-                    
-                    # Establecer volumen al máximo
-                    subprocess.run(['amixer', 'set', 'Master', '100%'], 
-                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                    log("AUDIO", "info", "Volumen configurado al máximo")
-                    
-                    return True
-                else:
-                    log("AUDIO", "warning", "No se encontró ningún dispositivo HDMI en ALSA")
-            except Exception as e:
-                log("AUDIO", "warning", f"Error verificando dispositivos ALSA: {e}")
-            
-            # Incluso si no pudimos verificar, asumimos que hay audio y lo intentamos
-            log("AUDIO", "info", "Asumiendo que hay audio disponible")
-            return True
-            
-        except Exception as e:
-            log("AUDIO", "error", f"Error verificando dispositivos de audio: {e}")
+    def _pipeline_settled(self):
+        """True si no hay un pipeline arrancando o cambiando: la medición no compite con el primer frame"""
+        if self.state in ('STARTING', 'SWITCHING'):
             return False
+        stats = self.get_stats()
+        return stats is None or stats.first_frame_at is not None
 
     def _check_framebuffer(self):
         """Verifica si el framebuffer está disponible"""
-        if os.path.exists('/dev/fb0'):
-            log("VIDEO", "info", "Framebuffer detectado: /dev/fb0")
+        fb = get_framebuffer_info(refresh=True)
+        if os.path.exists(fb.device):
+            log("VIDEO", "info", f"Framebuffer detectado: {fb}")
             return True
         else:
             log("VIDEO", "error", "Framebuffer no encontrado")
             return False
             
-    def _test_video_output(self):
-        """Realiza una prueba básica de salida de video"""
-        try:
-            log("VIDEO", "info", "Realizando prueba de video...")
-            # Intentar mostrar un patrón de color con ffmpeg
-            cmd = [
-                'ffmpeg', 
-                '-loglevel', 'error',
-                '-f', 'lavfi', 
-                '-i', 'color=c=blue:s=1280x720:d=3', 
-                '-pix_fmt', 'rgb565',
-                '-f', 'fbdev', 
-                '-y', '/dev/fb0'
-            ]
-            
-            result = subprocess.run(cmd, stderr=subprocess.PIPE, text=True)
-            
-            if result.returncode == 0:
-                log("VIDEO", "success", "Prueba de video exitosa")
-                return True
-            else:
-                log("VIDEO", "error", f"Error en prueba de video: {result.stderr}")
-                return False
-                
-        except Exception as e:
-            log("VIDEO", "error", f"Error realizando prueba de video: {e}")
-            return False
-
     def _test_local_video(self):
         """Probar reproducción con un video local de prueba"""
         log("VIDEO", "info", "Intentando reproducir video local de prueba...")
@@ -119,9 +96,8 @@ class StreamManager:
                 'ffmpeg',
                 '-re',
                 '-i', '/tmp/test.mp4',
-                '-pix_fmt', 'rgb565',
-                '-f', 'fbdev',
-                '-y', '/dev/fb0'
+                '-y',
+                *get_framebuffer_info().ffmpeg_output_args()
             ]
             
             log("VIDEO", "info", "Reproduciendo video de prueba...")
@@ -138,173 +114,411 @@ class StreamManager:
             return False
 
     def stop_ffmpeg(self):
-        if self.ffmpeg_process:
+        # Soltar la referencia antes de parar: una parada voluntaria no cuenta como fallo
+        process, self.ffmpeg_process = self.ffmpeg_process, None
+        if process:
             log("FFMPEG", "info", "Deteniendo FFmpeg")
             try:
-                self.ffmpeg_process.terminate()
-                self.ffmpeg_process.wait(timeout=3)
+                process.terminate()
+                process.wait(timeout=3)
             except Exception as e:
                 log("FFMPEG", "error", f"Error deteniendo FFmpeg: {e}")
                 try:
-                    self.ffmpeg_process.kill()
+                    process.kill()
                 except:
                     pass
-            self.ffmpeg_process = None
 
-    def stream_video(self):
-        current_time = time.time()
-        
+    def is_running(self):
+        """Indica si hay un FFmpeg de reproducción vivo"""
+        return self.ffmpeg_process is not None and self.ffmpeg_process.poll() is None
+
+    def stream_video(self, srt_url):
+        """Arranca la reproducción de una URL SRT. Devuelve True si el proceso quedó en marcha"""
         # Verificar si el framebuffer está disponible
         if not self.has_framebuffer:
             self.has_framebuffer = self._check_framebuffer()
             if not self.has_framebuffer:
                 log("VIDEO", "error", "No se puede reproducir sin framebuffer")
-                time.sleep(10)
-                return
-        
-        # Obtener la URL SRT del servidor
-        srt_url = get_srt_url()
-        if not srt_url:
-            log("STREAM", "warning", "No hay URL SRT disponible. Reintentando en 10 segundos...")
-            show_default_image()
-            time.sleep(10)
-            return
+                return False
         
         # Guardar la última URL SRT para reutilizarla en caso de reconexión
         self.last_srt_url = srt_url
         
-        # Si FFmpeg no está corriendo, iniciarlo
-        if not self.ffmpeg_process or (self.ffmpeg_process and self.ffmpeg_process.poll() is not None):
-            log("STREAM", "info", f"Iniciando reproducción con SRT URL: {srt_url}")
-            
-            # Configurar HDMI como salida antes de iniciar FFmpeg
+        # Nunca más de un decodificador: si ya hay uno vivo no se lanza otro
+        if self.is_running():
+            return True
+        
+        log("STREAM", "info", f"Iniciando reproducción con SRT URL: {srt_url}")
+        
+        session = self._take_session(srt_url, 'start')
+        try:
+            self.ffmpeg_process = self._start_ffmpeg(srt_url)
+            session.mark('spawn')
+            if self.output:
+                # Sin pipeline anterior que conservar: sus frames se pintan desde el primero
+                self.output.activate(self.ffmpeg_process.pid)
+            self.active_profile = get_profile(self.playback_profile)[0]
+            self.active_latency = self.latency.latency(srt_url, self.active_profile)
+            self.active_decoder = self._next_decoder
+            self.restart_policy.record_start()
+            log("FFMPEG", "success",
+                f"Proceso iniciado (perfil {self.active_profile}, "
+                f"decodificador {self.active_decoder['name'] if self.active_decoder else 'por defecto'})")
+        
+            # Iniciar monitoreo
+            self._start_monitor(self.ffmpeg_process, session)
+            return True
+        except Exception as e:
+            log("FFMPEG", "error", f"Error iniciando proceso: {e}")
+            session.finish('start_error')
+            self.ffmpeg_process = None
+            return False
+
+    def _take_session(self, srt_url, reason):
+        """Sesión de TTFF preparada por el supervisor (o una nueva si no la hay)"""
+        session, self.pending_session = self.pending_session, None
+        return session or start_session(srt_url, reason)
+
+    def probe_source(self, srt_url):
+        """Sondeo barato de la fuente (handshake y cabeceras, sin decodificar)"""
+        cmd = [
+            'ffprobe',
+            '-v', 'error',
+            '-probesize', '32768',
+            '-analyzeduration', '0',
+            '-show_entries', 'stream=codec_type',
+            '-of', 'csv=p=0',
+            srt_url
+        ]
+        try:
+            result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                    text=True, timeout=RESTART_PROBE_TIMEOUT)
+            return result.returncode == 0 and bool(result.stdout.strip())
+        except Exception as e:
+            log("FFMPEG", "warning", f"Sondeo de la fuente fallido: {e}")
+            return False
+
+    def _build_ffmpeg_cmd(self, srt_url, progress='pipe:1', audio_target=None, pts_fds=None):
+        """Construye el comando FFmpeg para reproducir una URL SRT (o el bucle local)"""
+        is_loop = srt_url == LOOP_SOURCE
+        
+        # Mejor decodificador medido para la entrada (sin ranking aún: el de FFmpeg por defecto)
+        self._next_decoder = (self.decoders.select(self.stream_codec, self.stream_height)
+                              if DECODER_SELECTION and not is_loop else None)
+        
+        fb = get_framebuffer_info()
+        overlay = self.overlay.filter() if self.overlay else None
+        video_pts = pts_filter(pts_fds['video']) if pts_fds else None
+        
+        # Decodificar, escalar y convertir al formato nativo del framebuffer en una sola pasada
+        ffmpeg_cmd = [
+            'ffmpeg',
+            '-nostats',
+            '-progress', progress,   # Progreso legible por máquina
+            '-stats_period', '0.1',  # Progreso frecuente para detectar el primer frame
+            *(self._next_decoder['args'] if self._next_decoder else []),
+            *(loop_input_args() if is_loop else
+              input_args(srt_url, self.playback_profile, self._srt_overrides(srt_url))),
+            *(fb.rawvideo_output_args(overlay=overlay, timestamps=video_pts) if self.output
+              else fb.ffmpeg_output_args(overlay, timestamps=video_pts))
+        ]
+        
+        # El bucle local es sólo imagen de relleno
+        if is_loop:
+            return ffmpeg_cmd
+        
+        # Añadir audio usando ALSA si está disponible
+        if self.has_audio:
+            ffmpeg_cmd.extend(audio.output_args(
+                audio_target, pts_filter(pts_fds['audio'], audio=True) if pts_fds else None))
+            log("FFMPEG", "debug",
+                f"Audio habilitado con dispositivo específico {AUDIO_DEVICE}"
+                f"{' (vía aplay)' if audio_target else ''}")
+        else:
+            ffmpeg_cmd.append('-an')
+            log("FFMPEG", "warning", "Audio desactivado (no hay dispositivo disponible)")
+        
+        # Copia de la entrada para las salidas extra: siempre presente para poder activarlas
+        # sin reconectar la fuente; sin salidas activas los datagramas se descartan
+        if FANOUT_ENABLED:
+            ffmpeg_cmd.extend(relay_output_args())
+        
+        return ffmpeg_cmd
+
+    def _srt_overrides(self, srt_url):
+        """Opciones SRT ajustadas por el controlador de latencia para esta fuente"""
+        if not ADAPTIVE_LATENCY:
+            return None
+        return self.latency.srt_options(srt_url, get_profile(self.playback_profile)[0])
+
+    def _output_stage(self):
+        """Etapa de salida compartida por todas las fuentes (se crea una sola vez)"""
+        if OUTPUT_STAGE and self.output is None:
+            self.output = OutputStage(get_framebuffer_info())
+            log("OUTPUT", "info", f"Etapa de salida de larga duración sobre {self.output.fb.device}")
+        return self.output
+
+    def _start_ffmpeg(self, srt_url, defer_audio=False):
+        """Lanza un proceso FFmpeg para la URL indicada y lo devuelve.
+        Con defer_audio el audio no abre ALSA hasta que se llame a process.audio_gate.attach()"""
+        output = self._output_stage()
+        # Con etapa de salida stdout lleva los frames y el progreso va por una tubería aparte
+        progress_pipe = os.pipe() if output else None
+        # Con aplay el PCM va por otra tubería; aplay termina cuando FFmpeg la cierra
+        audio_pipe = (os.pipe() if self.has_audio and (audio.uses_player() or defer_audio)
+                      and srt_url != LOOP_SOURCE else None)
+        # pts de salida de vídeo y audio para medir el desfase entre ambos
+        pts_pipes = ({'video': os.pipe(), 'audio': os.pipe()}
+                     if AV_OFFSET_ENABLED and self.has_audio and srt_url != LOOP_SOURCE else {})
+        child_fds = tuple(pipe[1] for pipe in (progress_pipe, audio_pipe, *pts_pipes.values()) if pipe)
+        player = gate = None
+        try:
+            ffmpeg_cmd = self._build_ffmpeg_cmd(
+                srt_url,
+                progress=f'pipe:{progress_pipe[1]}' if progress_pipe else 'pipe:1',
+                audio_target=f'pipe:{audio_pipe[1]}' if audio_pipe else None,
+                pts_fds={kind: pipe[1] for kind, pipe in pts_pipes.items()})
+            log("FFMPEG", "debug", f"Comando: {' '.join(ffmpeg_cmd)}")
+            if audio_pipe and defer_audio:
+                gate = audio.AudioGate(audio_pipe[0])
+            elif audio_pipe:
+                player = audio.start_player(audio_pipe[0])
+            process = subprocess.Popen(
+                ffmpeg_cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                pass_fds=child_fds
+            )
+        except Exception:
+            if player:
+                player.kill()
+            if progress_pipe:
+                os.close(progress_pipe[0])
+            for pipe in pts_pipes.values():
+                os.close(pipe[0])
+            raise
+        finally:
+            for fd in child_fds:
+                os.close(fd)
+            # La compuerta se queda con su extremo y lo cierra al llegar el EOF
+            if audio_pipe and not gate:
+                os.close(audio_pipe[0])
+        
+        process.audio_player = player
+        process.audio_gate = gate
+        process.pts = {kind: os.fdopen(pipe[0], 'rb', buffering=0) for kind, pipe in pts_pipes.items()}
+        if output:
+            process.progress = os.fdopen(progress_pipe[0], 'rb', buffering=0)
+            output.add_source(process)
+        return process
+
+    def switch_stream(self, new_url):
+        """Cambia a una nueva URL SRT minimizando el tiempo sin imagen"""
+        old_process = self.ffmpeg_process
+        old_running = old_process is not None and old_process.poll() is None
+        
+        if SWITCH_MODE != 'make-before-break' or not old_running:
+            return self._switch_stopped(new_url)
+        
+        log("SWITCH", "info", f"Preparando nuevo pipeline para {new_url} sin detener el actual")
+        switch_start = time.time()
+        session = self._take_session(new_url, 'switch')
+        
+        try:
+            # El anterior sigue con ALSA abierto: el audio del nuevo espera al corte
+            new_process = self._start_ffmpeg(new_url, defer_audio=True)
+            session.mark('spawn')
+            new_monitor = self._start_monitor(new_process, session)
+        except Exception as e:
+            log("SWITCH", "error", f"Error iniciando nuevo pipeline: {e}")
+            session.finish('start_error')
+            return self._switch_failed(new_url)
+        
+        # El pipeline anterior sigue pintando /dev/fb0 mientras el nuevo conecta y analiza la entrada
+        if not new_monitor.wait_first_frame(SWITCH_FIRST_FRAME_TIMEOUT):
+            log("SWITCH", "error", "El nuevo pipeline no produjo imagen, se mantiene el actual")
+            if new_url == self.last_srt_url:
+                # Reconfiguración fallida: la latencia actual pasa a ser el objetivo
+                self.latency.targets[(new_url, self.active_profile)] = self.active_latency
             try:
-                # Asegurar HDMI como salida principal
-                subprocess.run(['amixer', 'cset', 'numid=3', '2'], 
-                              stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                log("AUDIO", "info", "HDMI configurado como salida de audio antes de iniciar FFmpeg")
-                
-                # Asegurar que el volumen está al máximo
-                subprocess.run(['amixer', 'set', 'Master', '100%'],
-                              stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                log("AUDIO", "info", "Volumen configurado al 100%")
-            except Exception as e:
-                log("AUDIO", "warning", f"Error configurando HDMI como salida: {e}")
-            
+                new_process.kill()
+                new_process.wait(timeout=3)
+            except Exception:
+                pass
+            return self._switch_failed(new_url)
+        
+        first_frame_time = time.time()
+        old_monitor = self.monitors.get(old_process.pid)
+        
+        # Corte: el nuevo pipeline ya pinta, el anterior se elimina sin esperas
+        if self.output:
+            self.output.activate(new_process.pid)
+        self.ffmpeg_process = new_process
+        self.last_srt_url = new_url
+        self.active_profile = get_profile(self.playback_profile)[0]
+        self.active_latency = self.latency.latency(new_url, self.active_profile)
+        self.active_decoder = self._next_decoder
+        try:
+            old_process.kill()
+            old_process.wait(timeout=3)
+        except Exception as e:
+            log("SWITCH", "warning", f"Error deteniendo pipeline anterior: {e}")
+        self._attach_audio(old_process, new_process, new_monitor)
+        
+        # Tiempo sin imagen nueva: del último frame escrito por la fuente anterior al primero de la nueva
+        if self.output:
+            self.output.switched.wait(1)
+            gap = self.output.switch_gap
+        else:
+            # Directo a fbdev las dos escriben hasta el corte: sólo hay hueco si la anterior ya no avanzaba
+            old_last = old_monitor.stats.last_frame_change_at if old_monitor else None
+            new_first = new_monitor.stats.first_frame_at
+            gap = max(0.0, new_first - old_last) if old_last and new_first else None
+        self.last_switch_gap = gap
+        self.last_switch_duration = first_frame_time - switch_start
+        log("SWITCH", "success",
+            f"Cambio completado: primer frame en {self.last_switch_duration * 1000:.0f} ms, "
+            f"sin imagen nueva {gap * 1000:.0f} ms" if gap is not None else
+            f"Cambio completado: primer frame en {self.last_switch_duration * 1000:.0f} ms")
+        return True
+
+    def _attach_audio(self, old_process, new_process, new_monitor):
+        """Pasa el dispositivo de audio al pipeline nuevo una vez libre"""
+        old_player = getattr(old_process, 'audio_player', None)
+        if old_player:
+            # aplay vaciaría su buffer antes de cerrar: se corta para liberar el PCM ya
             try:
-                # Comando FFmpeg básico que ya está funcionando para video
-                ffmpeg_cmd = [
-                    'ffmpeg',
-                    '-i', srt_url,
-                    '-pix_fmt', 'rgb565',
-                    '-f', 'fbdev',
-                    '/dev/fb0'
-                ]
-                
-                # Añadir audio usando ALSA si está disponible
-                if self.has_audio:
-                    ffmpeg_cmd.extend([
-                        '-f', 'alsa',
-                        '-ac', '2',       # 2 canales (estéreo)
-                        'sysdefault:CARD=vc4hdmi0'  # Dispositivo que funcionó en las pruebas
-                    ])
-                    log("FFMPEG", "info", "Audio habilitado con dispositivo específico sysdefault:CARD=vc4hdmi0")
-                else:
-                    ffmpeg_cmd.append('-an')
-                    log("FFMPEG", "warning", "Audio desactivado (no hay dispositivo disponible)")
-                
-                log("FFMPEG", "debug", f"Comando: {' '.join(ffmpeg_cmd)}")
-                
-                self.ffmpeg_process = subprocess.Popen(
-                    ffmpeg_cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    universal_newlines=True
-                )
-                
-                log("FFMPEG", "success", "Proceso iniciado")
-                
-                # Iniciar monitoreo
-                self._start_simple_monitor()
-            except Exception as e:
-                log("FFMPEG", "error", f"Error iniciando proceso: {e}")
-                self.ffmpeg_process = None
+                old_player.kill()
+                old_player.wait(timeout=3)
+            except Exception:
+                pass
+        if not new_process.audio_gate:
+            return
+        try:
+            new_process.audio_player = new_process.audio_gate.attach()
+            audio.watch_player(new_process.audio_player, new_monitor.stats)
+        except Exception as e:
+            log("AUDIO", "error", f"No se pudo conectar el audio del nuevo pipeline: {e}")
 
-    def _start_simple_monitor(self):
-        """Monitoreo simplificado de la salida"""
-        def simple_monitor():
-            frame_count = 0
-            start_time = time.time()
-            last_status_time = 0
-            
-            while self.ffmpeg_process and self.ffmpeg_process.poll() is None:
-                # Leer stderr (donde FFmpeg escribe sus logs)
-                err = self.ffmpeg_process.stderr.readline()
-                if err:
-                    err = err.strip()
-                    
-                    # Solo mostrar logs críticos para evitar saturación
-                    if 'error' in err.lower() and 'decode_slice_header' not in err:
-                        log("FFMPEG", "error", err)
-                    
-                    # Mostrar info de frames periódicamente
-                    if 'frame=' in err:
-                        frame_count += 1
-                        current_time = time.time()
-                        if current_time - last_status_time > 30:  # Solo cada 30 segundos
-                            log("FFMPEG", "info", f"Reproduciendo: {err}")
-                            last_status_time = current_time
-                
-                # Dormir para reducir uso de CPU
-                time.sleep(0.1)
-            
-            # Verificar el código de salida
-            exit_code = self.ffmpeg_process.poll() if self.ffmpeg_process else None
-            running_time = int(time.time() - start_time)
-            log("FFMPEG", "info", f"Proceso terminado con código {exit_code} después de {running_time}s")
-            
-            # Cuando termine, reiniciar con un retraso
-            if self.ffmpeg_process:
-                # Limpiar el proceso terminado
-                self.ffmpeg_process = None
-                
-                # Esperar un tiempo fijo antes de reintentar
-                time.sleep(5)
-                
-                # Reiniciar reproducción automáticamente
-                log("FFMPEG", "info", "Reintentando reproducción...")
-                self.stream_video()
-                
-        thread = threading.Thread(target=simple_monitor, daemon=True)
-        thread.start()
+    def _switch_failed(self, new_url):
+        """Fallo del cambio con solapamiento: una reconfiguración conserva el pipeline actual,
+        una URL nueva se reintenta parando antes el anterior"""
+        if new_url == self.last_srt_url:
+            return False
+        log("SWITCH", "warning", "Reintentando el cambio sin solapamiento")
+        return self._switch_stopped(new_url)
+
+    def _switch_stopped(self, new_url):
+        """Cambio clásico: parar, esperar y volver a arrancar"""
+        self.stop_ffmpeg()
+        time.sleep(1)
+        return self.stream_video(new_url)
+
+    def _start_monitor(self, process, session=None):
+        """Arranca el monitor de progreso de un proceso FFmpeg"""
+        monitor = FFmpegMonitor(process, on_exit=self._on_ffmpeg_exit, session=session).start()
+        self.monitors[process.pid] = monitor
+        return monitor
+
+    def get_stats(self):
+        """Estadísticas en vivo del pipeline actual (o None si no hay)"""
+        process = self.ffmpeg_process
+        monitor = self.monitors.get(process.pid) if process else None
+        return monitor.stats if monitor else None
+
+    def _on_ffmpeg_exit(self, process, stats):
+        """Llamado desde el hilo del monitor cuando FFmpeg termina"""
+        self.monitors.pop(process.pid, None)
+        running_time = int(time.time() - stats.started_at)
+        
+        # Si el proceso fue reemplazado por un cambio de URL no hay nada que reiniciar
+        if self.ffmpeg_process is not process:
+            return
+        
+        self._review_decoder(stats)
+        
+        # El reinicio aplicará ya la nueva latencia si la salida se debió a pérdidas
+        reason = self._kill_reasons.pop(process.pid, None) or ('no_first_frame' if stats.frame == 0 else 'exited')
+        if ADAPTIVE_LATENCY and self.last_srt_url != LOOP_SOURCE:
+            self.latency.record_exit(self.last_srt_url, self.active_profile, stats, reason)
+        
+        log("FFMPEG", "info",
+            f"Proceso terminado con código {process.returncode} después de {running_time}s "
+            f"({stats.frame} frames, {stats.drop_frames} descartados)")
+        
+        # El reinicio lo decide el supervisor; aquí sólo se avisa
+        self.last_exit_reason = reason
+        self.last_exit_ran_for = running_time
+        self.last_exit_time = time.time()
+        if self.on_process_exit:
+            self.on_process_exit(process)
+
+    def recover(self, fault):
+        """Recuperación rápida de un pipeline vivo pero congelado (detectado por el watchdog)"""
+        process = self.ffmpeg_process
+        if process is None or process.poll() is not None:
+            return
+        
+        if fault == Fault.DECODER_HANG:
+            decoder = self.active_decoder
+            stats = self.get_stats()
+            if decoder and not decoder['software'] and stats and not stats.decoder_reported:
+                stats.decoder_reported = True
+                self.decoders.report_failure(decoder['codec'], decoder['name'], 'decodificador colgado')
+            # El frame congelado sigue en pantalla mientras arranca el nuevo pipeline
+            if self.switch_stream(self.last_srt_url):
+                return
+        
+        # Red parada o salida bloqueada: matar y dejar que la política de reinicio reconecte
+        log("WATCHDOG", "info", f"Reiniciando pipeline por {fault}")
+        self._kill_reasons[process.pid] = fault
+        try:
+            process.kill()
+        except Exception as e:
+            log("WATCHDOG", "error", f"Error deteniendo FFmpeg: {e}")
+
+    def _review_decoder(self, stats):
+        """Aprende el códec de la entrada y degrada el decodificador acelerado si falló"""
+        if not DECODER_SELECTION or not stats.video_codec or self.last_srt_url == LOOP_SOURCE:
+            return
+        
+        decoder = self.active_decoder
+        if (decoder and not decoder['software'] and decoder['codec'] == stats.video_codec
+                and not stats.decoder_reported):
+            # La entrada se abrió bien: sin imagen o con muchos errores propios, la sesión cuenta como
+            # fallo del decodificador (se degrada sólo si se repite en varias sesiones)
+            if stats.frame == 0:
+                self.decoders.report_failure(decoder['codec'], decoder['name'], 'sin frames con la entrada abierta')
+            elif stats.decoder_error_count >= DECODER_DEMOTE_ERRORS:
+                self.decoders.report_failure(decoder['codec'], decoder['name'],
+                                             f'{stats.decoder_error_count} errores de decodificación')
+            else:
+                self.decoders.report_success(decoder['codec'], decoder['name'])
+        
+        # Próximas selecciones con el códec y la resolución reales de la fuente
+        if (stats.video_codec, stats.video_height) != (self.stream_codec, self.stream_height):
+            self.stream_codec, self.stream_height = stats.video_codec, stats.video_height
+            log("DECODER", "info", f"Entrada {self.stream_codec} {self.stream_height}p")
+            self.decoders.rank_in_background(self.stream_codec, self.stream_height, self._pipeline_settled)
+
+    def decoder_failing(self):
+        """True si el decodificador acelerado en uso acumula errores propios y acaba de ser degradado"""
+        decoder, stats = self.active_decoder, self.get_stats()
+        if (not decoder or decoder['software'] or not stats or stats.decoder_reported
+                or stats.decoder_error_count < DECODER_DEMOTE_ERRORS):
+            return False
+        # Una sola anotación por sesión
+        stats.decoder_reported = True
+        return self.decoders.report_failure(decoder['codec'], decoder['name'],
+                                            f'{stats.decoder_error_count} errores de decodificación')
+
+    def latency_pending(self):
+        """Evalúa la calidad del enlace; True si hay que reconfigurar el pipeline con otra latencia"""
+        if not ADAPTIVE_LATENCY or not self.is_running() or self.last_srt_url == LOOP_SOURCE:
+            return False
+        self.latency.observe(self.last_srt_url, self.active_profile, self.get_stats())
+        return self.latency.latency(self.last_srt_url, self.active_profile) != self.active_latency
 
     def run(self):
-        """Bucle principal de ejecución"""
-        while True:
-            try:
-                # Iniciar la reproducción si no está en curso
-                if not self.ffmpeg_process or (self.ffmpeg_process and self.ffmpeg_process.poll() is not None):
-                    self.stream_video()
-                
-                # Verificar periódicamente el estado
-                current_time = time.time()
-                if current_time - self.last_config_check > CONFIG_CHECK_INTERVAL:
-                    self.last_config_check = current_time
-                    
-                    # Comprobar si hay cambios en la URL o estado
-                    log("SISTEMA", "info", "Verificando configuración...")
-                    
-                    # Si hay cambios, reiniciar la reproducción
-                    new_srt_url = get_srt_url()
-                    if new_srt_url != self.last_srt_url:
-                        log("SISTEMA", "info", "La URL SRT ha cambiado, reiniciando reproducción...")
-                        self.stop_ffmpeg()
-                        time.sleep(1)
-                        self.stream_video()
-                
-                # Dormir para no consumir CPU
-                time.sleep(5)
-                
-            except Exception as e:
-                log("SISTEMA", "error", f"Error en bucle principal: {e}")
-                time.sleep(10) 
\ No newline at end of file
+        """Bucle principal de ejecución (supervisor asíncrono)"""
+        asyncio.run(Supervisor(self).run())
@@ -0,0 +1,294 @@
+import os
+import re
+import selectors
+import threading
+import time
+from config.settings import STALL_THRESHOLD, AUDIO_SAMPLE_INTERVAL
+from network.client import log
+from stream import audio
+
+# Cada cuánto se escribe una línea de estado en el log (segundos)
+STATUS_LOG_INTERVAL = 30
+
+# Líneas de FFmpeg que indican datos perdidos o dañados en la entrada
+CORRUPTION_MARKERS = ('corrupt', 'concealing', 'decode_slice_header', 'error while decoding',
+                      'non-existing pps', 'missing picture', 'invalid nal')
+
+# Prefijo de los mensajes de un componente de FFmpeg: "[h264_v4l2m2m @ 0x55d0c8] ..."
+COMPONENT_RE = re.compile(r'^\[(\w+) @ 0x[0-9a-f]+\]')
+
+# "Stream #0:0[0x100]: Video: h264 (High) (...), yuv420p(progressive), 1920x1080 [...]"
+VIDEO_STREAM_RE = re.compile(r'Stream #0:\d+.*?: Video: (\w+).*?, (\d{2,5})x(\d{2,5})')
+
+# "frame:12   pts:3600    pts_time:0.04" (filtro metadata=print)
+PTS_TIME_RE = re.compile(r'pts_time:(-?\d+(?:\.\d+)?)')
+
+# Un pts más antiguo ya no describe lo que se ve u oye (pipeline parado)
+PTS_MAX_AGE = 1
+
+def pts_filter(fd, audio=False):
+    """Filtro que escribe por `fd` el pts de cada frame que sale de la cadena.
+    metadata=print sólo imprime frames con la clave, por eso se añade antes"""
+    prefix = 'a' if audio else ''
+    return (f'{prefix}metadata=mode=add:key=pts:value=1,'
+            f'{prefix}metadata=mode=print:key=pts:direct=1:file=/dev/fd/{fd}')
+
+class FFmpegStats:
+    """Estadísticas en vivo de un proceso FFmpeg (a partir de -progress)"""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.first_frame_at = None
+        self.updated_at = None
+        self.frame = 0
+        self.fps = 0.0
+        self.drop_frames = 0
+        self.dup_frames = 0
+        self.bitrate_kbps = 0.0
+        self.speed = 0.0
+        self.total_size = 0
+        self.out_time_us = 0
+        self.error_count = 0
+        self.decoder_error_count = 0  # Errores del propio decodificador (sin pérdidas de red)
+        self.decoder_reported = False # Fallo del decodificador ya anotado en esta sesión
+        self.last_error = None
+        self.ended = False
+        self.corrupt_count = 0       # Líneas de datos perdidos/dañados (pérdida en la red)
+        self.stall_count = 0         # Veces que la imagen se congeló más de STALL_THRESHOLD
+        self.stalled = False
+        self.last_frame_change_at = None
+        self.audio_underruns = 0     # Vaciados del buffer de ALSA (chasquidos)
+        self.alsa_delay_ms = None    # Audio en el buffer de ALSA pendiente de sonar
+        self.av_offset_ms = None     # Retraso del audio respecto a la imagen (positivo = audio tarde)
+        self.video_pts = None        # (pts_time, instante) del último frame de vídeo escrito
+        self.audio_pts = None        # (pts_time, instante) del último frame de audio escrito
+        self.video_codec = None   # Códec y resolución de la entrada (de las cabeceras de FFmpeg)
+        self.video_width = None
+        self.video_height = None
+
+    def update(self, block):
+        """Aplica un bloque completo de -progress (clave=valor)"""
+        frame = _to_int(block.get('frame'), self.frame)
+        if frame != self.frame:
+            self.last_frame_change_at = time.time()
+            self.stalled = False
+        self.frame = frame
+        self.fps = _to_float(block.get('fps'), self.fps)
+        self.drop_frames = _to_int(block.get('drop_frames'), self.drop_frames)
+        self.dup_frames = _to_int(block.get('dup_frames'), self.dup_frames)
+        self.bitrate_kbps = _to_float(block.get('bitrate', '').replace('kbits/s', ''), self.bitrate_kbps)
+        self.speed = _to_float(block.get('speed', '').rstrip('x'), self.speed)
+        self.total_size = _to_int(block.get('total_size'), self.total_size)
+        self.out_time_us = _to_int(block.get('out_time_us'), self.out_time_us)
+        self.ended = block.get('progress') == 'end'
+        self.updated_at = time.time()
+        if self.frame > 0 and self.first_frame_at is None:
+            self.first_frame_at = self.updated_at
+
+    def check_stall(self, now):
+        """Cuenta un corte si los frames dejan de avanzar tras haber empezado"""
+        if self.last_frame_change_at and not self.stalled and now - self.last_frame_change_at > STALL_THRESHOLD:
+            self.stalled = True
+            self.stall_count += 1
+
+    def sample_audio(self, owners):
+        """Mide el retardo del buffer de ALSA (None sin tarjeta o con el PCM cerrado) y el desfase"""
+        delay = audio.playback_delay_ms(owners)
+        self.alsa_delay_ms = round(delay, 1) if delay is not None else None
+        self.av_offset_ms = self._av_offset(delay)
+
+    def _av_offset(self, delay):
+        """pts de la imagen en pantalla menos pts del audio que suena, llevados al mismo instante.
+        Sin tarjeta ('null', 'default'...) no hay buffer medible y el retardo cuenta como 0"""
+        now = time.time()
+        if not self.video_pts or not self.audio_pts:
+            return None
+        if now - self.video_pts[1] > PTS_MAX_AGE or now - self.audio_pts[1] > PTS_MAX_AGE:
+            return None
+        shown = self.video_pts[0] + (now - self.video_pts[1])
+        heard = self.audio_pts[0] + (now - self.audio_pts[1]) - (delay or 0) / 1000
+        return round((shown - heard) * 1000, 1)
+
+    def as_dict(self):
+        return {
+            'fps': self.fps,
+            'frames': self.frame,
+            'dropped_frames': self.drop_frames,
+            'duplicated_frames': self.dup_frames,
+            'bitrate_kbps': self.bitrate_kbps,
+            'speed': self.speed,
+            'errors': self.error_count,
+            'decoder_errors': self.decoder_error_count,
+            'corrupt': self.corrupt_count,
+            'stalls': self.stall_count,
+            'audio_underruns': self.audio_underruns,
+            'alsa_delay_ms': self.alsa_delay_ms,
+            'av_offset_ms': self.av_offset_ms,
+            'last_error': self.last_error,
+            'uptime': round(time.time() - self.started_at, 1),
+        }
+
+def _to_int(value, default):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+def _to_float(value, default):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+def _pts_time(line, default):
+    match = PTS_TIME_RE.search(line)
+    return (float(match.group(1)), time.time()) if match else default
+
+class FFmpegMonitor:
+    """Lee stdout (-progress) y stderr de FFmpeg con un selector, sin esperas por línea"""
+
+    def __init__(self, process, on_exit=None, session=None):
+        self.process = process
+        self.session = session  # Sesión de TTFF a la que se le marcan las fases
+        self.stats = FFmpegStats()
+        self.first_frame = threading.Event()
+        self._on_exit = on_exit
+        self._progress_block = {}
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def wait_first_frame(self, timeout):
+        """Espera al primer frame decodificado; False si el proceso termina antes o vence el plazo"""
+        deadline = time.time() + timeout
+        while not self.first_frame.is_set():
+            remaining = deadline - time.time()
+            if remaining <= 0 or self.process.poll() is not None:
+                return self.first_frame.is_set()
+            self.first_frame.wait(min(0.05, remaining))
+        return True
+
+    def _run(self):
+        selector = selectors.DefaultSelector()
+        pending = {}
+        # Con la etapa de salida stdout lleva frames y el progreso llega por su propia tubería
+        progress = getattr(self.process, 'progress', None) or self.process.stdout
+        pts = getattr(self.process, 'pts', None) or {}
+        for stream, handler in ((progress, self._handle_progress),
+                                (self.process.stderr, self._handle_stderr),
+                                (pts.get('video'), self._handle_video_pts),
+                                (pts.get('audio'), self._handle_audio_pts)):
+            if stream is not None:
+                fd = stream.fileno()
+                os.set_blocking(fd, False)
+                selector.register(fd, selectors.EVENT_READ, handler)
+                pending[fd] = b''
+
+        last_status_time = 0
+        last_audio_sample = 0
+        player = getattr(self.process, 'audio_player', None)
+        if player:
+            audio.watch_player(player, self.stats)
+
+        # Drenar ambas tuberías hasta que FFmpeg las cierre
+        while pending:
+            for key, _ in selector.select(timeout=1):
+                try:
+                    chunk = os.read(key.fd, 65536)
+                except BlockingIOError:
+                    continue
+                if not chunk:
+                    selector.unregister(key.fd)
+                    pending.pop(key.fd, None)
+                    continue
+
+                # FFmpeg separa las líneas de estadísticas con \r
+                lines = (pending[key.fd] + chunk).replace(b'\r', b'\n').split(b'\n')
+                pending[key.fd] = lines.pop()
+                for line in lines:
+                    if line:
+                        key.data(line.decode(errors='replace').strip())
+
+            current_time = time.time()
+            if not self.stats.ended:
+                self.stats.check_stall(current_time)
+            if current_time - last_audio_sample >= AUDIO_SAMPLE_INTERVAL:
+                # Tras un cambio aplay se conecta después de arrancar: se consulta en cada muestra
+                player = getattr(self.process, 'audio_player', None)
+                self.stats.sample_audio({self.process.pid, player.pid if player else None})
+                last_audio_sample = current_time
+            if self.stats.frame and current_time - last_status_time > STATUS_LOG_INTERVAL:
+                log("FFMPEG", "info",
+                    f"Reproduciendo: {self.stats.frame} frames, {self.stats.fps:.1f} fps, "
+                    f"{self.stats.bitrate_kbps:.0f} kbps, {self.stats.drop_frames} descartados")
+                last_status_time = current_time
+
+        selector.close()
+        self.process.wait()
+
+        if self.session:
+            self.session.finish('failed')
+
+        if self._on_exit:
+            self._on_exit(self.process, self.stats)
+
+    def _handle_progress(self, line):
+        key, _, value = line.partition('=')
+        self._progress_block[key] = value
+        if key == 'progress':
+            self.stats.update(self._progress_block)
+            self._progress_block = {}
+            if self.stats.frame > 0 and not self.first_frame.is_set():
+                self.first_frame.set()
+                if self.session:
+                    self.session.mark('first_frame', self.stats.first_frame_at)
+                    self.session.finish('ok')
+
+    def _handle_video_pts(self, line):
+        self.stats.video_pts = _pts_time(line, self.stats.video_pts)
+
+    def _handle_audio_pts(self, line):
+        self.stats.audio_pts = _pts_time(line, self.stats.audio_pts)
+
+    def _from_decoder(self, line):
+        """True si el mensaje lo emite el decodificador de vídeo (no la red ni el demuxer)"""
+        match = COMPONENT_RE.match(line)
+        codec = self.stats.video_codec
+        if not match or not codec:
+            return False
+        # h264, h264_v4l2m2m, h264_mmal... (mpeg2video -> mpeg2_v4l2m2m)
+        component = match.group(1)
+        return component == codec or component.startswith(codec.replace('video', '') + '_')
+
+    def _handle_stderr(self, line):
+        if self.session:
+            if line.startswith('Input #0'):
+                self.session.mark('input_opened')
+            elif line.startswith('Stream mapping:'):
+                self.session.mark('streams_mapped')
+
+        # La primera línea de vídeo es la de la entrada (las de salida vienen después)
+        if self.stats.video_codec is None:
+            match = VIDEO_STREAM_RE.search(line)
+            if match:
+                self.stats.video_codec = match.group(1)
+                self.stats.video_width = int(match.group(2))
+                self.stats.video_height = int(match.group(3))
+
+        lowered = line.lower()
+        corrupt = any(marker in lowered for marker in CORRUPTION_MARKERS)
+        if corrupt:
+            self.stats.corrupt_count += 1
+        if any(marker in lowered for marker in audio.UNDERRUN_MARKERS):
+            self.stats.audio_underruns += 1
+
+        # Solo mostrar logs críticos para evitar saturación
+        if 'error' in lowered and 'decode_slice_header' not in line:
+            self.stats.error_count += 1
+            if not corrupt and self._from_decoder(line):
+                self.stats.decoder_error_count += 1
+            self.stats.last_error = line
+            log("FFMPEG", "error", line)
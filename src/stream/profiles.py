@@ -0,0 +1,63 @@
+from config.settings import PLAYBACK_PROFILE
+from network.client import log
+
+# Perfiles de reproducción: opciones del socket SRT + buffering del demuxer/decodificador.
+# En FFmpeg la latencia SRT va en microsegundos y rcvbuf en bytes.
+PROFILES = {
+    'ultra-low-latency': {
+        'srt': {
+            'latency': 120000,
+            'rcvbuf': 1048576,
+            'tlpktdrop': 1,
+        },
+        'input': [
+            '-fflags', 'nobuffer',
+            '-flags', 'low_delay',
+            '-probesize', '32768',
+            '-analyzeduration', '0',
+        ],
+    },
+    'balanced': {
+        'srt': {
+            'latency': 300000,
+            'rcvbuf': 4194304,
+        },
+        'input': [
+            '-fflags', 'nobuffer',
+            '-probesize', '500000',
+            '-analyzeduration', '500000',
+        ],
+    },
+    'resilient': {
+        'srt': {
+            'latency': 1500000,
+            'rcvbuf': 16777216,
+        },
+        'input': [
+            '-fflags', '+discardcorrupt',
+            '-probesize', '5000000',
+            '-analyzeduration', '2000000',
+        ],
+    },
+}
+
+def get_profile(name=None):
+    """Devuelve (nombre, perfil); si el nombre no existe se usa el de configuración"""
+    name = name or PLAYBACK_PROFILE
+    if name not in PROFILES:
+        log("PERFIL", "warning", f"Perfil desconocido '{name}', usando '{PLAYBACK_PROFILE}'")
+        name = PLAYBACK_PROFILE
+    return name, PROFILES[name]
+
+def apply_srt_options(srt_url, options):
+    """Añade las opciones del socket SRT a la query de la URL (sustituyendo las existentes)"""
+    # Sin re-codificar la query original: streamid suele llevar caracteres como '#!::,='
+    base, _, query = srt_url.partition('?')
+    params = [p for p in query.split('&') if p and p.split('=', 1)[0] not in options]
+    params += [f'{key}={value}' for key, value in options.items()]
+    return f"{base}?{'&'.join(params)}"
+
+def input_args(srt_url, name=None, srt_overrides=None):
+    """Argumentos de entrada de FFmpeg (buffering + URL con opciones SRT) para un perfil"""
+    name, profile = get_profile(name)
+    return [*profile['input'], '-i', apply_srt_options(srt_url, {**profile['srt'], **(srt_overrides or {})})]
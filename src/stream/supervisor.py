@@ -0,0 +1,400 @@
+import asyncio
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config.settings import (CONFIG_CHECK_INTERVAL, SUBSCRIPTION_ENABLED, SLATE_REFRESH_INTERVAL,
+                             FANOUT_ENABLED, RECORDING_ENABLED, PREVIEW_ENABLED, WATCHDOG_ENABLED,
+                             WATCHDOG_INTERVAL, FAILOVER_ENABLED, FAILOVER_DELAY, OVERLAY_INTERVAL, OUTPUT_STAGE,
+                             SWITCH_RETRY_INTERVAL)
+from display.overlay import status_text
+from display.screen import show_default_image
+from network.client import (register_device, current_assignment, assigned_profile, assigned_sinks,
+                            assigned_backups, assigned_overlay, heartbeat_interval, last_control_plane_marks, log)
+from stream.failover import FailoverSources
+from stream.profiles import get_profile
+from telemetry.ttff import PROCESS_START, start_session
+from network.subscription import AssignmentSubscriber
+from stream.watchdog import Fault, Watchdog
+
+# Cada cuánto se revisa el proceso aunque no llegue ningún aviso (segundos)
+PROCESS_CHECK_INTERVAL = 0.5
+
+# Cada cuánto se revisan las salidas extra (grabación, vista previa)
+FANOUT_CHECK_INTERVAL = 2
+
+class PlayerState:
+    """Estados del reproductor compartidos por todas las tareas del supervisor"""
+    IDLE = 'IDLE'              # Sin asignación: slate en pantalla
+    STARTING = 'STARTING'      # Lanzando el pipeline
+    PLAYING = 'PLAYING'        # Pipeline en marcha
+    SWITCHING = 'SWITCHING'    # Cambiando de URL
+    RESTARTING = 'RESTARTING'  # Esperando para reintentar tras un fallo
+    NO_SIGNAL = 'NO_SIGNAL'    # Circuito abierto: slate en pantalla y sondeos baratos
+    FAILOVER = 'FAILOVER'      # Reproduciendo un respaldo mientras se sondea la fuente principal
+
+class Supervisor:
+    """Bucle de eventos único: latido, configuración, proceso y pantalla como tareas separadas"""
+
+    def __init__(self, manager):
+        self.manager = manager
+        self.state = PlayerState.IDLE
+        self.desired_url = None
+        self.restart_at = 0
+        self.policy = manager.restart_policy
+        self._success_recorded = False
+        self.subscriber = None
+        self.watchdog = Watchdog()
+        self.sources = FailoverSources()
+        # Origen y motivo de la próxima sesión de TTFF
+        self._session_reason = 'boot'
+        self._requested_at = PROCESS_START
+        self._round_start = None
+        # Las peticiones HTTP van en su propio hilo: una red lenta nunca retrasa un reinicio
+        self._network = ThreadPoolExecutor(max_workers=1, thread_name_prefix='red')
+        # Todas las operaciones sobre FFmpeg se serializan en un único hilo
+        self._decoder = ThreadPoolExecutor(max_workers=1, thread_name_prefix='decoder')
+
+    async def run(self):
+        self.loop = asyncio.get_running_loop()
+        self._config_changed = asyncio.Event()
+        self._process_wake = asyncio.Event()
+        self._state_changed = asyncio.Event()
+
+        # Avisos desde otros hilos (monitor de FFmpeg, suscripción)
+        self.manager.on_process_exit = lambda process: self._notify(self._process_wake)
+        if SUBSCRIPTION_ENABLED:
+            self.subscriber = AssignmentSubscriber(on_change=lambda: self._notify(self._config_changed)).start()
+
+        # Mostrar el slate mientras no haya nada que reproducir
+        self._state_changed.set()
+        # Una asignación guardada se reproduce ya, sin esperar a la primera ronda con el servidor
+        self._config_changed.set()
+
+        tasks = [
+            self._heartbeat_task(),
+            self._config_task(),
+            self._process_task(),
+            self._display_task(),
+        ]
+        if FANOUT_ENABLED:
+            tasks.append(self._fanout_task())
+        if WATCHDOG_ENABLED:
+            tasks.append(self._watchdog_task())
+        if self.manager.overlay:
+            # Mostrar/ocultar el rótulo sin cortar la reproducción; se atiende en el bucle,
+            # nunca dentro del manejador de la señal
+            self.loop.add_signal_handler(signal.SIGUSR2, self.manager.overlay.toggle)
+            tasks.append(self._overlay_task())
+        await asyncio.gather(*tasks)
+
+    def _notify(self, event):
+        self.loop.call_soon_threadsafe(event.set)
+
+    def _set_state(self, state):
+        if state != self.state:
+            log("SUPERVISOR", "info", f"Estado: {self.state} -> {state}")
+            self.state = state
+            self.manager.state = state
+            self._state_changed.set()
+
+    async def _in_thread(self, executor, func, *args):
+        return await self.loop.run_in_executor(executor, func, *args)
+
+    async def _heartbeat_task(self):
+        """Registro/latido periódico con el proxy y el servidor de streaming"""
+        while True:
+            round_start = time.time()
+            try:
+                registered = await self._in_thread(self._network, register_device)
+                if not registered:
+                    log("SRT", "info", "Registro fallido")
+            except Exception as e:
+                log("SRT", "error", f"Error en latido: {e}")
+            # La próxima pasada de configuración sabrá que el cambio lo trajo esta ronda
+            self._round_start = round_start
+            self._config_changed.set()
+            await asyncio.sleep(heartbeat_interval())
+
+    async def _config_task(self):
+        """Detecta cambios de asignación a partir del último estado conocido (sin red)"""
+        while True:
+            try:
+                await asyncio.wait_for(self._config_changed.wait(), CONFIG_CHECK_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._config_changed.clear()
+            round_start, self._round_start = self._round_start, None
+
+            # Perfil de reproducción: el del servidor o el de configuración
+            new_profile = get_profile(assigned_profile())[0]
+            if new_profile != self.manager.playback_profile:
+                log("SISTEMA", "info", f"Perfil de reproducción: {new_profile}")
+                if self.manager.playback_profile is not None:
+                    self._request_session('profile_change', round_start)
+                self.manager.playback_profile = new_profile
+                self._process_wake.set()
+
+            new_url = current_assignment()
+            if new_url != self.desired_url:
+                log("SISTEMA", "info", f"Asignación cambiada: {self.desired_url} -> {new_url}")
+                # Un cambio que llega con el latido cuenta desde el inicio de esa ronda HTTP
+                if self._session_reason != 'boot':
+                    self._request_session('assignment_change', round_start)
+                self.desired_url = new_url
+                self.restart_at = 0
+                self.policy.reset()
+                self.sources.reset()
+                self._process_wake.set()
+
+    def _request_session(self, reason, requested_at=None):
+        self._session_reason = reason
+        self._requested_at = requested_at or time.time()
+
+    def _prepare_session(self, srt_url):
+        """Abre la sesión de TTFF que medirá el pipeline que se va a lanzar"""
+        # Las rondas HTTP sólo forman parte de la sesión si trajeron la asignación
+        control_plane = last_control_plane_marks() if self._session_reason != 'restart' else None
+        self.manager.pending_session = start_session(
+            srt_url, self._session_reason, self._requested_at, control_plane)
+        self._request_session('restart')
+
+    async def _process_task(self):
+        """Única tarea que decide arrancar, cambiar o parar el pipeline"""
+        while True:
+            try:
+                await asyncio.wait_for(self._process_wake.wait(), PROCESS_CHECK_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._process_wake.clear()
+
+            try:
+                await self._reconcile()
+            except Exception as e:
+                log("SUPERVISOR", "error", f"Error supervisando el proceso: {e}")
+
+    async def _reconcile(self):
+        desired = self.desired_url
+        running = self.manager.is_running()
+        now = time.time()
+
+        if not desired:
+            if running:
+                await self._in_thread(self._decoder, self.manager.stop_ffmpeg)
+            self._set_state(PlayerState.IDLE)
+            return
+
+        backups = assigned_backups()
+        if running and FAILOVER_ENABLED and self.sources.is_fallback(self.manager.last_srt_url, desired, backups):
+            await self._check_primary(desired, now)
+            return
+
+        if running:
+            # El primer frame cierra el circuito y olvida los fallos anteriores
+            stats = self.manager.get_stats()
+            if stats and stats.first_frame_at and not self._success_recorded:
+                self.policy.record_success()
+                self._success_recorded = True
+
+            # Mismo URL y perfil: nada que hacer. Un cambio de perfil, de decodificador o de
+            # latencia se aplica como un cambio de URL (sólo con el pipeline ya estable)
+            if (self.manager.last_srt_url == desired
+                    and self.manager.active_profile == self.manager.playback_profile
+                    # Anotar el fallo escribe la caché en disco: fuera del bucle
+                    and not await self._in_thread(None, self.manager.decoder_failing)
+                    and not (self.state == PlayerState.PLAYING and self.manager.latency_pending())):
+                self._set_state(PlayerState.PLAYING)
+                return
+            if now < self.restart_at:
+                # Un cambio anterior falló: el pipeline actual sigue pintando hasta el reintento
+                self._set_state(PlayerState.PLAYING)
+                return
+            if self.policy.is_open and desired != self.manager.last_srt_url:
+                # Circuito abierto: primero un sondeo barato, sin el hilo del decodificador
+                available = await self._in_thread(None, self.manager.probe_source, desired)
+                delay = self.policy.record_probe(available)
+                if not available:
+                    self.restart_at = time.time() + delay
+                    return
+            # Reconfigurar un pipeline que reproduce bien no es un fallo de la fuente si no sale
+            reconfigure = desired == self.manager.last_srt_url and self._success_recorded
+            self._set_state(PlayerState.SWITCHING)
+            self._prepare_session(desired)
+            switched = await self._in_thread(self._decoder, self.manager.switch_stream, desired)
+            if switched:
+                self._success_recorded = False
+            elif reconfigure and self.manager.is_running():
+                self.restart_at = time.time() + SWITCH_RETRY_INTERVAL
+                self._set_state(PlayerState.PLAYING)
+                log("SUPERVISOR", "info",
+                    f"Reconfiguración fallida, se mantiene el pipeline actual; "
+                    f"reintento en {SWITCH_RETRY_INTERVAL}s")
+            else:
+                delay = self.policy.record_failure('no_first_frame')
+                self.restart_at = time.time() + delay
+                log("SUPERVISOR", "info",
+                    f"Cambio fallido (#{self.policy.consecutive_failures}), "
+                    f"reintento en {delay:.1f}s [circuito {self.policy.state}]")
+            self._process_wake.set()
+            return
+
+        # El pipeline terminó: la política decide cuánto esperar
+        if self.manager.last_exit_time and self.manager.last_srt_url == desired:
+            delay = self.policy.record_failure(self.manager.last_exit_reason, self.manager.last_exit_ran_for)
+            self.restart_at = self.manager.last_exit_time + delay
+            self._request_session('restart', self.manager.last_exit_time)
+            self.manager.last_exit_time = None
+            log("SUPERVISOR", "info",
+                f"Fallo '{self.manager.last_exit_reason}' (#{self.policy.consecutive_failures}), "
+                f"reintento en {delay:.1f}s [circuito {self.policy.state}]")
+        elif self.manager.last_exit_time and self.sources.is_fallback(self.manager.last_srt_url, desired, backups):
+            # Cayó un respaldo: se descarta un tiempo y se pasa al siguiente
+            self.sources.mark_failed(self.manager.last_srt_url)
+            self.manager.last_exit_time = None
+
+        if now < self.restart_at:
+            if not await self._start_fallback(desired, backups):
+                self._set_state(PlayerState.NO_SIGNAL if self.policy.is_open else PlayerState.RESTARTING)
+            return
+
+        # Con el circuito abierto sólo se sondea la fuente; no se lanza el decodificador
+        if self.policy.is_open:
+            self._set_state(PlayerState.NO_SIGNAL)
+            available = await self._in_thread(self._decoder, self.manager.probe_source, desired)
+            delay = self.policy.record_probe(available)
+            if not available:
+                self.restart_at = time.time() + delay
+                await self._start_fallback(desired, backups)
+                return
+            log("SUPERVISOR", "info", "La fuente responde de nuevo, reintentando reproducción")
+
+        self._set_state(PlayerState.STARTING)
+        self._success_recorded = False
+        self._prepare_session(desired)
+        started = await self._in_thread(self._decoder, self.manager.stream_video, desired)
+        if started:
+            self._set_state(PlayerState.PLAYING)
+        else:
+            self.restart_at = time.time() + self.policy.record_failure('start_error')
+            self._set_state(PlayerState.RESTARTING)
+
+    async def _start_fallback(self, desired, backups):
+        """Mientras la principal espera su reintento, reproduce el siguiente respaldo disponible"""
+        if not FAILOVER_ENABLED or self.restart_at - time.time() <= FAILOVER_DELAY:
+            return False
+        fallback = self.sources.next_fallback(desired, backups)
+        if not fallback:
+            return False
+
+        log("FAILOVER", "warning", f"Fuente principal sin señal, reproduciendo respaldo: {fallback}")
+        self._set_state(PlayerState.STARTING)
+        self._request_session('failover')
+        self._prepare_session(fallback)
+        started = await self._in_thread(self._decoder, self.manager.stream_video, fallback)
+        if not started:
+            self.sources.mark_failed(fallback)
+            return False
+        self._set_state(PlayerState.FAILOVER)
+        return True
+
+    async def _check_primary(self, desired, now):
+        """Con un respaldo en pantalla, sondea la principal y vuelve a ella cuando responde (sin corte con OUTPUT_STAGE)"""
+        self._set_state(PlayerState.FAILOVER)
+        if now < self.restart_at:
+            return
+
+        # El sondeo no usa el hilo del decodificador: el respaldo sigue sin interrupciones
+        available = await self._in_thread(None, self.manager.probe_source, desired)
+        if not available:
+            if self.policy.is_open:
+                delay = self.policy.record_probe(False)
+            else:
+                delay = self.policy.record_failure('probe_failed')
+            self.restart_at = time.time() + delay
+            return
+        if self.policy.is_open:
+            self.policy.record_probe(True)
+
+        log("FAILOVER", "info", "La fuente principal responde de nuevo, volviendo a ella")
+        self._set_state(PlayerState.SWITCHING)
+        self._success_recorded = False
+        self._request_session('failback')
+        self._prepare_session(desired)
+        if OUTPUT_STAGE:
+            # Sin corte: el respaldo sigue en pantalla hasta el primer frame de la principal
+            switched = await self._in_thread(self._decoder, self.manager.switch_stream, desired)
+        else:
+            # Sin etapa de salida dos FFmpeg pintarían a la vez en el framebuffer: se para el respaldo
+            await self._in_thread(self._decoder, self.manager.stop_ffmpeg)
+            switched = await self._in_thread(self._decoder, self.manager.stream_video, desired)
+        if not switched:
+            # Sigue el respaldo; la principal se vuelve a sondear tras el backoff
+            self.restart_at = time.time() + self.policy.record_failure('no_first_frame')
+        self._process_wake.set()
+
+    async def _watchdog_task(self):
+        """Detecta imagen o audio congelados con el proceso vivo y lanza la recuperación adecuada"""
+        while True:
+            await asyncio.sleep(WATCHDOG_INTERVAL)
+            if self.state != PlayerState.PLAYING:
+                continue
+            try:
+                # La entrada propia del pipeline se mide en su relé (sólo con FANOUT_ENABLED)
+                fault = self.watchdog.check(self.manager.ffmpeg_process, self.manager.get_stats(),
+                                            self.manager.output,
+                                            self.manager.fanout.input_at if FANOUT_ENABLED else None)
+                if not fault:
+                    continue
+                self._request_session(fault)
+                if fault == Fault.DECODER_HANG:
+                    # Se recupera con un cambio sin corte a la misma URL
+                    self._set_state(PlayerState.SWITCHING)
+                    self._prepare_session(self.manager.last_srt_url)
+                await self._in_thread(self._decoder, self.manager.recover, fault)
+            except Exception as e:
+                log("WATCHDOG", "error", f"Error en el watchdog: {e}")
+            self._process_wake.set()
+
+    async def _fanout_task(self):
+        """Activa las salidas extra pedidas; sólo corren mientras hay reproducción"""
+        defaults = {'recording': RECORDING_ENABLED, 'preview': PREVIEW_ENABLED}
+        while True:
+            try:
+                requested = {**defaults, **(assigned_sinks() or {})}
+                for name in self.manager.fanout.sinks:
+                    self.manager.fanout.set_enabled(name, bool(requested.get(name)))
+                playing = self.state in (PlayerState.PLAYING, PlayerState.SWITCHING)
+                await self._in_thread(None, self.manager.fanout.reconcile, playing)
+            except Exception as e:
+                log("FANOUT", "error", f"Error gestionando las salidas extra: {e}")
+            await asyncio.sleep(FANOUT_CHECK_INTERVAL)
+
+    async def _overlay_task(self):
+        """Mantiene al día el texto del rótulo; el servidor puede forzar mostrarlo u ocultarlo"""
+        overlay = self.manager.overlay
+        requested = None
+        while True:
+            try:
+                # Sólo un cambio en lo pedido por el servidor pisa el estado local (señal SIGUSR2)
+                server_visible = assigned_overlay()
+                if server_visible is not None and server_visible != requested:
+                    overlay.set_visible(server_visible)
+                requested = server_visible
+                if overlay.visible:
+                    running = self.manager.is_running()
+                    overlay.update(status_text(self.state, self.manager.get_stats() if running else None,
+                                               self.manager.last_srt_url if running else None))
+            except Exception as e:
+                log("OVERLAY", "error", f"Error actualizando el rótulo: {e}")
+            await asyncio.sleep(OVERLAY_INTERVAL)
+
+    async def _display_task(self):
+        """Pinta el slate sin asignación o con el circuito abierto (y lo refresca de vez en cuando)"""
+        while True:
+            try:
+                await asyncio.wait_for(self._state_changed.wait(), SLATE_REFRESH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._state_changed.clear()
+
+            if self.state in (PlayerState.IDLE, PlayerState.NO_SIGNAL):
+                await self._in_thread(None, show_default_image, self.manager.output)
@@ -0,0 +1,132 @@
+import glob
+import os
+import time
+from config.settings import WATCHDOG_STALL_DEADLINE, AUDIO_DEVICE
+from network.client import log
+from stream.audio import pcm_status
+
+class Fault:
+    NETWORK_STALL = 'network_stall'    # No llegan datos: la fuente o la red se pararon
+    DECODER_HANG = 'decoder_hang'      # Llegan datos pero no salen frames
+    OUTPUT_BLOCKED = 'output_blocked'  # FFmpeg bloqueado escribiendo en framebuffer o ALSA
+    AUDIO_STALL = 'audio_stall'        # El vídeo avanza pero el audio se detuvo
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return f.read()
+    except OSError:
+        return None
+
+def socket_inodes(pid):
+    inodes = set()
+    try:
+        for fd in os.listdir(f'/proc/{pid}/fd'):
+            try:
+                target = os.readlink(f'/proc/{pid}/fd/{fd}')
+            except OSError:
+                continue
+            if target.startswith('socket:['):
+                inodes.add(target[8:-1])
+    except OSError:
+        pass
+    return inodes
+
+def udp_backlog(inodes):
+    """Bytes recibidos y aún no leídos por los sockets UDP indicados"""
+    backlog = 0
+    for table in ('/proc/net/udp', '/proc/net/udp6'):
+        for line in (_read(table) or '').splitlines()[1:]:
+            fields = line.split()
+            if len(fields) > 9 and fields[9] in inodes:
+                backlog += int(fields[4].split(':')[1], 16)
+    return backlog
+
+def blocked_in_kernel(pid):
+    """True si algún hilo de FFmpeg está en espera no interrumpible (escritura a un dispositivo)"""
+    for stat in glob.glob(f'/proc/{pid}/task/*/stat'):
+        content = _read(stat)
+        if content and content.rsplit(')', 1)[1].split()[0] == 'D':
+            return True
+    return False
+
+def audio_status(device=AUDIO_DEVICE):
+    """(estado, hw_ptr, pid dueño) de la reproducción ALSA del dispositivo, o None"""
+    values = pcm_status(device)
+    if not values:
+        return None
+    try:
+        return values.get('state'), int(values.get('hw_ptr', 0)), int(values.get('owner_pid', 0))
+    except ValueError:
+        return None
+
+class Watchdog:
+    """Vigila por separado el avance de vídeo, audio y entrada y clasifica los cuelgues"""
+
+    def __init__(self, deadline=WATCHDOG_STALL_DEADLINE):
+        self.deadline = deadline
+        self.faults = {}
+        self.last_fault = None
+        self._reset(None)
+
+    def _reset(self, pid):
+        self.pid = pid
+        now = time.time()
+        self._inodes = set()
+        self._inodes_at = 0
+        self._audio = (None, now)    # (hw_ptr, instante en que cambió)
+        self._audio_owners = {pid}
+
+    def check(self, process, stats, output=None, input_at=None):
+        """Devuelve el fallo detectado en el pipeline actual, o None.
+        input_at es el último instante con entrada de este pipeline (None si no se puede medir)"""
+        if process is None or stats is None or not stats.first_frame_at:
+            return None
+        if process.pid != self.pid:
+            self._reset(process.pid)
+        # Con aplay el PCM lo tiene abierto aplay, no FFmpeg (tras un cambio se conecta después)
+        player = getattr(process, 'audio_player', None)
+        self._audio_owners = {process.pid, player.pid if player else None}
+        now = time.time()
+
+        audio_frozen = self._track_audio(now)
+
+        video_frozen = stats.last_frame_change_at and now - stats.last_frame_change_at > self.deadline
+        if video_frozen:
+            # La entrada se para antes que la imagen (el buffer SRT aún se vacía): basta media ventana.
+            # Sin medida propia de la entrada no se culpa al decodificador salvo con datos sin leer
+            input_arriving = input_at is not None and now - input_at <= self.deadline / 2
+            if not input_arriving and self._backlog(now) == 0:
+                return self._fault(Fault.NETWORK_STALL)
+            # Con etapa de salida FFmpeg escribe en una tubería: el bloqueo estaría en el escritor
+            if blocked_in_kernel(process.pid) or (output and output.write_blocked(self.deadline)):
+                return self._fault(Fault.OUTPUT_BLOCKED)
+            return self._fault(Fault.DECODER_HANG)
+        if audio_frozen:
+            return self._fault(Fault.AUDIO_STALL)
+        return None
+
+    def _backlog(self, now):
+        if now - self._inodes_at > 5:
+            self._inodes = socket_inodes(self.pid)
+            self._inodes_at = now
+        return udp_backlog(self._inodes) if self._inodes else 0
+
+    def _track_audio(self, now):
+        status = audio_status()
+        if not status or status[2] not in self._audio_owners or status[0] not in ('RUNNING', 'XRUN'):
+            self._audio = (None, now)
+            return False
+        hw_ptr, changed_at = self._audio
+        if status[1] != hw_ptr:
+            self._audio = (status[1], now)
+            return False
+        return now - changed_at > self.deadline
+
+    def _fault(self, fault):
+        self.faults[fault] = self.faults.get(fault, 0) + 1
+        self.last_fault = {'fault': fault, 'at': time.time()}
+        log("WATCHDOG", "warning", f"Imagen o audio detenidos: {fault}")
+        # Nuevo pipeline: las marcas se reinician al cambiar de PID
+        self.pid = None
+        return fault
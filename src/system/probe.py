@@ -0,0 +1,112 @@
+import json
+import os
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from config.settings import CACHE_DIR, PROBE_CACHE_ENABLED
+from display.framebuffer import get_framebuffer_info
+from network.client import log
+
+PROBE_CACHE_FILE = CACHE_DIR / 'probe.json'
+BOOT_ID_FILE = '/proc/sys/kernel/random/boot_id'
+
+def _run(cmd, timeout=5):
+    return subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, timeout=timeout)
+
+def get_boot_id():
+    """Identificador del arranque actual del kernel (None si el sistema no lo expone)"""
+    try:
+        with open(BOOT_ID_FILE) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+def probe_audio():
+    """Busca salidas HDMI en ALSA (aplay -L y aplay -l)"""
+    try:
+        devices = [line for line in _run(['aplay', '-L']).stdout.split('\n') if 'hdmi:' in line.lower()]
+        if not devices and 'HDMI' in _run(['aplay', '-l']).stdout:
+            devices = ['HDMI']
+        if devices:
+            log("AUDIO", "success", f"Dispositivos HDMI encontrados: {', '.join(devices)}")
+        else:
+            log("AUDIO", "warning", "No se encontró ningún dispositivo HDMI en ALSA")
+        return {'audio_devices': devices}
+    except Exception as e:
+        log("AUDIO", "warning", f"Error verificando dispositivos ALSA: {e}")
+        return {'audio_devices': []}
+
+def configure_mixer():
+    """HDMI como salida principal y volumen al máximo (el estado del mezclador dura hasta el reinicio)"""
+    try:
+        _run(['amixer', 'cset', 'numid=3', '2'])
+        _run(['amixer', 'set', 'Master', '100%'])
+        log("AUDIO", "info", "HDMI configurado como salida principal, volumen al 100%")
+        return {'mixer_configured': True}
+    except Exception as e:
+        log("AUDIO", "warning", f"Error configurando HDMI como salida: {e}")
+        return {'mixer_configured': False}
+
+def probe_video():
+    """Comprueba el framebuffer y pinta un único frame de prueba"""
+    fb = get_framebuffer_info(refresh=True)
+    if not os.path.exists(fb.device):
+        log("VIDEO", "error", "Framebuffer no encontrado")
+        return {'framebuffer': False, 'video_ok': False}
+    log("VIDEO", "info", f"Framebuffer detectado: {fb}")
+
+    cmd = [
+        'ffmpeg',
+        '-loglevel', 'error',
+        '-f', 'lavfi',
+        '-i', f'color=c=blue:s={fb.width}x{fb.height}',
+        '-frames:v', '1',
+        '-y',
+        *fb.ffmpeg_output_args()
+    ]
+    try:
+        result = _run(cmd, timeout=10)
+        if result.returncode == 0:
+            log("VIDEO", "success", "Prueba de video exitosa")
+            return {'framebuffer': True, 'video_ok': True}
+        log("VIDEO", "error", f"Error en prueba de video: {result.stderr}")
+    except Exception as e:
+        log("VIDEO", "error", f"Error realizando prueba de video: {e}")
+    return {'framebuffer': True, 'video_ok': False}
+
+def _load_cached(boot_id):
+    try:
+        with open(PROBE_CACHE_FILE) as f:
+            cached = json.load(f)
+        return cached if cached.get('boot_id') == boot_id else None
+    except (OSError, ValueError):
+        return None
+
+def _save(result):
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_file = PROBE_CACHE_FILE.with_suffix('.tmp')
+        with open(tmp_file, 'w') as f:
+            json.dump(result, f, indent=2)
+        os.replace(tmp_file, PROBE_CACHE_FILE)
+    except OSError as e:
+        log("SISTEMA", "warning", f"No se pudo guardar la caché de hardware: {e}")
+
+def probe_hardware(force=False):
+    """Sondeo de audio y video al arrancar, en paralelo y una sola vez por arranque del sistema"""
+    boot_id = get_boot_id()
+    if PROBE_CACHE_ENABLED and boot_id and not force:
+        cached = _load_cached(boot_id)
+        if cached:
+            log("SISTEMA", "info", "Hardware ya verificado en este arranque, usando caché")
+            return cached
+
+    with ThreadPoolExecutor(max_workers=3, thread_name_prefix='probe') as pool:
+        checks = [pool.submit(check) for check in (probe_audio, configure_mixer, probe_video)]
+        result = {'boot_id': boot_id}
+        for check in checks:
+            result.update(check.result())
+
+    # Si la pantalla falló se vuelve a comprobar en el próximo inicio
+    if boot_id and result['video_ok']:
+        _save(result)
+    return result
@@ -0,0 +1,155 @@
+import atexit
+import json
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from config.settings import (DEVICE_ID, LOG_LEVEL, LOG_FORMAT, LOG_RATE_LIMIT, LOG_RATE_WINDOW,
+                             LOG_DEDUP_WINDOW, LOG_DEBUG_BUFFER, LOG_QUEUE_SIZE)
+
+# Niveles de los estados que usa log(); 'success' cuenta como info
+LEVELS = {'debug': 10, 'info': 20, 'success': 20, 'warning': 30, 'error': 40}
+
+_SYMBOLS = {'success': '✓', 'error': '✗'}
+
+class Logger:
+    """Filtra (nivel, límite por categoría, repeticiones) y escribe los logs desde un hilo propio"""
+
+    def __init__(self, level=LOG_LEVEL, fmt=LOG_FORMAT, stream=None):
+        self.level = LEVELS.get(level, LEVELS['info'])
+        self.fmt = fmt
+        self.stream = stream or sys.stdout
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        self._debug_buffer = deque(maxlen=LOG_DEBUG_BUFFER)  # Detalle reciente, se vuelca ante un error
+        self._windows = {}   # categoría -> [inicio de ventana, mensajes, suprimidos]
+        self._last = {}      # categoría -> [(estado, mensaje), repeticiones, instante de la primera]
+        self.dropped = 0     # Registros perdidos por cola llena
+        self._thread = threading.Thread(target=self._writer, name='logger', daemon=True)
+        self._thread.start()
+
+    def log(self, category, status, message):
+        record = {'ts': time.time(), 'category': category, 'status': status, 'message': str(message)}
+        level = LEVELS.get(status, LEVELS['info'])
+
+        with self._lock:
+            # Por debajo del nivel: sólo al buffer de depuración
+            if level < self.level:
+                self._debug_buffer.append(record)
+                return
+
+            pending = self._repeats(record)
+            if pending is None:
+                return
+            allowed, suppressed = self._rate_limit(category, record['ts'])
+            if suppressed:
+                pending.append(self._note(category, 'warning', f'{suppressed} mensajes suprimidos por límite'))
+            if not allowed:
+                self._debug_buffer.append(record)
+                for note in pending:
+                    self._enqueue(note)
+                return
+
+            # Un error trae consigo el detalle que llevó a él
+            if level >= LEVELS['error'] and self._debug_buffer:
+                pending.extend({**r, 'buffered': True} for r in self._debug_buffer)
+                self._debug_buffer.clear()
+
+            for item in pending + [record]:
+                self._enqueue(item)
+
+    def _repeats(self, record):
+        """Notas pendientes antes del registro, o None si es una repetición a descartar"""
+        key = (record['status'], record['message'])
+        last = self._last.get(record['category'])
+        if last and last[0] == key and record['ts'] - last[2] < LOG_DEDUP_WINDOW:
+            last[1] += 1
+            return None
+
+        pending = []
+        if last and last[1]:
+            pending.append(self._note(record['category'], 'info', f'Último mensaje repetido {last[1]} veces'))
+        self._last[record['category']] = [key, 0, record['ts']]
+        return pending
+
+    def _rate_limit(self, category, now):
+        """(permitido, suprimidos de la ventana anterior) para una categoría"""
+        window = self._windows.get(category)
+        suppressed = 0
+        if window is None or now - window[0] >= LOG_RATE_WINDOW:
+            suppressed = window[2] if window else 0
+            window = self._windows[category] = [now, 0, 0]
+        if window[1] >= LOG_RATE_LIMIT:
+            window[2] += 1
+            return False, suppressed
+        window[1] += 1
+        return True, suppressed
+
+    def _note(self, category, status, message):
+        return {'ts': time.time(), 'category': category, 'status': status, 'message': message}
+
+    def _enqueue(self, record):
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def format(self, record):
+        if self.fmt == 'json':
+            return json.dumps({
+                'ts': round(record['ts'], 3),
+                'device': DEVICE_ID,
+                'level': record['status'],
+                'category': record['category'],
+                'message': record['message'],
+                **({'buffered': True} if record.get('buffered') else {}),
+            }, ensure_ascii=False, separators=(',', ':'))
+        timestamp = datetime.fromtimestamp(record['ts']).strftime("%H:%M:%S")
+        symbol = _SYMBOLS.get(record['status'], 'ℹ')
+        prefix = '  · ' if record.get('buffered') else ''
+        return f"{prefix}[{timestamp}] [{record['category']}] {symbol} {record['message']}"
+
+    def _writer(self):
+        while True:
+            record = self._queue.get()
+            if record is None:
+                break
+            lines = [self.format(record)]
+            # Agrupar lo que haya en cola en una sola escritura
+            while len(lines) < 100:
+                try:
+                    record = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if record is None:
+                    self._write(lines)
+                    return
+                lines.append(self.format(record))
+            self._write(lines)
+
+    def _write(self, lines):
+        try:
+            self.stream.write('\n'.join(lines) + '\n')
+            self.stream.flush()
+        except Exception:
+            pass
+
+    def close(self, timeout=2):
+        """Vacía la cola antes de salir"""
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+_logger = Logger()
+atexit.register(_logger.close)
+
+def log(category, status, message):
+    """Función para logs consistentes"""
+    _logger.log(category, status, message)
+
+def get_logger():
+    return _logger
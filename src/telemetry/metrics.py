@@ -0,0 +1,199 @@
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config.settings import DEVICE_ID, METRICS_HOST, METRICS_PORT, FANOUT_ENABLED
+from network.client import control_plane_stats, log
+from telemetry.logger import get_logger
+from telemetry.ttff import PROCESS_START, export_sessions
+
+_CLK_TCK = os.sysconf('SC_CLK_TCK')
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+
+STATES = ('IDLE', 'STARTING', 'PLAYING', 'SWITCHING', 'RESTARTING', 'NO_SIGNAL', 'FAILOVER')
+
+def _proc_usage(pid='self'):
+    """(segundos de CPU, bytes residentes) de un proceso leyendo /proc, o None"""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            # El nombre del proceso va entre paréntesis y puede contener espacios
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open(f'/proc/{pid}/statm') as f:
+            resident = int(f.read().split()[1])
+        return (int(fields[11]) + int(fields[12])) / _CLK_TCK, resident * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return None
+
+def _host_received_bytes():
+    """Bytes recibidos por todas las interfaces de red del equipo (sin loopback)"""
+    try:
+        total = 0
+        with open('/proc/net/dev') as f:
+            for line in f.readlines()[2:]:
+                name, data = line.split(':', 1)
+                if name.strip() != 'lo':
+                    total += int(data.split()[0])
+        return total
+    except (OSError, ValueError, IndexError):
+        return None
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = (f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+               for k, v in labels.items())
+    return '{' + ','.join(escaped) + '}'
+
+class MetricsWriter:
+    """Acumula líneas en formato de exposición de Prometheus"""
+
+    def __init__(self):
+        self.lines = []
+        self._declared = set()
+
+    def add(self, name, kind, help_text, value, labels=None):
+        if value is None:
+            return
+        if name not in self._declared:
+            self._declared.add(name)
+            self.lines.append(f'# HELP {name} {help_text}')
+            self.lines.append(f'# TYPE {name} {kind}')
+        value = int(value) if isinstance(value, (bool, int)) else round(float(value), 6)
+        self.lines.append(f'{name}{_labels(labels)} {value}')
+
+    def text(self):
+        return '\n'.join(self.lines) + '\n'
+
+def render_metrics(manager):
+    """Métricas a partir de los contadores en memoria (sin lanzar procesos)"""
+    m = MetricsWriter()
+    decoder = manager.active_decoder['name'] if manager.active_decoder else 'default'
+    m.add('srtplayer_info', 'gauge', 'Información del reproductor', 1,
+          {'device': DEVICE_ID, 'profile': manager.active_profile or '', 'decoder': decoder})
+    m.add('srtplayer_uptime_seconds', 'gauge', 'Segundos desde el arranque del reproductor',
+          time.time() - PROCESS_START)
+    for state in STATES:
+        m.add('srtplayer_state', 'gauge', 'Estado actual del reproductor', int(manager.state == state),
+              {'state': state})
+
+    # Pipeline actual
+    stats = manager.get_stats()
+    m.add('srtplayer_playing', 'gauge', 'Hay un FFmpeg de reproducción en marcha', int(manager.is_running()))
+    if stats:
+        m.add('srtplayer_fps', 'gauge', 'Frames por segundo del pipeline actual', stats.fps)
+        m.add('srtplayer_frames', 'gauge', 'Frames decodificados por el pipeline actual', stats.frame)
+        m.add('srtplayer_dropped_frames', 'gauge', 'Frames descartados por el pipeline actual', stats.drop_frames)
+        m.add('srtplayer_duplicated_frames', 'gauge', 'Frames duplicados por el pipeline actual', stats.dup_frames)
+        m.add('srtplayer_decode_errors', 'gauge', 'Errores de FFmpeg del pipeline actual', stats.error_count)
+        m.add('srtplayer_output_bitrate_kbps', 'gauge', 'Bitrate de salida según FFmpeg', stats.bitrate_kbps)
+        m.add('srtplayer_speed', 'gauge', 'Velocidad de proceso respecto a tiempo real', stats.speed)
+        m.add('srtplayer_audio_underruns', 'gauge', 'Vaciados del buffer de ALSA del pipeline actual',
+              stats.audio_underruns)
+        if stats.alsa_delay_ms is not None:
+            m.add('srtplayer_alsa_delay_seconds', 'gauge', 'Audio en el buffer de ALSA pendiente de sonar',
+                  stats.alsa_delay_ms / 1000)
+        if stats.av_offset_ms is not None:
+            m.add('srtplayer_av_offset_seconds', 'gauge',
+                  'Retraso del audio que suena respecto a la imagen mostrada (por pts)',
+                  stats.av_offset_ms / 1000)
+        m.add('srtplayer_pipeline_uptime_seconds', 'gauge', 'Segundos en marcha del pipeline actual',
+              time.time() - stats.started_at)
+    if manager.output:
+        output = manager.output.as_dict()
+        m.add('srtplayer_output_frames_total', 'counter', 'Frames copiados al framebuffer', output['frames'])
+        m.add('srtplayer_output_pages', 'gauge', 'Páginas del framebuffer (2 = doble buffer)', output['pages'])
+        for key in ('write_ms_avg', 'write_ms_max', 'interval_ms_avg', 'jitter_ms'):
+            m.add(f'srtplayer_output_{key}', 'gauge', f'Temporización de la etapa de salida: {key}',
+                  output[key])
+    if FANOUT_ENABLED:
+        # La copia de la entrada que cada pipeline envía al relé: sólo el tráfico del reproductor
+        m.add('srtplayer_input_bytes_total', 'counter',
+              'Bytes de entrada de los pipelines (vía relé); rate() da el bitrate de entrada',
+              manager.fanout.input_bytes)
+    m.add('srtplayer_host_rx_bytes_total', 'counter',
+          'Bytes recibidos por todas las interfaces del equipo (sin loopback), no sólo la entrada SRT',
+          _host_received_bytes())
+
+    # Reinicios y motivos de fallo
+    policy = manager.restart_policy.as_dict()
+    for key in ('starts', 'failures', 'fast_retries', 'backoffs', 'circuit_opens', 'probes', 'probe_failures'):
+        m.add(f'srtplayer_restart_{key}_total', 'counter', f'Contador de la política de reinicio: {key}',
+              policy.get(key, 0))
+    for reason, count in policy['failure_reasons'].items():
+        m.add('srtplayer_failures_total', 'counter', 'Fallos del pipeline por motivo', count, {'reason': reason})
+    m.add('srtplayer_consecutive_failures', 'gauge', 'Fallos seguidos sin reproducir', policy['consecutive_failures'])
+    m.add('srtplayer_circuit_open', 'gauge', 'Circuit breaker abierto', int(manager.restart_policy.is_open))
+
+    # Cambios de URL y tiempo hasta el primer frame
+    m.add('srtplayer_switch_gap_seconds', 'gauge', 'Tiempo sin imagen nueva en el último cambio de URL', manager.last_switch_gap)
+    m.add('srtplayer_switch_duration_seconds', 'gauge', 'Primer frame del último cambio de URL',
+          manager.last_switch_duration)
+    sessions = export_sessions()
+    last_ok = next((s for s in reversed(sessions) if s['ttff_ms'] is not None), None)
+    if last_ok:
+        m.add('srtplayer_ttff_seconds', 'gauge', 'Tiempo hasta el primer frame de la última sesión',
+              last_ok['ttff_ms'] / 1000, {'reason': last_ok['reason']})
+
+    # Plano de control
+    for target, stats in control_plane_stats().items():
+        labels = {'target': target}
+        m.add('srtplayer_control_plane_requests_total', 'counter', 'Peticiones HTTP al plano de control',
+              stats['requests'], labels)
+        m.add('srtplayer_control_plane_errors_total', 'counter', 'Peticiones fallidas al plano de control',
+              stats['errors'], labels)
+        m.add('srtplayer_control_plane_latency_seconds_sum', 'counter', 'Suma de latencias del plano de control',
+              stats['latency_sum'], labels)
+        m.add('srtplayer_control_plane_latency_seconds_last', 'gauge', 'Latencia de la última petición',
+              stats['latency_last'], labels)
+
+    # Recursos del reproductor y del FFmpeg actual
+    usage = _proc_usage()
+    if usage:
+        m.add('process_cpu_seconds_total', 'counter', 'CPU consumida por el reproductor', usage[0])
+        m.add('process_resident_memory_bytes', 'gauge', 'Memoria residente del reproductor', usage[1])
+    process = manager.ffmpeg_process
+    usage = _proc_usage(process.pid) if process else None
+    if usage:
+        m.add('srtplayer_ffmpeg_cpu_seconds_total', 'counter', 'CPU consumida por el FFmpeg actual', usage[0])
+        m.add('srtplayer_ffmpeg_resident_memory_bytes', 'gauge', 'Memoria residente del FFmpeg actual', usage[1])
+    m.add('srtplayer_log_dropped_total', 'counter', 'Registros de log descartados por cola llena',
+          get_logger().dropped)
+    return m.text()
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    manager = None
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path == '/metrics':
+            self._reply(200, 'text/plain; version=0.0.4; charset=utf-8', render_metrics(self.manager))
+        elif path == '/sessions':
+            self._reply(200, 'application/json', json.dumps(export_sessions()))
+        else:
+            self._reply(404, 'text/plain', 'not found\n')
+
+    def _reply(self, status, content_type, body):
+        data = body.encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # Sin una línea de log por scrape
+        pass
+
+def start_metrics_server(manager, host=METRICS_HOST, port=METRICS_PORT):
+    """Sirve /metrics y /sessions en un hilo propio. Devuelve el servidor (o None si no se pudo abrir)"""
+    handler = type('Handler', (MetricsHandler,), {'manager': manager})
+    try:
+        server = ThreadingHTTPServer((host, port), handler)
+    except OSError as e:
+        log("METRICAS", "error", f"No se pudo abrir el puerto {port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    log("METRICAS", "info", f"Métricas en http://{host}:{server.server_address[1]}/metrics")
+    return server
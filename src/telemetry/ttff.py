@@ -0,0 +1,83 @@
+import itertools
+import json
+import threading
+import time
+from collections import deque
+from config.settings import TTFF_HISTORY
+from network.client import log
+
+# Arranque del reproductor: origen de la primera sesión tras el boot
+PROCESS_START = time.time()
+
+# Fases en el orden natural de una sesión de reproducción
+PHASES = (
+    'request',           # Se decide reproducir (boot, cambio de asignación, reinicio)
+    'proxy',             # Respuesta del proxy
+    'streaming_server',  # Respuesta del servidor de streaming (URL SRT)
+    'spawn',             # FFmpeg lanzado
+    'input_opened',      # Handshake SRT + análisis de la entrada ("Input #0")
+    'streams_mapped',    # Decodificadores abiertos ("Stream mapping:")
+    'first_frame',       # Primer frame pintado
+)
+
+_sessions = deque(maxlen=TTFF_HISTORY)
+_lock = threading.Lock()
+_ids = itertools.count(1)
+
+class PlaybackSession:
+    """Marcas de tiempo de una sesión de reproducción, desde la petición hasta el primer pixel"""
+
+    def __init__(self, srt_url, reason, requested_at=None):
+        self.id = next(_ids)
+        self.srt_url = srt_url
+        self.reason = reason
+        self.marks = {'request': requested_at or time.time()}
+        self.outcome = None
+
+    def mark(self, phase, at=None):
+        """Registra una fase (sólo la primera vez)"""
+        if phase not in self.marks and self.outcome is None:
+            self.marks[phase] = at or time.time()
+
+    def finish(self, outcome):
+        """Cierra la sesión, la guarda en memoria y la escribe como un único registro"""
+        if self.outcome is not None:
+            return
+        self.outcome = outcome
+        record = self.as_dict()
+        with _lock:
+            _sessions.append(record)
+        log("TTFF", "success" if outcome == 'ok' else "warning", json.dumps(record, separators=(',', ':')))
+
+    def as_dict(self):
+        start = self.marks['request']
+        ordered = sorted(self.marks.items(), key=lambda item: item[1])
+        durations = {}
+        previous = start
+        for phase, at in ordered[1:]:
+            durations[phase] = round((at - previous) * 1000)
+            previous = at
+        return {
+            'session': self.id,
+            'reason': self.reason,
+            # Sin la query: passphrase= y streamid= no salen del dispositivo
+            'url': self.srt_url.split('?', 1)[0] if self.srt_url else None,
+            'outcome': self.outcome,
+            'started_at': round(start, 3),
+            'ttff_ms': round((self.marks['first_frame'] - start) * 1000) if 'first_frame' in self.marks else None,
+            'phases_ms': {phase: round((at - start) * 1000) for phase, at in ordered},
+            'durations_ms': durations,
+        }
+
+def start_session(srt_url, reason, requested_at=None, control_plane=None):
+    """Abre una sesión; control_plane son las marcas {fase: instante} de la última ronda HTTP"""
+    session = PlaybackSession(srt_url, reason, requested_at)
+    for phase, at in (control_plane or {}).items():
+        if at >= session.marks['request']:
+            session.mark(phase, at)
+    return session
+
+def export_sessions():
+    """Sesiones recientes, de la más antigua a la más nueva"""
+    with _lock:
+        return list(_sessions)
@@ -0,0 +1,146 @@
+"""Emisor SRT local con pausas, para probar la detección de imagen congelada.
+
+Genera una señal de prueba (testsrc2 + tono) en MPEG-TS y la publica como listener SRT.
+Entre el generador y el emisor hay un relé en Python que puede pausar el flujo sin cerrar
+la conexión SRT: el receptor sigue conectado (keepalives) pero deja de recibir datos.
+
+Modos de pausa:
+  drop  -> los datos generados durante la pausa se descartan (como una pérdida en la red)
+  hold  -> el generador se bloquea y al reanudar se envía lo acumulado (como un emisor colgado)
+
+Control:
+  --pause-at 10 --pause-for 3 [--pause-every 30]   pausas programadas
+  kill -USR1 <pid>                                 alterna pausa/reanudación a mano
+  escribir 'p' + Enter en la consola               alterna pausa/reanudación
+
+Uso: python srt_sender.py --port 9000 [--size 1280x720] [--pause-at 10 --pause-for 3]
+"""
+import argparse
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+CHUNK = 188 * 7  # Un datagrama SRT típico de MPEG-TS
+
+class PausableSender:
+    """Generador FFmpeg -> relé pausable -> FFmpeg emisor SRT"""
+
+    def __init__(self, port, size='1280x720', rate=25, latency_ms=120, mode='drop'):
+        self.port = port
+        self.size = size
+        self.rate = rate
+        self.latency_ms = latency_ms
+        self.mode = mode
+        self.paused = threading.Event()
+        self.sent_bytes = 0
+        self.dropped_bytes = 0
+        self._stop = threading.Event()
+        self._generator = None
+        self._sender = None
+
+    @property
+    def url(self):
+        return f'srt://127.0.0.1:{self.port}'
+
+    def start(self):
+        self._generator = subprocess.Popen([
+            'ffmpeg', '-loglevel', 'error', '-re',
+            '-f', 'lavfi', '-i', f'testsrc2=size={self.size}:rate={self.rate}',
+            '-f', 'lavfi', '-i', 'sine=frequency=440:sample_rate=48000',
+            '-c:v', 'libx264', '-preset', 'ultrafast', '-tune', 'zerolatency', '-g', str(self.rate),
+            '-c:a', 'aac', '-b:a', '96k',
+            '-f', 'mpegts', 'pipe:1',
+        ], stdout=subprocess.PIPE)
+        self._sender = subprocess.Popen([
+            'ffmpeg', '-loglevel', 'error',
+            '-f', 'mpegts', '-i', 'pipe:0',
+            '-c', 'copy', '-f', 'mpegts',
+            f'srt://0.0.0.0:{self.port}?mode=listener&latency={self.latency_ms * 1000}',
+        ], stdin=subprocess.PIPE)
+        threading.Thread(target=self._relay, daemon=True).start()
+        return self
+
+    def _relay(self):
+        source, sink = self._generator.stdout, self._sender.stdin
+        while not self._stop.is_set():
+            if self.paused.is_set() and self.mode == 'hold':
+                # Sin leer: el generador se bloquea al llenarse la tubería
+                time.sleep(0.01)
+                continue
+            chunk = source.read(CHUNK)
+            if not chunk:
+                break
+            if self.paused.is_set():
+                self.dropped_bytes += len(chunk)
+                continue
+            try:
+                sink.write(chunk)
+                sink.flush()
+            except (BrokenPipeError, OSError):
+                break
+            self.sent_bytes += len(chunk)
+
+    def pause(self):
+        if not self.paused.is_set():
+            self.paused.set()
+            print(f"⏸  Pausa ({self.mode}) a los {time.strftime('%H:%M:%S')}", flush=True)
+
+    def resume(self):
+        if self.paused.is_set():
+            self.paused.clear()
+            print(f"▶  Reanudado a los {time.strftime('%H:%M:%S')}", flush=True)
+
+    def toggle(self):
+        self.resume() if self.paused.is_set() else self.pause()
+
+    def pause_for(self, seconds):
+        self.pause()
+        threading.Timer(seconds, self.resume).start()
+
+    def stop(self):
+        self._stop.set()
+        for process in (self._generator, self._sender):
+            if process and process.poll() is None:
+                process.terminate()
+                try:
+                    process.wait(timeout=3)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+
+def main():
+    parser = argparse.ArgumentParser(description='Emisor SRT local con pausas')
+    parser.add_argument('--port', type=int, default=9000)
+    parser.add_argument('--size', default='1280x720')
+    parser.add_argument('--rate', type=int, default=25)
+    parser.add_argument('--latency', type=int, default=120, help='Latencia SRT del emisor (ms)')
+    parser.add_argument('--mode', choices=['drop', 'hold'], default='drop')
+    parser.add_argument('--pause-at', type=float, default=None, help='Primera pausa a los N segundos')
+    parser.add_argument('--pause-for', type=float, default=3, help='Duración de cada pausa')
+    parser.add_argument('--pause-every', type=float, default=None, help='Repetir la pausa cada N segundos')
+    args = parser.parse_args()
+
+    sender = PausableSender(args.port, args.size, args.rate, args.latency, args.mode).start()
+    print(f"📡 Emitiendo en {sender.url} (modo de pausa: {args.mode})", flush=True)
+    signal.signal(signal.SIGUSR1, lambda signum, frame: sender.toggle())
+
+    def console():
+        for line in sys.stdin:
+            if line.strip().lower() == 'p':
+                sender.toggle()
+    threading.Thread(target=console, daemon=True).start()
+
+    start = time.time()
+    next_pause = args.pause_at
+    try:
+        while True:
+            time.sleep(0.05)
+            if next_pause is not None and time.time() - start >= next_pause:
+                sender.pause_for(args.pause_for)
+                next_pause = next_pause + args.pause_every if args.pause_every else None
+    except KeyboardInterrupt:
+        sender.stop()
+
+if __name__ == "__main__":
+    main()
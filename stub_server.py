@@ -0,0 +1,211 @@
+"""Servidor local que imita al proxy y al servidor de streaming para pruebas.
+
+Implementa el mismo protocolo que usa network.client:
+  POST /api/server-config          -> URL del servidor de streaming
+  POST /api/devices/register       -> registro en proxy (status + streamingUrl)
+  POST /api/devices                -> registro/latido en el servidor de streaming (URL SRT)
+  GET  /api/devices/<id>/events    -> suscripción a cambios (SSE o long-poll)
+
+Y un par de rutas de administración para las pruebas:
+  POST /admin/assign  {"device": "...", "srtUrl": "..."}   (device "*" = todos)
+  GET  /admin/stats
+
+Uso: python stub_server.py --port 3000 --srt-url srt://127.0.0.1:9000 [--events sse|longpoll|none]
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class StubState:
+    """Asignaciones y contadores compartidos por todas las peticiones"""
+
+    def __init__(self, base_url, srt_url=None, events='sse'):
+        self.base_url = base_url
+        self.default_srt_url = srt_url
+        self.events = events
+        self.assignments = {}
+        self.version = 0
+        self.requests = {}
+        self._requests_lock = threading.Lock()  # Cada conexión cuenta desde su propio hilo
+        self.changed = threading.Condition()
+
+    def srt_url_for(self, device_id):
+        return self.assignments.get(device_id, self.default_srt_url)
+
+    def assign(self, device_id, srt_url):
+        with self.changed:
+            if device_id == '*':
+                self.default_srt_url = srt_url
+                self.assignments.clear()
+            else:
+                self.assignments[device_id] = srt_url
+            self.version += 1
+            self.changed.notify_all()
+
+    def count(self, route):
+        with self._requests_lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+
+    def request_counts(self):
+        with self._requests_lock:
+            return dict(self.requests)
+
+    def assignment_payload(self, device_id):
+        srt_url = self.srt_url_for(device_id)
+        return {
+            'success': True,
+            'status': 'ACTIVE' if srt_url else 'unassigned',
+            'streamingUrl': srt_url,
+            'version': self.version,
+        }
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        try:
+            return json.loads(body or b'{}')
+        except ValueError:
+            return {}
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        path = self.path.split('?')[0]
+        data = self._read_json()
+        self.state.count(path)
+
+        if path == '/api/server-config':
+            self._send_json({'streamingUrl': self.state.base_url})
+        elif path == '/api/devices/register':
+            self._send_json({'status': 'assigned', 'streamingUrl': self.state.base_url})
+        elif path == '/api/devices':
+            device_id = data.get('dispositivoId')
+            if not device_id:
+                self._send_json({'success': False, 'error': 'dispositivoId requerido'}, 400)
+            else:
+                self._send_json(self.state.assignment_payload(device_id))
+        elif path == '/admin/assign':
+            self.state.assign(data.get('device', '*'), data.get('srtUrl'))
+            self._send_json({'success': True, 'version': self.state.version})
+        else:
+            self._send_json({'error': 'not found'}, 404)
+
+    def do_GET(self):
+        path, _, query = self.path.partition('?')
+        params = dict(p.split('=', 1) for p in query.split('&') if '=' in p)
+        self.state.count(path)
+
+        if path == '/admin/stats':
+            self._send_json({'requests': self.state.request_counts(), 'version': self.state.version})
+        elif path.startswith('/api/devices/') and path.endswith('/events'):
+            device_id = path.split('/')[3]
+            if self.state.events == 'none':
+                self._send_json({'error': 'not found'}, 404)
+            elif self.state.events == 'sse' and 'text/event-stream' in self.headers.get('Accept', ''):
+                self._serve_events(device_id)
+            else:
+                self._serve_long_poll(device_id, params)
+        else:
+            self._send_json({'error': 'not found'}, 404)
+
+    def _serve_long_poll(self, device_id, params):
+        since = int(params['since']) if params.get('since', '').isdigit() else None
+        timeout = float(params.get('timeout', 30))
+        with self.state.changed:
+            if since is not None:
+                self.state.changed.wait_for(lambda: self.state.version > since, timeout)
+            if since is not None and self.state.version <= since:
+                self.send_response(204)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            payload = self.state.assignment_payload(device_id)
+        self._send_json(payload)
+
+    def _serve_events(self, device_id):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+        version = None
+        try:
+            while True:
+                with self.state.changed:
+                    if version is not None:
+                        self.state.changed.wait_for(lambda: self.state.version != version, 15)
+                    changed = self.state.version != version
+                    version = self.state.version
+                    payload = self.state.assignment_payload(device_id)
+                if changed:
+                    self.wfile.write(f'id: {version}\ndata: {json.dumps(payload)}\n\n'.encode())
+                else:
+                    # Comentario de keep-alive
+                    self.wfile.write(b': ping\n\n')
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+class StubHTTPServer(ThreadingHTTPServer):
+    # Cola de conexiones amplia: el simulador de flota abre miles a la vez
+    request_queue_size = 1024
+
+class StubServer:
+    """Servidor stub en un hilo, para usar desde scripts de prueba y benchmarks"""
+
+    def __init__(self, host='127.0.0.1', port=0, srt_url=None, events='sse'):
+        handler = type('BoundStubHandler', (StubHandler,), {})
+        self.httpd = StubHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.url = f'http://{host}:{self.httpd.server_address[1]}'
+        self.state = handler.state = StubState(self.url, srt_url, events)
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def assign(self, device_id, srt_url):
+        self.state.assign(device_id, srt_url)
+
+def main():
+    parser = argparse.ArgumentParser(description='Stub del proxy y del servidor de streaming')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=3000)
+    parser.add_argument('--srt-url', default=None, help='URL SRT asignada por defecto')
+    parser.add_argument('--events', choices=['sse', 'longpoll', 'none'], default='sse',
+                        help='Modo de suscripción ofrecido (none = sólo sondeo)')
+    args = parser.parse_args()
+
+    server = StubServer(args.host, args.port, args.srt_url, args.events).start()
+    print(f"🧪 Stub escuchando en {server.url} (eventos: {args.events})", flush=True)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
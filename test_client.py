@@ -1,5 +1,14 @@
+import argparse
+import asyncio
+import json
+import random
+import os
+import resource
 import requests
+import subprocess
+import sys
 import time
+import urllib.parse
 import uuid
 import socket
 
@@ -104,7 +113,7 @@ def test_get_config(server_url):
     except Exception as e:
         print(f"❌ Error: {e}")
 
-def main():
+def smoke_test():
     print(f"🧪 Iniciando pruebas con ID de dispositivo: {DEVICE_ID}")
     
     # Prueba 1: Obtener URL del servidor
@@ -122,5 +131,436 @@ def main():
     print(f"   ID del dispositivo usado: {DEVICE_ID}")
     print("   Revisa el panel de administración para ver el dispositivo registrado")
 
+
+# ---------------------------------------------------------------------------
+# Simulador de flota: N dispositivos virtuales con el mismo protocolo que network.client
+# ---------------------------------------------------------------------------
+
+# Mismos intervalos que config.settings (HEARTBEAT_INTERVAL, PROXY_REFRESH_INTERVAL)
+SIM_HEARTBEAT_INTERVAL = 3
+SIM_PROXY_REFRESH_INTERVAL = 60
+SIM_REQUEST_TIMEOUT = 5
+# stub_server.py usa un hilo por conexión (hasta dos por dispositivo): por encima, el cuello es el stub
+LOCAL_STUB_MAX_DEVICES = 2000
+# Latencias guardadas por ruta para los percentiles (muestreo de reservorio por encima)
+SIM_MAX_SAMPLES = 200000
+
+class RouteStats:
+    """Peticiones, errores y latencias de un tipo de petición"""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.samples = []
+        self.window_requests = 0
+        self.window_errors = 0
+        self.window_samples = []
+
+    def record(self, latency, ok):
+        self.requests += 1
+        self.window_requests += 1
+        if not ok:
+            self.errors += 1
+            self.window_errors += 1
+        if len(self.samples) < SIM_MAX_SAMPLES:
+            self.samples.append(latency)
+        else:
+            index = random.randrange(self.requests)
+            if index < SIM_MAX_SAMPLES:
+                self.samples[index] = latency
+        self.window_samples.append(latency)
+
+    def take_window(self):
+        window = (self.window_requests, self.window_errors, self.window_samples)
+        self.window_requests, self.window_errors, self.window_samples = 0, 0, []
+        return window
+
+def percentiles(samples, points=(50, 90, 99)):
+    """Percentiles en milisegundos (y el máximo) de una lista de latencias en segundos"""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    result = {f'p{p}': round(ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] * 1000, 1)
+              for p in points}
+    result['max'] = round(ordered[-1] * 1000, 1)
+    return result
+
+class HttpConnection:
+    """Conexión HTTP/1.1 keep-alive mínima sobre asyncio (una por dispositivo y destino)"""
+
+    def __init__(self, base_url):
+        parts = urllib.parse.urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.ssl = parts.scheme == 'https'
+        self.reader = None
+        self.writer = None
+
+    async def _connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port, ssl=self.ssl or None)
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+        self.reader = self.writer = None
+
+    async def request(self, method, path, payload=None):
+        """Devuelve (estado, JSON de la respuesta o None)"""
+        body = json.dumps(payload).encode() if payload is not None else b''
+        for attempt in (1, 2):
+            reused = self.writer is not None
+            try:
+                if self.writer is None:
+                    await asyncio.wait_for(self._connect(), SIM_REQUEST_TIMEOUT)
+                self.writer.write(
+                    f'{method} {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n'
+                    f'Content-Type: application/json\r\nContent-Length: {len(body)}\r\n'
+                    f'Connection: keep-alive\r\n\r\n'.encode() + body)
+                await self.writer.drain()
+                status, data = await asyncio.wait_for(self._read_response(), SIM_REQUEST_TIMEOUT)
+                try:
+                    return status, json.loads(data) if data else None
+                except ValueError:
+                    return status, None
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError):
+                self.close()
+                # El servidor puede cerrar una conexión inactiva: se reintenta una vez con otra nueva
+                if not reused or attempt == 2:
+                    raise
+
+    async def _read_response(self):
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionResetError('Conexión cerrada por el servidor')
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            key, _, value = line.decode('latin-1').partition(':')
+            headers[key.strip().lower()] = value.strip()
+
+        if 'content-length' in headers:
+            data = await self.reader.readexactly(int(headers['content-length']))
+        elif headers.get('transfer-encoding', '').lower() == 'chunked':
+            data = b''
+            while True:
+                size = int((await self.reader.readline()).split(b';')[0], 16)
+                chunk = await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+                data += chunk[:-2]
+        else:
+            data = await self.reader.read()
+            headers['connection'] = 'close'
+
+        if headers.get('connection', '').lower() == 'close':
+            self.close()
+        return status, data
+
+class VirtualDevice:
+    """Repite el ciclo register_device() -> register_with_streaming_server() de network.client"""
+
+    def __init__(self, simulator, index):
+        self.sim = simulator
+        self.device_id = f'PLAYER_SIM{index:05d}'
+        self.proxy = HttpConnection(simulator.proxy_url)
+        self.server = None
+        self.server_url = None
+        self.proxy_registered_at = 0
+        self.light_supported = True
+        self.last_state = None
+        self.status = 'OFFLINE'
+        self.srt_url = None
+        self.wake = asyncio.Event()
+
+    async def _call(self, route, connection, path, payload):
+        start = time.perf_counter()
+        try:
+            status, data = await connection.request('POST', path, payload)
+        except Exception:
+            self.sim.stats[route].record(time.perf_counter() - start, False)
+            return None, None
+        self.sim.stats[route].record(time.perf_counter() - start, status < 400 or status == 409)
+        return status, data
+
+    async def run(self):
+        # Arranque escalonado como un parque que se enciende a lo largo del intervalo
+        await asyncio.sleep(random.uniform(0, self.sim.interval))
+        while self.sim.running:
+            await self.cycle()
+            delay = self.sim.interval * random.uniform(1 - self.sim.jitter, 1 + self.sim.jitter)
+            try:
+                await asyncio.wait_for(self.wake.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+            self.wake.clear()
+
+    async def cycle(self):
+        if self.server_url and time.monotonic() - self.proxy_registered_at < SIM_PROXY_REFRESH_INTERVAL:
+            if await self.heartbeat():
+                return
+        await self.register()
+
+    async def register(self):
+        status, result = await self._call('proxy_register', self.proxy, '/api/devices/register',
+                                          {'id': self.device_id, 'ipPublica': '0.0.0.0'})
+        if status != 200 or not result:
+            self.server_url = None
+            self.proxy_registered_at = 0
+            self.status = 'OFFLINE'
+            return False
+        self.proxy_registered_at = time.monotonic()
+        self.status = result.get('status', 'unassigned')
+        if self.status != 'assigned' or not result.get('streamingUrl'):
+            self.server_url = None
+            return False
+        if result['streamingUrl'] != self.server_url:
+            if self.server:
+                self.server.close()
+            self.server_url = result['streamingUrl']
+            self.server = HttpConnection(self.server_url)
+        return await self.heartbeat()
+
+    async def heartbeat(self):
+        state = (self.server_url, self.status, self.srt_url)
+        full = not self.light_supported or state != self.last_state
+        payload = {'dispositivoId': self.device_id}
+        if full:
+            payload.update({'nombre': f'Raspberry {self.device_id}', 'inputSrt': 'pending',
+                            'ipPublica': '0.0.0.0'})
+        route = 'streaming_full' if full else 'streaming_light'
+        status, result = await self._call(route, self.server, '/api/devices', payload)
+        if status is None:
+            self.status = 'OFFLINE'
+            self.last_state = None
+            return False
+        if not full and 400 <= status < 500 and status != 409:
+            self.light_supported = False
+            return await self.heartbeat()
+        if status not in (200, 409) or not result or not result.get('success'):
+            self.status = 'OFFLINE'
+            self.last_state = None
+            return False
+
+        status = result.get('status')
+        srt_url = (result.get('streamingUrl') or result.get('srtUrl') or result.get('url')
+                   or (result.get('device') or {}).get('streamingUrl'))
+        if srt_url:
+            if srt_url != self.srt_url:
+                self.sim.observe_assignment(self.device_id, srt_url)
+            self.srt_url = srt_url
+            self.status = 'ACTIVE'
+        elif status in ('unassigned', 'OFFLINE', 'INACTIVE'):
+            self.srt_url = None
+            self.status = status
+        elif not self.srt_url:
+            # Sin URL en la respuesta se mantiene el estado anterior, como en network.client
+            self.status = status or 'ONLINE'
+        self.last_state = (self.server_url, self.status, self.srt_url)
+        return True
+
+    def reset(self):
+        """Pérdida de red o reinicio: conexiones y estado fuera, el próximo ciclo empieza en el proxy"""
+        self.proxy.close()
+        if self.server:
+            self.server.close()
+        self.server_url = None
+        self.proxy_registered_at = 0
+        self.last_state = None
+        self.wake.set()
+
+class FleetSimulator:
+    """Flota de dispositivos virtuales en un solo bucle de asyncio"""
+
+    ROUTES = ('proxy_register', 'streaming_full', 'streaming_light')
+
+    def __init__(self, proxy_url, devices, interval=SIM_HEARTBEAT_INTERVAL, jitter=0.1, churn=0,
+                 storm_every=0, storm_fraction=0.2, report_every=5):
+        self.proxy_url = proxy_url.rstrip('/')
+        self.interval = interval
+        self.jitter = jitter
+        self.churn = churn
+        self.storm_every = storm_every
+        self.storm_fraction = storm_fraction
+        self.report_every = report_every
+        self.stats = {route: RouteStats() for route in self.ROUTES}
+        self.devices = [VirtualDevice(self, n) for n in range(devices)]
+        self.pending_assignments = {}   # device_id -> (URL asignada, instante)
+        self.propagation = []           # Segundos desde la asignación hasta que el dispositivo la ve
+        self.assignments_sent = 0
+        self.storms = 0
+        self.running = False
+        self.started_at = None
+
+    def observe_assignment(self, device_id, srt_url):
+        pending = self.pending_assignments.get(device_id)
+        if pending and pending[0] == srt_url:
+            self.propagation.append(time.monotonic() - pending[1])
+            del self.pending_assignments[device_id]
+
+    async def _churn_task(self):
+        admin = HttpConnection(self.proxy_url)
+        while self.running:
+            await asyncio.sleep(random.expovariate(self.churn))
+            device = random.choice(self.devices)
+            srt_url = f'srt://127.0.0.1:{random.randint(9000, 9999)}'
+            try:
+                status, _ = await admin.request('POST', '/admin/assign',
+                                                {'device': device.device_id, 'srtUrl': srt_url})
+            except Exception:
+                continue
+            if status == 404:
+                print("⚠️  El servidor no tiene /admin/assign (sólo el stub): sin rotación de asignaciones")
+                return
+            self.pending_assignments[device.device_id] = (srt_url, time.monotonic())
+            self.assignments_sent += 1
+
+    async def _storm_task(self):
+        while self.running:
+            await asyncio.sleep(self.storm_every)
+            affected = random.sample(self.devices, int(len(self.devices) * self.storm_fraction))
+            self.storms += 1
+            print(f"🌩  Tormenta de reconexión: {len(affected)} dispositivos a la vez")
+            for device in affected:
+                device.reset()
+
+    async def _report_task(self):
+        while self.running:
+            await asyncio.sleep(self.report_every)
+            line = []
+            for route, stats in self.stats.items():
+                requests, errors, samples = stats.take_window()
+                if requests:
+                    p = percentiles(samples)
+                    line.append(f"{route}: {requests / self.report_every:.0f} req/s, "
+                                f"{errors / requests * 100:.1f}% err, p50 {p['p50']} ms, p99 {p['p99']} ms")
+            active = sum(1 for device in self.devices if device.status == 'ACTIVE')
+            print(f"[{time.monotonic() - self.started_at:6.0f}s] activos {active}/{len(self.devices)} | "
+                  + (' | '.join(line) or 'sin peticiones'), flush=True)
+
+    async def run(self, duration):
+        self.running = True
+        self.started_at = time.monotonic()
+        tasks = [asyncio.create_task(device.run()) for device in self.devices]
+        tasks.append(asyncio.create_task(self._report_task()))
+        if self.churn:
+            tasks.append(asyncio.create_task(self._churn_task()))
+        if self.storm_every:
+            tasks.append(asyncio.create_task(self._storm_task()))
+        await asyncio.sleep(duration)
+        self.running = False
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for device in self.devices:
+            device.reset()
+        return self.summary(time.monotonic() - self.started_at)
+
+    def summary(self, elapsed):
+        routes = {}
+        for route, stats in self.stats.items():
+            routes[route] = {
+                'requests': stats.requests,
+                'rate_per_s': round(stats.requests / elapsed, 1),
+                'errors': stats.errors,
+                'error_rate': round(stats.errors / stats.requests, 4) if stats.requests else 0,
+                'latency_ms': percentiles(stats.samples),
+            }
+        total = sum(stats.requests for stats in self.stats.values())
+        return {
+            'devices': len(self.devices),
+            'duration_s': round(elapsed, 1),
+            'requests': total,
+            'rate_per_s': round(total / elapsed, 1),
+            'routes': routes,
+            'assignments_sent': self.assignments_sent,
+            'assignments_observed': len(self.propagation),
+            'assignment_propagation_ms': percentiles(self.propagation),
+            'storms': self.storms,
+            'active_devices': sum(1 for device in self.devices if device.status == 'ACTIVE'),
+        }
+
+def raise_file_limit(devices):
+    """Cada dispositivo mantiene hasta dos conexiones abiertas"""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = devices * 2 + 256
+    if soft < wanted:
+        new_soft = wanted if hard == resource.RLIM_INFINITY else min(wanted, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (new_soft, hard))
+        if new_soft < wanted:
+            print(f"⚠️  Límite de descriptores {new_soft}: no alcanza para {devices} dispositivos")
+
+def start_local_stub():
+    """Lanza stub_server.py en su propio proceso y devuelve (proceso, URL).
+
+    El stub abre un hilo por conexión: en el mismo proceso que el simulador competiría con su
+    bucle por el GIL. Aun aparte, más allá de unos 2000 dispositivos conviene un servidor real
+    """
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stub_server.py')
+    process = subprocess.Popen([sys.executable, script, '--port', '0', '--srt-url', 'srt://127.0.0.1:9000',
+                                '--events', 'none'], stdout=subprocess.PIPE, text=True)
+    # Primera línea: "🧪 Stub escuchando en http://127.0.0.1:<puerto> (eventos: none)"
+    line = process.stdout.readline()
+    if ' en ' not in line:
+        process.kill()
+        raise RuntimeError('stub_server.py no arrancó')
+    return process, line.split(' en ', 1)[1].split()[0]
+
+def simulate(args):
+    raise_file_limit(args.devices)
+    stub = None
+    proxy_url = args.proxy
+    if args.local_stub:
+        if args.devices > LOCAL_STUB_MAX_DEVICES:
+            print(f"⚠️  --local-stub abre un hilo por conexión: más de {LOCAL_STUB_MAX_DEVICES} "
+                  f"dispositivos miden al stub, no al plano de control")
+        stub, proxy_url = start_local_stub()
+
+    print(f"🚀 Simulando {args.devices} dispositivos contra {proxy_url} durante {args.duration:.0f}s")
+    simulator = FleetSimulator(proxy_url, args.devices, args.interval, args.jitter, args.churn,
+                               args.storm_every, args.storm_fraction, args.report_every)
+    try:
+        summary = asyncio.run(simulator.run(args.duration))
+    finally:
+        if stub:
+            stub.terminate()
+            stub.wait(timeout=5)
+
+    output = json.dumps(summary, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+        print(f"📊 Resumen en {args.output}")
+    else:
+        print(output)
+
+def main():
+    global PROXY_URL
+    parser = argparse.ArgumentParser(description='Pruebas del plano de control')
+    parser.add_argument('--proxy', default=PROXY_URL, help='URL del proxy')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.add_parser('smoke', help='Prueba rápida de los endpoints con un dispositivo (por defecto)')
+    sim = subparsers.add_parser('simulate', help='Simulador de flota con N dispositivos virtuales')
+    sim.add_argument('--devices', type=int, default=1000)
+    sim.add_argument('--duration', type=float, default=60, help='Duración de la simulación (s)')
+    sim.add_argument('--interval', type=float, default=SIM_HEARTBEAT_INTERVAL, help='Latido de cada dispositivo (s)')
+    sim.add_argument('--jitter', type=float, default=0.1, help='Variación relativa del intervalo (0.1 = ±10%%)')
+    sim.add_argument('--churn', type=float, default=0, help='Cambios de asignación por segundo (vía /admin/assign)')
+    sim.add_argument('--storm-every', type=float, default=0, help='Tormenta de reconexión cada N segundos')
+    sim.add_argument('--storm-fraction', type=float, default=0.2, help='Fracción de dispositivos que reconectan')
+    sim.add_argument('--report-every', type=float, default=5, help='Informe parcial cada N segundos')
+    sim.add_argument('--local-stub', action='store_true',
+                     help=f'Levantar stub_server.py en un proceso aparte (hasta ~{LOCAL_STUB_MAX_DEVICES} dispositivos)')
+    sim.add_argument('--output', default=None, help='Fichero JSON con el resumen (por defecto stdout)')
+    args = parser.parse_args()
+
+    if args.command == 'simulate':
+        simulate(args)
+    else:
+        PROXY_URL = args.proxy
+        smoke_test()
+
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()